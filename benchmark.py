@@ -0,0 +1,414 @@
+"""Benchmark script.
+
+It starts the server on generated data files with every combination
+of corpus size, search engine, REREAD_ON_QUERY and server mode, sends
+queries from a number of concurrent clients, and measures the latency
+of every request with time.perf_counter_ns. The percentiles and the
+throughput of every run are written as JSON and CSV, so results can
+be compared across releases.
+
+Usage: python benchmark.py [--sizes 10000,100000,250000,1000000]
+                           [--engines hash] [--reread off,on]
+                           [--modes threaded] [--concurrency 1,4,16]
+                           [--protocol persistent] [--queries N]
+                           [--data-dir DIR] [--output NAME]
+"""
+
+import argparse
+import configparser
+import csv
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from generate_data import generate_random_ips
+from mmap_index import build_index
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "server.py")
+
+# Percentiles reported for every run.
+PERCENTILES = (50, 95, 99, 99.9)
+
+# Columns of the CSV file, in order.
+FIELDS = (
+    "lines",
+    "engine",
+    "reread_on_query",
+    "mode",
+    "protocol",
+    "concurrency",
+    "requests",
+    "errors",
+    "seconds",
+    "throughput",
+    "p50_us",
+    "p95_us",
+    "p99_us",
+    "p999_us",
+    "max_us",
+)
+
+
+def percentile(sorted_values, percent):
+    """Return a percentile of sorted values.
+
+    It uses the nearest-rank method, so the result is always one of
+    the values
+
+    :param sorted_values: the values in ascending order
+    :param percent: the percentile, between 0 and 100
+    :return: The value at the percentile, or None without values
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[min(int(rank), len(sorted_values)) - 1]
+
+
+def summarize(latencies, seconds, errors=0):
+    """Summarize the latencies of a run.
+
+    :param latencies: the latency of every request in nanoseconds
+    :param seconds: the wall-clock duration of the run
+    :param errors: the number of requests that failed
+    :return: A dict with the number of requests, the throughput and
+    the percentiles in microseconds
+    """
+    latencies = sorted(latencies)
+    summary = {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(seconds, 6),
+        "throughput": round(len(latencies) / seconds, 1) if seconds else 0,
+    }
+    for percent in PERCENTILES:
+        value = percentile(latencies, percent)
+        key = f"p{str(percent).replace('.', '')}_us"
+        summary[key] = None if value is None else round(value / 1000, 1)
+    summary["max_us"] = round(latencies[-1] / 1000, 1) if latencies else None
+    return summary
+
+
+def data_file(data_dir, lines):
+    """Return a data file with a number of lines, generating it once.
+
+    :param data_dir: the directory of the generated data files
+    :param lines: the number of lines of the data file
+    :return: The path of the data file
+    """
+    file_path = os.path.join(data_dir, f"d{lines}.txt")
+    if not os.path.exists(file_path):
+        print(f"Generating {file_path} ...", file=sys.stderr)
+        generate_random_ips(count=lines, file_path=file_path)
+    return file_path
+
+
+def make_queries(file_path, count, hit_ratio=0.5):
+    """Pick the queries of a run.
+
+    :param file_path: the data file
+    :param count: the number of queries
+    :param hit_ratio: the share of queries that are lines of the file
+    :return: The list of queries
+    """
+    with open(file_path) as f:
+        lines = [line.strip() for line in f]
+    rng = random.Random(count)
+    return [
+        rng.choice(lines) if rng.random() < hit_ratio
+        else f"{rng.randint(31, 99)};missing;{i};"
+        for i in range(count)
+    ]
+
+
+def free_port():
+    """Return a TCP port that is free on the loopback interface."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def write_config(work_dir, file_path, port, engine, reread, mode,
+                 protocol):
+    """Write the configs.ini file of a benchmark server.
+
+    The settings of the configs.ini file in the current directory are
+    kept, apart from the ones the benchmark sweeps over. The mmap
+    engine searches an index file, which is built from the data file
+    in the work directory
+
+    :return: The path of the written file
+    """
+    config = configparser.ConfigParser()
+    config.read("configs.ini")
+    for section in ("socket_info", "text_file", "query_file", "server"):
+        if section not in config:
+            config.add_section(section)
+    config.set("socket_info", "HOST", "127.0.0.1")
+    config.set("socket_info", "PORT", str(port))
+    config.set("socket_info", "PROTOCOL", protocol)
+    config.set("text_file", "windows_path", file_path)
+    index_path = ""
+    if engine == "mmap":
+        index_path = os.path.join(work_dir, "data.idx")
+        build_index(file_path, index_path, temp_dir=work_dir)
+    config.set("text_file", "INDEX_PATH", index_path)
+    config.set("text_file", "SNAPSHOT_PATH", "")
+    config.set("text_file", "ENGINE", engine)
+    config.set("query_file", "REREAD_ON_QUERY", "True" if reread else "")
+    config.set("server", "MODE", mode)
+    config_path = os.path.join(work_dir, "configs.ini")
+    with open(config_path, "w") as f:
+        config.write(f)
+    return config_path
+
+
+def start_server(work_dir, port, timeout=600):
+    """Start a server and wait until it accepts connections.
+
+    :param work_dir: the directory with the configs.ini of the server
+    :param port: the port the server listens on
+    :param timeout: the number of seconds the data may take to load
+    :return: The server process
+    """
+    process = subprocess.Popen(
+        [sys.executable, SERVER_SCRIPT],
+        cwd=work_dir,
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("The server exited while starting")
+        try:
+            # The server answers once the data is loaded.
+            with socket.create_connection(("127.0.0.1", port), 1) as sock:
+                sock.sendall(b"warmup\n")
+                sock.recv(1024)
+            return process
+        except (OSError, ValueError):
+            time.sleep(0.05)
+    stop_server(process)
+    raise RuntimeError("The server didn't start in time")
+
+
+def stop_server(process):
+    """Stop a server like CTRL + C would, or kill it if it hangs."""
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def read_response(sock, buffer):
+    """Read one response line from a socket.
+
+    Only the answers to a query are valid responses, so a busy server
+    or an error isn't measured as a successful request
+
+    :param sock: the socket object
+    :param buffer: the data received after the previous response
+    :return: The response line and the rest of the data received
+    """
+    while b"\n" not in buffer:
+        data = sock.recv(4096)
+        if not data:
+            raise ConnectionError("Connection closed by the server")
+        buffer += data
+    line, buffer = buffer.split(b"\n", 1)
+    if line not in (b"STRING EXISTS", b"STRING NOT FOUND"):
+        raise ValueError(line.decode(errors="replace"))
+    return line, buffer
+
+
+def run_client(port, queries, protocol):
+    """Send queries one after the other and time every request.
+
+    With the persistent protocol every query is sent on the same
+    connection, which is opened again after an error, otherwise a new
+    connection is opened for each one and its setup is part of the
+    latency
+
+    :param port: the port of the server
+    :param queries: the queries of this client
+    :param protocol: either persistent or oneshot
+    :return: The latencies in nanoseconds and the number of errors
+    """
+    latencies = []
+    errors = 0
+    address = ("127.0.0.1", port)
+    if protocol == "persistent":
+        sock = None
+        for query in queries:
+            start = time.perf_counter_ns()
+            try:
+                if sock is None:
+                    sock = socket.create_connection(address)
+                    buffer = b""
+                sock.sendall(query.encode() + b"\n")
+                _, buffer = read_response(sock, buffer)
+            except (OSError, ValueError):
+                # The query failed like a oneshot one would, and the
+                # next one is sent on a new connection.
+                errors += 1
+                if sock is not None:
+                    sock.close()
+                    sock = None
+                continue
+            latencies.append(time.perf_counter_ns() - start)
+        if sock is not None:
+            sock.close()
+        return latencies, errors
+    for query in queries:
+        start = time.perf_counter_ns()
+        try:
+            with socket.create_connection(address) as sock:
+                sock.sendall(query.encode())
+                read_response(sock, b"")
+        except (OSError, ValueError):
+            errors += 1
+            continue
+        latencies.append(time.perf_counter_ns() - start)
+    return latencies, errors
+
+
+def run_load(port, queries, concurrency, protocol):
+    """Send queries from concurrent clients.
+
+    :param port: the port of the server
+    :param queries: all the queries of the run
+    :param concurrency: the number of concurrent clients
+    :param protocol: either persistent or oneshot
+    :return: The summary of the run
+    """
+    shares = [queries[i::concurrency] for i in range(concurrency)]
+    start = time.perf_counter_ns()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(
+            lambda share: run_client(port, share, protocol), shares
+        ))
+    seconds = (time.perf_counter_ns() - start) / 1e9
+    latencies = [latency for result in results for latency in result[0]]
+    errors = sum(result[1] for result in results)
+    return summarize(latencies, seconds, errors)
+
+
+def run_benchmark(sizes, engines, rereads, modes, concurrencies,
+                  protocol="persistent", queries=2000, data_dir="."):
+    """Run every combination of the benchmark parameters.
+
+    A server is started for every data file, engine, REREAD_ON_QUERY
+    setting and server mode, and measured at every concurrency level
+
+    :return: A list with a dict for every run
+    """
+    results = []
+    for lines in sizes:
+        file_path = os.path.abspath(data_file(data_dir, lines))
+        run_queries = make_queries(file_path, queries)
+        for engine in engines:
+            for reread in rereads:
+                for mode in modes:
+                    with tempfile.TemporaryDirectory() as work_dir:
+                        port = free_port()
+                        write_config(work_dir, file_path, port, engine,
+                                     reread, mode, protocol)
+                        process = start_server(work_dir, port)
+                        try:
+                            for concurrency in concurrencies:
+                                result = {
+                                    "lines": lines,
+                                    "engine": engine,
+                                    "reread_on_query": reread,
+                                    "mode": mode,
+                                    "protocol": protocol,
+                                    "concurrency": concurrency,
+                                }
+                                result.update(run_load(
+                                    port, run_queries, concurrency, protocol
+                                ))
+                                print(json.dumps(result), file=sys.stderr)
+                                results.append(result)
+                        finally:
+                            stop_server(process)
+    return results
+
+
+def write_results(results, output):
+    """Write the results as JSON and CSV.
+
+    :param results: the list of results of run_benchmark
+    :param output: the path of the files without extension
+    """
+    with open(output + ".json", "w") as f:
+        json.dump(results, f, indent=2)
+    with open(output + ".csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def int_list(text):
+    """Parse a comma-separated list of integers."""
+    return [int(value) for value in text.split(",")]
+
+
+def name_list(text):
+    """Parse a comma-separated list of names."""
+    return [value.strip() for value in text.split(",") if value.strip()]
+
+
+def switch_list(text):
+    """Parse a comma-separated list of on and off."""
+    return [value.strip() == "on" for value in text.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure the latency and throughput of the server."
+    )
+    parser.add_argument("--sizes", type=int_list,
+                        default=[10000, 100000, 250000, 1000000],
+                        help="the numbers of lines of the data files")
+    parser.add_argument("--engines", type=name_list, default=["hash"],
+                        help="the search engines")
+    parser.add_argument("--reread", type=switch_list, default=[False, True],
+                        help="REREAD_ON_QUERY settings, off and/or on")
+    parser.add_argument("--modes", type=name_list, default=["threaded"],
+                        help="the server modes")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 4, 16],
+                        help="the numbers of concurrent clients")
+    parser.add_argument("--protocol", default="persistent",
+                        choices=["persistent", "oneshot"],
+                        help="the protocol of the clients")
+    parser.add_argument("--queries", type=int, default=2000,
+                        help="the number of queries of every run")
+    parser.add_argument("--data-dir", default=".",
+                        help="the directory of the generated data files")
+    parser.add_argument("--output", default="benchmark_results",
+                        help="the path of the JSON and CSV files without "
+                             "extension")
+    args = parser.parse_args()
+    results = run_benchmark(
+        args.sizes,
+        args.engines,
+        args.reread,
+        args.modes,
+        args.concurrency,
+        protocol=args.protocol,
+        queries=args.queries,
+        data_dir=args.data_dir,
+    )
+    write_results(results, args.output)
+    print(f"Wrote {len(results)} results to {args.output}.json and "
+          f"{args.output}.csv")
@@ -0,0 +1,84 @@
+"""Bloom filter script."""
+
+import hashlib
+import math
+import struct
+
+DIGEST = struct.Struct("<QQ")
+
+
+class BloomFilter:
+    """Probabilistic set that answers definite misses.
+
+    A string that was added is always reported as present, while a
+    string that was not added is reported as present with about the
+    false-positive rate the filter was sized for.
+    """
+
+    def __init__(self, capacity, fp_rate):
+        """Create an empty filter.
+
+        :param capacity: The number of strings the filter is sized for
+        :param fp_rate: The false-positive rate at that capacity
+        """
+        capacity = max(capacity, 1)
+        self.size = max(
+            8, math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2)
+        )
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        """Return the bit positions of an item.
+
+        The positions are derived from two 64-bit halves of a single
+        blake2b digest (double hashing)
+
+        :param item: a string or bytes
+        :return: A list of bit positions
+        """
+        if isinstance(item, str):
+            item = item.encode("utf-8")
+        digest = hashlib.blake2b(item, digest_size=16).digest()
+        first, second = DIGEST.unpack(digest)
+        return [
+            (first + i * second) % self.size for i in range(self.hash_count)
+        ]
+
+    def add(self, item):
+        """Add a string or bytes to the filter."""
+        bits = self.bits
+        for position in self._positions(item):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def update(self, items):
+        """Add many strings or bytes to the filter."""
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item):
+        """Check whether a string or bytes may have been added."""
+        bits = self.bits
+        for position in self._positions(item):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    @classmethod
+    def from_bits(cls, size, hash_count, bits):
+        """Create a filter from the state of another one.
+
+        :param size: The number of bits of the filter
+        :param hash_count: The number of positions of every item
+        :param bits: The bits of the filter as bytes
+        :return: A new BloomFilter
+        """
+        bloom = cls.__new__(cls)
+        bloom.size = size
+        bloom.hash_count = hash_count
+        bloom.bits = bytearray(bits)
+        return bloom
+
+    def copy(self):
+        """Return a copy of the filter."""
+        return BloomFilter.from_bits(self.size, self.hash_count, self.bits)
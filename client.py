@@ -1,8 +1,31 @@
 """Sends a query to the server."""
 
+import asyncio
 import configparser
+import queue
 import socket
 import sys
+import threading
+import time
+
+from protocol import (
+    BATCH_COMMAND,
+    CONTAINS_ANY_COMMAND,
+    FILTER_COMMAND,
+    PREFIX_COMMAND,
+    PREFIX_COUNT_COMMAND,
+    SUBSTRING_COMMAND,
+    VECTOR_BATCH_COMMAND,
+    RESULT_LENGTH,
+    STATUS_FOUND,
+    STATUS_NOT_FOUND,
+    STATUS_RESULT,
+    AsyncLineReader,
+    LineReader,
+    decode_batch_results,
+    encode_frame,
+    escape_query,
+)
 
 
 # Reading the configs.ini file and storing the data in the
@@ -31,7 +54,7 @@ def send_request(query):
         # Creating a socket, connecting to the server
         client_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         client_sock.connect(SOCK_ADDRESS)
-        message = query.encode(DATA_FORMAT)
+        message = escape_query(query).encode(DATA_FORMAT)
         client_sock.send(message)
 
         # message from the server
@@ -48,3 +71,534 @@ def send_request(query):
     except socket.error as err:
         print(f"Error creating socket: {err}")
         sys.exit(1)
+
+
+def send_requests(queries):
+    """Send many requests to the server on one connection.
+
+    It creates a socket, connects it to the server and sends all the
+    queries at once as newline-delimited lines, without waiting for
+    each answer. The server must use the persistent protocol
+
+    :param queries: The strings to be searched in the database
+    :return: A list with True for every query that exists
+    """
+    try:
+        with socket.create_connection(SOCK_ADDRESS) as client_sock:
+            message = "".join(
+                escape_query(query) + "\n" for query in queries
+            )
+            client_sock.sendall(message.encode(DATA_FORMAT))
+
+            # Reading the responses until there is one for every query
+            responses = []
+            buffer = b""
+            while len(responses) < len(queries):
+                data = client_sock.recv(PAYLOAD_SIZE)
+                if not data:
+                    raise ConnectionError("Connection closed by the server")
+                *lines, buffer = (buffer + data).split(b"\n")
+                responses.extend(lines)
+
+        return [
+            response.decode(DATA_FORMAT) == "STRING EXISTS"
+            for response in responses
+        ]
+
+    # Catching the error and printing it.
+    except socket.error as err:
+        print(f"Error creating socket: {err}")
+        sys.exit(1)
+
+
+def send_batch_request(queries, vectorized=False):
+    """Send a batch request to the server.
+
+    It sends all the queries in a single batch request and reads the
+    one response with the result of every query
+
+    :param queries: The strings to be searched in the database
+    :param vectorized: Whether the server searches all the queries
+    with one vectorised binary search
+    :return: A list with True for every query that exists
+    """
+    command = VECTOR_BATCH_COMMAND if vectorized else BATCH_COMMAND
+    try:
+        with socket.create_connection(SOCK_ADDRESS) as client_sock:
+            message = f"{command} {len(queries)}\n"
+            message += "".join(query + "\n" for query in queries)
+            client_sock.sendall(message.encode(DATA_FORMAT))
+
+            # Reading the response until the end of the line
+            data = b""
+            while not data.endswith(b"\n"):
+                chunk = client_sock.recv(PAYLOAD_SIZE)
+                if not chunk:
+                    raise ConnectionError("Connection closed by the server")
+                data += chunk
+
+        response = data.decode(DATA_FORMAT)
+        if not response.startswith("RESULTS"):
+            raise ValueError(response.strip())
+        return decode_batch_results(response)
+
+    # Catching the error and printing it.
+    except (socket.error, ValueError) as err:
+        print(f"Error sending batch request: {err}")
+        sys.exit(1)
+
+
+def send_prefix_request(prefix, count_only=False):
+    """Send a prefix request to the server.
+
+    It asks the server for the strings that start with a prefix and
+    reads the matches, or only their number
+
+    :param prefix: The beginning of the strings to be searched
+    :param count_only: Whether only the number of matches is wanted
+    :return: The number of matches and the list of matches returned
+    by the server
+    """
+    command = PREFIX_COUNT_COMMAND if count_only else PREFIX_COMMAND
+    return send_match_request(command, prefix)
+
+
+def send_substring_request(fragment):
+    """Send a substring request to the server.
+
+    It asks the server for the strings that contain a fragment
+
+    :param fragment: The part of the strings to be searched
+    :return: The number of matches and the list of matches returned
+    by the server
+    """
+    return send_match_request(SUBSTRING_COMMAND, fragment)
+
+
+def send_filter_request(conditions):
+    """Send a filter request to the server.
+
+    It asks the server for the records whose fields match conditions
+
+    :param conditions: The conditions on 1-based fields, like
+    "3=12 5=0..4"
+    :return: The number of matches and the list of matching records
+    returned by the server
+    """
+    return send_match_request(FILTER_COMMAND, conditions)
+
+
+def send_contains_any_request(patterns):
+    """Send a contains any request to the server.
+
+    It asks the server for the lines that contain any of the patterns
+
+    :param patterns: The list of patterns to be searched
+    :return: The number of matching lines and the list of their
+    1-based line numbers returned by the server
+    """
+    count, line_ids = send_match_request(
+        CONTAINS_ANY_COMMAND, len(patterns), patterns
+    )
+    return count, [int(line_id) for line_id in line_ids]
+
+
+def send_match_request(command, argument, lines=()):
+    """Send a request that is answered with matching strings.
+
+    :param command: The command of the request
+    :param argument: The prefix or fragment to be searched
+    :param lines: The lines that follow the request header
+    :return: The number of matches and the list of matches returned
+    by the server
+    """
+    try:
+        with socket.create_connection(SOCK_ADDRESS) as client_sock:
+            message = f"{command} {argument}\n"
+            message += "".join(f"{line}\n" for line in lines)
+            client_sock.sendall(message.encode(DATA_FORMAT))
+
+            reader = LineReader(client_sock, PAYLOAD_SIZE)
+            header = (reader.readline() or b"").decode(DATA_FORMAT).split()
+            if header[:1] == ["COUNT"]:
+                return int(header[1]), []
+            if header[:1] != ["MATCHES"]:
+                raise ValueError(" ".join(header))
+            matches = [
+                reader.readline().decode(DATA_FORMAT)
+                for _ in range(int(header[2]))
+            ]
+            return int(header[1]), matches
+
+    # Catching the error and printing it.
+    except (socket.error, ValueError) as err:
+        print(f"Error sending {command} request: {err}")
+        sys.exit(1)
+
+
+class SearchClientError(Exception):
+    """A request failed or the server refused it."""
+
+
+def send_frame_requests(queries, dataset=""):
+    """Send queries to the server with the binary protocol.
+
+    It sends a frame for every query on one connection and reads the
+    one-byte status of every answer. Like SearchClient, it raises
+    SearchClientError when the request fails or the server refuses it
+
+    :param queries: The strings to be searched in the database
+    :param dataset: The name of the dataset, or an empty string for the
+    default one
+    :return: A list with True for every query that exists
+    """
+    try:
+        with socket.create_connection(SOCK_ADDRESS) as client_sock:
+            message = b"".join(
+                encode_frame(0, query.encode(DATA_FORMAT), dataset)
+                for query in queries
+            )
+            client_sock.sendall(message)
+            responses = client_sock.makefile("rb")
+            results = []
+            for _ in queries:
+                status = responses.read(1)
+                if not status:
+                    raise ConnectionError("Connection closed by the server")
+                if status[0] == STATUS_RESULT:
+                    (length,) = RESULT_LENGTH.unpack(
+                        responses.read(RESULT_LENGTH.size)
+                    )
+                    response = responses.read(length).decode(DATA_FORMAT)
+                    raise SearchClientError(response.strip())
+                if status[0] not in (STATUS_FOUND, STATUS_NOT_FOUND):
+                    raise SearchClientError(f"Status {status[0]}")
+                results.append(status[0] == STATUS_FOUND)
+            return results
+    except OSError as err:
+        raise SearchClientError(f"Binary requests failed: {err}") from err
+
+
+def parse_exists(response):
+    """Parse the response to a single query.
+
+    :param response: the response line as bytes, or None if the server
+    closed the connection
+    :return: True if the string exists, otherwise False
+    """
+    if response is None:
+        raise ConnectionError("Connection closed by the server")
+    response = response.decode(DATA_FORMAT)
+    if response == "STRING EXISTS":
+        return True
+    if response == "STRING NOT FOUND":
+        return False
+    raise SearchClientError(response)
+
+
+def parse_batch(response):
+    """Parse the response to a batch request.
+
+    :param response: the response line as bytes, or None if the server
+    closed the connection
+    :return: A list with True for every query that exists
+    """
+    if response is None:
+        raise ConnectionError("Connection closed by the server")
+    response = response.decode(DATA_FORMAT)
+    if not response.startswith("RESULTS"):
+        raise SearchClientError(response)
+    return decode_batch_results(response)
+
+
+def encode_batch(queries):
+    """Encode a batch request.
+
+    :param queries: The strings to be searched in the database
+    :return: The request as bytes
+    """
+    message = f"{BATCH_COMMAND} {len(queries)}\n"
+    message += "".join(query + "\n" for query in queries)
+    return message.encode(DATA_FORMAT)
+
+
+class SearchClient:
+    """Client that keeps a pool of persistent connections.
+
+    Connections are opened when they are first needed and reused by
+    later calls, also from other threads, so queries don't pay for a
+    TCP handshake each. A request that fails because of the network,
+    for instance on a connection the server closed while it was idle,
+    is sent again on a new connection. The server should use the
+    persistent protocol, a oneshot server answers single queries too
+    but closes the connection after each of them.
+    """
+
+    def __init__(self, address=SOCK_ADDRESS, pool_size=4, timeout=5.0,
+                 retries=2, retry_delay=0.05, batch_size=1000):
+        """Create a client.
+
+        :param address: The host and port of the server
+        :param pool_size: The largest number of open connections
+        :param timeout: The number of seconds to wait for a connection
+        or a response
+        :param retries: The number of times a failed request is sent
+        again
+        :param retry_delay: The number of seconds before the first
+        retry, doubled for every next one
+        :param batch_size: The largest number of queries sent in one
+        batch request by exists_many
+        """
+        self.address = address
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.batch_size = batch_size
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def __enter__(self):
+        """Use the client in a with statement."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Close the idle connections at the end of the statement."""
+        self.close()
+
+    def _connect(self):
+        """Open a connection to the server.
+
+        :return: The socket and its LineReader
+        """
+        sock = socket.create_connection(self.address, self.timeout)
+        sock.settimeout(self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock, LineReader(sock, PAYLOAD_SIZE)
+
+    def _acquire(self):
+        """Take an idle connection or open a new one."""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise SearchClientError("No connection of the pool is free")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, connection, reuse):
+        """Put a connection back in the pool, or close it.
+
+        :param connection: The socket and its LineReader
+        :param reuse: Whether the connection can take more requests
+        """
+        if reuse:
+            self._idle.put(connection)
+        else:
+            connection[0].close()
+        self._slots.release()
+
+    def _call(self, message, parse):
+        """Send a request and read its response line.
+
+        :param message: The request as bytes
+        :param parse: The function that turns the response line into
+        the result
+        :return: The result of parse
+        """
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.retry_delay * 2 ** (attempt - 1))
+            try:
+                connection = self._acquire()
+            except OSError as err:
+                error = err
+                continue
+            try:
+                connection[0].sendall(message)
+                result = parse(connection[1].readline())
+            except OSError as err:
+                self._release(connection, False)
+                error = err
+                continue
+            except BaseException:
+                # The server closes the connection after an error.
+                self._release(connection, False)
+                raise
+            self._release(connection, True)
+            return result
+        raise SearchClientError(
+            f"Request failed after {self.retries + 1} attempts: {error}"
+        ) from error
+
+    def exists(self, query):
+        """Check whether a string is in the database.
+
+        :param query: The string to be searched in the database
+        :return: True or False
+        """
+        message = (escape_query(query) + "\n").encode(DATA_FORMAT)
+        return self._call(message, parse_exists)
+
+    def exists_many(self, queries):
+        """Check whether many strings are in the database.
+
+        The queries are sent in batch requests of at most batch_size
+        queries each
+
+        :param queries: The strings to be searched in the database
+        :return: A list with True for every query that exists
+        """
+        queries = list(queries)
+        results = []
+        for start in range(0, len(queries), self.batch_size):
+            batch = queries[start:start + self.batch_size]
+            results.extend(self._call(encode_batch(batch), parse_batch))
+        return results
+
+    def close(self):
+        """Close the idle connections."""
+        while True:
+            try:
+                sock, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            sock.close()
+
+
+class AsyncSearchClient:
+    """Client with a pool of persistent connections for asyncio.
+
+    It does the same as SearchClient for coroutines running on a
+    single event loop.
+    """
+
+    def __init__(self, address=SOCK_ADDRESS, pool_size=4, timeout=5.0,
+                 retries=2, retry_delay=0.05, batch_size=1000):
+        """Create a client.
+
+        The parameters are the same as for SearchClient
+        """
+        self.address = address
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.batch_size = batch_size
+        self._idle = []
+        # Created on first use, so it belongs to the running loop.
+        self._slots = None
+
+    async def __aenter__(self):
+        """Use the client in an async with statement."""
+        return self
+
+    async def __aexit__(self, *exc_info):
+        """Close the idle connections at the end of the statement."""
+        await self.close()
+
+    async def _connect(self):
+        """Open a connection to the server.
+
+        :return: The AsyncLineReader and the writer of the connection
+        """
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(*self.address), self.timeout
+        )
+        return AsyncLineReader(reader, PAYLOAD_SIZE), writer
+
+    async def _acquire(self):
+        """Take an idle connection or open a new one."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise SearchClientError(
+                "No connection of the pool is free"
+            ) from None
+        if self._idle:
+            return self._idle.pop()
+        try:
+            return await self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, connection, reuse):
+        """Put a connection back in the pool, or close it."""
+        if reuse:
+            self._idle.append(connection)
+        else:
+            connection[1].close()
+        self._slots.release()
+
+    async def _call(self, message, parse):
+        """Send a request and read its response line.
+
+        :param message: The request as bytes
+        :param parse: The function that turns the response line into
+        the result
+        :return: The result of parse
+        """
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+            try:
+                connection = await self._acquire()
+            except (OSError, asyncio.TimeoutError) as err:
+                error = err
+                continue
+            try:
+                reader, writer = connection
+                writer.write(message)
+                await writer.drain()
+                line = await asyncio.wait_for(reader.readline(), self.timeout)
+                result = parse(line)
+            except (OSError, asyncio.TimeoutError) as err:
+                self._release(connection, False)
+                error = err
+                continue
+            except BaseException:
+                self._release(connection, False)
+                raise
+            self._release(connection, True)
+            return result
+        raise SearchClientError(
+            f"Request failed after {self.retries + 1} attempts: {error}"
+        ) from error
+
+    async def exists(self, query):
+        """Check whether a string is in the database.
+
+        :param query: The string to be searched in the database
+        :return: True or False
+        """
+        message = (escape_query(query) + "\n").encode(DATA_FORMAT)
+        return await self._call(message, parse_exists)
+
+    async def exists_many(self, queries):
+        """Check whether many strings are in the database.
+
+        :param queries: The strings to be searched in the database
+        :return: A list with True for every query that exists
+        """
+        queries = list(queries)
+        results = []
+        for start in range(0, len(queries), self.batch_size):
+            batch = queries[start:start + self.batch_size]
+            results.extend(
+                await self._call(encode_batch(batch), parse_batch)
+            )
+        return results
+
+    async def close(self):
+        """Close the idle connections."""
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
@@ -14,6 +14,16 @@ config.set("socket_info", "HOST", HOST)
 config.set("socket_info", "PORT", "5052")
 config.set("socket_info", "PAYLOAD_SIZE", "1024")
 config.set("socket_info", "DATA_FORMAT", "utf-8")
+# oneshot: one query per connection, persistent: many newline-delimited
+# queries per connection
+config.set("socket_info", "PROTOCOL", "oneshot")
+# largest payload of a binary frame, a client that starts with the
+# frame magic byte speaks the binary protocol whatever the protocol
+# setting
+config.set("socket_info", "FRAME_SIZE", "1048576")
+# number of seconds a connection may stay idle before it is closed,
+# empty to keep it open until the client closes it
+config.set("socket_info", "IDLE_TIMEOUT", "30")
 
 # creating a section for the address
 config.add_section("text_file")
@@ -22,10 +32,94 @@ config.set(
     "windows_path",
     "C:\\Users\\johna\\Documents\\windsor-code\\string-search-server\\d100.txt",
 )
+# index file built with mmap_index.py, searched instead of the data
+# file when it is set
+config.set("text_file", "INDEX_PATH", "")
+# search engine of the data file: linear, binary, jump, hash, bloom
+# or mmap, the mmap engine reads the index file
+config.set("text_file", "ENGINE", "hash")
+# file the built index is saved to and loaded from on the next start
+# while the data file is unchanged or was only appended to, empty to
+# always build it from the data file
+config.set("text_file", "SNAPSHOT_PATH", "")
 
 # creating a section for query on reread
 config.add_section("query_file")
 config.set("query_file", "REREAD_ON_QUERY", "")
+# largest number of queries accepted in a single batch request
+config.set("query_file", "BATCH_LIMIT", "10000")
+# largest number of lines returned for a prefix, substring, contains
+# any or filter query
+config.set("query_file", "PREFIX_LIMIT", "1000")
+# false-positive rate of a Bloom filter that answers most misses
+# without searching the index, empty to disable it
+config.set("query_file", "BLOOM_FP_RATE", "")
+# build the trigram index for substring queries when the data is
+# loaded instead of on the first substring query, empty to disable it
+config.set("query_file", "SUBSTRING_INDEX", "")
+# number of compiled pattern sets of contains any queries kept for
+# the next queries with the same patterns
+config.set("query_file", "AUTOMATON_CACHE_SIZE", "32")
+# build the field index of the records for filter queries when the
+# data is loaded instead of on the first filter query, empty to
+# disable it
+config.set("query_file", "STRUCTURED_INDEX", "")
+# number of responses of exact, prefix and substring queries kept
+# for repeated queries until the data is reloaded, 0 to disable it,
+# exact queries of the hash and bloom engines never use it
+config.set("query_file", "RESULT_CACHE_SIZE", "10000")
+# number of seconds a cached response is kept, empty to keep it until
+# it is evicted or the data is reloaded
+config.set("query_file", "RESULT_CACHE_TTL", "")
+
+# creating a section for the server mode, either threaded, asyncio
+# or prefork
+config.add_section("server")
+config.set("server", "MODE", "threaded")
+# number of worker processes in prefork mode
+config.set("server", "WORKERS", "4")
+# number of seconds a new connection waits for a free worker thread
+# of the threaded server before it is refused with "SERVER BUSY"
+config.set("server", "BUSY_TIMEOUT", "1")
+# port of the HTTP endpoint serving the metrics in the Prometheus
+# text format, empty to disable it
+config.set("server", "METRICS_PORT", "")
+
+# creating a section for the logs, which are written by a background
+# thread, with the lowest level logged (DEBUG logs every connection)
+config.add_section("logging")
+config.set("logging", "LEVEL", "INFO")
+# number of records waiting to be written before new ones are dropped
+config.set("logging", "QUEUE_SIZE", "10000")
+# largest number of records written before the output is flushed
+config.set("logging", "BATCH_SIZE", "100")
+# share of the queries that are logged, between 0 and 1
+config.set("logging", "SAMPLE_RATE", "1")
+# file the queries are logged to instead of the console, rotated at
+# the given size with a number of old files kept, empty to disable it
+config.set("logging", "QUERY_LOG_PATH", "")
+config.set("logging", "QUERY_LOG_MAX_BYTES", "10485760")
+config.set("logging", "QUERY_LOG_BACKUPS", "5")
+
+# creating a section for loading the data file, with the number of
+# bytes read at a time and the memory the index builder may use
+config.add_section("loader")
+config.set("loader", "CHUNK_SIZE", "1048576")
+config.set("loader", "MEMORY_BUDGET", "536870912")
+# number of bytes of lines in each sorted run when the data file is
+# sorted on disk because it doesn't fit in the memory budget
+config.set("loader", "RUN_SIZE", "67108864")
+
+# other datasets are served next to the data file of the text_file
+# section with a "dataset:NAME" section each, and requests target them
+# with an "@NAME " prefix, while a query of the data file that starts
+# with "@" is sent with it doubled, for instance:
+# config.add_section("dataset:logs")
+# config.set("dataset:logs", "PATH", "/data/logs.txt")
+# config.set("dataset:logs", "ENGINE", "bloom")
+# config.set("dataset:logs", "INDEX_PATH", "")
+# config.set("dataset:logs", "REREAD_ON_QUERY", "")
+# config.set("dataset:logs", "SNAPSHOT_PATH", "")
 
 
 with open("configs.ini", "w") as configs:
@@ -0,0 +1,533 @@
+"""Shared search data script."""
+
+import itertools
+import os
+import threading
+import zlib
+
+from bloom_filter import BloomFilter
+from field_index import FieldIndex
+from file_handling import CHUNK_SIZE, iter_lines
+from mmap_index import MmapIndex
+from ngram_index import TrigramIndex
+from search_algorithms import fixed_width_array, hash_search
+from snapshot import SnapshotError, read_header, read_snapshot, write_snapshot
+
+# Number of bytes at the end of the loaded data that are compared to
+# make sure a bigger file was only appended to.
+TAIL_SIZE = 4096
+
+# Number of appended sets kept before they are merged into one.
+MAX_LAYERS = 8
+
+
+class HashIndex:
+    """Immutable set of strings made of one or more frozen sets.
+
+    Appending lines creates a new index that shares the existing sets
+    and adds a small one on top, so readers holding the old index keep
+    a consistent view while the new one is being built.
+    """
+
+    def __init__(self, layers=()):
+        """Create an index.
+
+        :param layers: A tuple of frozen sets with the strings
+        """
+        self.layers = tuple(layers)
+        self._sorted = None
+        self._substring = None
+        self._vector = None
+
+    def __contains__(self, target):
+        """Check whether a string is in any of the layers."""
+        for layer in self.layers:
+            if target in layer:
+                return True
+        return False
+
+    def __len__(self):
+        """Return the number of strings in the index."""
+        return sum(len(layer) for layer in self.layers)
+
+    def __iter__(self):
+        """Iterate over the strings of every layer."""
+        return itertools.chain.from_iterable(self.layers)
+
+    def sorted_view(self):
+        """Return the strings as a sorted list.
+
+        The list is only built the first time it is needed, for prefix
+        queries, and is then kept with this index
+
+        :return: A sorted list of strings
+        """
+        if self._sorted is None:
+            self._sorted = sorted(self)
+        return self._sorted
+
+    def vector_view(self):
+        """Return the sorted strings as fixed-width bytes.
+
+        Like the sorted view, it is built once and kept with this index
+
+        :return: The array returned by fixed_width_array
+        """
+        if self._vector is None:
+            self._vector = fixed_width_array(self.sorted_view())
+        return self._vector
+
+    def substring_view(self):
+        """Return a trigram index of the strings.
+
+        Like the sorted view, it is built once and kept with this index
+
+        :return: A TrigramIndex over the sorted strings
+        """
+        if self._substring is None:
+            self._substring = TrigramIndex(self.sorted_view())
+        return self._substring
+
+    def extend(self, lines):
+        """Return a new index with extra lines.
+
+        The appended lines become a new layer, and once there are too
+        many layers they are merged back into a single frozen set
+
+        :param lines: The strings to add
+        :return: A new HashIndex
+        """
+        layer = frozenset(lines)
+        if not layer:
+            return self
+        layers = self.layers + (layer,)
+        if len(layers) > MAX_LAYERS:
+            layers = (frozenset().union(*layers),)
+        return HashIndex(layers)
+
+
+class BloomIndex:
+    """Index with a Bloom filter in front of it.
+
+    Most queries are misses, and the filter answers them without
+    touching the index, which for a memory-mapped index saves the page
+    faults of a binary search.
+    """
+
+    def __init__(self, index, bloom):
+        """Create a filtered index.
+
+        :param index: The index holding the strings
+        :param bloom: A BloomFilter with every string of the index
+        """
+        self.index = index
+        self.bloom = bloom
+
+    @classmethod
+    def build(cls, index, fp_rate):
+        """Build a Bloom filter for an index.
+
+        :param index: The index holding the strings
+        :param fp_rate: The false-positive rate of the filter
+        :return: A new BloomIndex
+        """
+        bloom = BloomFilter(len(index), fp_rate)
+        bloom.update(index)
+        return cls(index, bloom)
+
+    def __contains__(self, target):
+        """Check the filter first and the index only if it may match."""
+        return target in self.bloom and target in self.index
+
+    def __len__(self):
+        """Return the number of strings in the index."""
+        return len(self.index)
+
+    def __iter__(self):
+        """Iterate over the strings of the index."""
+        return iter(self.index)
+
+    def sorted_view(self):
+        """Return the strings of the index in sorted order."""
+        return self.index.sorted_view()
+
+    def vector_view(self):
+        """Return the fixed-width sorted strings of the index."""
+        return self.index.vector_view()
+
+    def substring_view(self):
+        """Return the trigram index of the index."""
+        return self.index.substring_view()
+
+    def extend(self, lines):
+        """Return a new filtered index with extra lines.
+
+        The filter is copied, so readers of this index are not affected
+
+        :param lines: The strings to add
+        :return: A new BloomIndex
+        """
+        lines = list(lines)
+        bloom = self.bloom.copy()
+        bloom.update(lines)
+        return BloomIndex(self.index.extend(lines), bloom)
+
+
+class Corpus:
+    """Process-wide search data shared by all worker threads.
+
+    The data file is read once and kept in memory as a hash index, so
+    every connection answers exact-match lookups in constant time
+    instead of re-reading and re-sorting the file. When the file
+    changes, `refresh` reloads it and swaps the new index in at once.
+    """
+
+    def __init__(self, file_name, chunk_size=CHUNK_SIZE, bloom_fp_rate=None,
+                 substring_index=False, engine=None):
+        """Create a corpus for a data file.
+
+        :param file_name: The path to the file with the search data
+        :param chunk_size: The number of bytes read at a time
+        :param bloom_fp_rate: The false-positive rate of a Bloom filter
+        built in front of the index, or None for no filter
+        :param substring_index: Whether the trigram index for substring
+        queries is built with every new index instead of on first use
+        :param engine: The SearchEngine that builds the index and
+        answers lookups, or None for the hash index
+        """
+        self.file_name = file_name
+        self.chunk_size = chunk_size
+        self.bloom_fp_rate = bloom_fp_rate
+        self.substring_index = substring_index
+        self.engine = engine
+        self.index = None
+        self._data = None
+        self._signature = None
+        self._offset = 0
+        self._tail_hash = None
+        self._ends_with_newline = True
+        self._field_index = None
+        self._vector = None
+        self._lock = threading.Lock()
+
+    def _file_signature(self):
+        """Return the inode, size and modification time of the file."""
+        stat = os.stat(self.file_name)
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _read_tail_hash(self, end):
+        """Return a checksum of the data right before an offset.
+
+        :param end: The offset where the data ends
+        :return: The CRC32 of the last TAIL_SIZE bytes before end
+        """
+        start = max(0, end - TAIL_SIZE)
+        with open(self.file_name, "rb") as f:
+            f.seek(start)
+            return zlib.crc32(f.read(end - start))
+
+    def _prepare(self, index):
+        """Prepare a new index before it is swapped in.
+
+        It builds the trigram index and puts a Bloom filter in front of
+        the index when they are wanted, so queries never wait for them
+        after a reload
+
+        :param index: The index that was just built
+        :return: The index to swap in
+        """
+        if self.substring_index and hasattr(index, "substring_view"):
+            index.substring_view()
+        # Sorted lists are searched by position, so only the indexes
+        # get a filter.
+        if self.bloom_fp_rate and isinstance(index, (HashIndex, MmapIndex)):
+            return BloomIndex.build(index, self.bloom_fp_rate)
+        return index
+
+    def _ingest(self, index, offset):
+        """Read the file from an offset and swap in the new index.
+
+        :param index: The index the new lines are added to
+        :param offset: The offset to start reading from
+        :return: The new index
+        """
+        signature = self._file_signature()
+        end = signature[1]
+        # The lines are streamed straight into the new set, so the
+        # whole file is never held in memory as a list first.
+        lines = iter_lines(self.file_name, offset, end, self.chunk_size)
+        lines = (line.decode("utf-8") for line in lines)
+        if self.engine is None:
+            new_index = index.extend(lines)
+        elif offset:
+            new_index = self.engine.extend(index, lines)
+        else:
+            new_index = self.engine.build(lines)
+        self._offset = end
+        self._signature = signature
+        self._tail_hash = self._read_tail_hash(end)
+        if offset == 0:
+            self._ends_with_newline = True
+        if end > offset:
+            with open(self.file_name, "rb") as f:
+                f.seek(end - 1)
+                self._ends_with_newline = f.read(1) == b"\n"
+        # A single assignment, so queries see either the old index or
+        # the new one and never a half built one.
+        self._data = new_index
+        self.index = self._prepare(new_index)
+        return self.index
+
+    def load(self):
+        """Load the data file.
+
+        It reads the whole data file and makes it the index used by
+        every lookup
+
+        :return: The loaded index
+        """
+        with self._lock:
+            return self._ingest(HashIndex(), 0)
+
+    def _is_append(self, signature):
+        """Check whether the file only grew since it was loaded.
+
+        :param signature: The current signature of the file
+        :return: True if the new lines can be read from the old offset
+        """
+        inode, size, _ = signature
+        if self.index is None or not self._ends_with_newline:
+            return False
+        if self.engine is not None and not self.engine.incremental:
+            return False
+        if inode != self._signature[0] or size < self._offset:
+            return False
+        return self._read_tail_hash(self._offset) == self._tail_hash
+
+    def refresh(self):
+        """Reload the data file if it changed.
+
+        It compares the inode, size and modification time of the file
+        with the ones seen by the last load. When the file only grew,
+        only the new lines are read, otherwise it is loaded again
+
+        :return: True if the index was rebuilt, otherwise False
+        """
+        if self.index is not None and \
+                self._file_signature() == self._signature:
+            return False
+        with self._lock:
+            signature = self._file_signature()
+            if self.index is not None and signature == self._signature:
+                return False
+            if self._is_append(signature):
+                # The lines are added to the data the engine built, the
+                # Bloom filter put in front of it is built again.
+                self._ingest(self._data, self._offset)
+            else:
+                self._ingest(HashIndex(), 0)
+        return True
+
+    def _engine_name(self):
+        """Return the name of the engine stamped in snapshots."""
+        return "hash" if self.engine is None else self.engine.name
+
+    def save_snapshot(self, path):
+        """Write the index to a snapshot file.
+
+        The snapshot records the state of the data file the index was
+        built from, so load_snapshot can tell whether it is still valid
+
+        :param path: The path of the snapshot file
+        :return: True if the snapshot was written
+        """
+        with self._lock:
+            if self._data is None:
+                return False
+            inode, size, mtime_ns = self._signature
+            header = {
+                "engine": self._engine_name(),
+                "inode": inode,
+                "size": size,
+                "mtime_ns": mtime_ns,
+                "offset": self._offset,
+                "tail_hash": self._tail_hash,
+                "ends_with_newline": self._ends_with_newline,
+            }
+            if self.engine is None:
+                data = self._data.layers
+            else:
+                data = self.engine.dump(self._data)
+            write_snapshot(path, header, data)
+        return True
+
+    def load_snapshot(self, path):
+        """Load the index from a snapshot file.
+
+        The snapshot is only loaded when it was written by the same
+        engine for this data file, and the file is either unchanged or
+        may only have grown since. A refresh afterwards reads the new
+        lines, or loads the file again if it was changed otherwise
+
+        :param path: The path of the snapshot file
+        :return: The loaded index, or None if the snapshot can't be used
+        """
+        try:
+            with open(path, "rb") as f:
+                header = read_header(f)
+            inode, size, _ = self._file_signature()
+            if header["engine"] != self._engine_name() \
+                    or header["inode"] != inode or header["offset"] > size:
+                return None
+            header, data = read_snapshot(path)
+        except (OSError, KeyError, SnapshotError):
+            return None
+        if self.engine is None:
+            data = HashIndex(tuple(data))
+        else:
+            data = self.engine.restore(data)
+        with self._lock:
+            self._signature = (
+                header["inode"], header["size"], header["mtime_ns"]
+            )
+            self._offset = header["offset"]
+            self._tail_hash = header["tail_hash"]
+            self._ends_with_newline = header["ends_with_newline"]
+            self._data = data
+            self.index = self._prepare(data)
+            return self.index
+
+    def get_index(self):
+        """Return the index, loading it on first use.
+
+        Only the first caller loads the data file, every other thread
+        waits for it and then shares the same index
+
+        :return: The loaded index
+        """
+        if self.index is None:
+            self.refresh()
+        return self.index
+
+    def contains(self, query):
+        """Check whether a query is in the corpus.
+
+        :param query: The string to search for
+        :return: True or False
+        """
+        return self.lookup(self.get_index(), query)
+
+    def lookup(self, index, query):
+        """Check whether a query is in an index of this corpus.
+
+        :param index: The index returned by get_index
+        :param query: The string to search for
+        :return: True or False
+        """
+        if self.engine is None:
+            return hash_search(index, query)
+        return self.engine.lookup(index, query)
+
+    def scan(self):
+        """Iterate over the lines of the data file in their order.
+
+        :return: A generator of lines as bytes
+        """
+        return iter_lines(self.file_name, chunk_size=self.chunk_size)
+
+    def get_field_index(self):
+        """Return the field index of the records, building it if needed.
+
+        The field index is built from a scan of the data the first
+        time it is needed and again whenever a new index was swapped in
+
+        :return: The FieldIndex of the data
+        """
+        index = self.get_index()
+        field_index = self._field_index
+        if field_index is None or field_index[0] is not index:
+            field_index = (index, FieldIndex(self.scan()))
+            self._field_index = field_index
+        return field_index[1]
+
+    def vector_view(self, index):
+        """Return the sorted strings of an index as fixed-width bytes.
+
+        Indexes keep their own vector view, while the sorted lists of
+        the list engines are encoded the first time it is needed and
+        again whenever a new index was swapped in
+
+        :param index: The index returned by get_index
+        :return: The array returned by fixed_width_array
+        """
+        if hasattr(index, "vector_view"):
+            return index.vector_view()
+        vector = self._vector
+        if vector is None or vector[0] is not index:
+            vector = (index, fixed_width_array(index))
+            self._vector = vector
+        return vector[1]
+
+
+class MmapCorpus(Corpus):
+    """Search data read from a memory-mapped index file.
+
+    The index file is built from the data file with mmap_index.py, so
+    loading it takes no time and its pages are shared with every other
+    process through the page cache. When the index file is replaced,
+    `refresh` opens the new one.
+    """
+
+    def __init__(self, file_name, data_file="", **kwargs):
+        """Create a corpus for an index file.
+
+        :param file_name: The path to the index file
+        :param data_file: The path to the data file the index file was
+        built from, scanned for the queries that need the lines in
+        their order, or an empty string to scan the index file
+        :param kwargs: The other arguments of Corpus
+        """
+        super().__init__(file_name, **kwargs)
+        self.data_file = data_file
+
+    def _is_append(self, signature):
+        """Index files are always opened again when they change."""
+        return False
+
+    def save_snapshot(self, path):
+        """The index file is already on disk, so it isn't copied.
+
+        :return: False
+        """
+        return False
+
+    def load_snapshot(self, path):
+        """Index files are opened instead.
+
+        :return: None
+        """
+        return None
+
+    def scan(self):
+        """Iterate over the lines of the data file in their order.
+
+        Without a data file the lines of the index file are scanned in
+        sorted order instead, so contains any queries answer with their
+        positions in the index file rather than their line numbers.
+
+        :return: A generator of lines as bytes
+        """
+        if self.data_file:
+            return iter_lines(self.data_file, chunk_size=self.chunk_size)
+        return iter(self.get_index())
+
+    def _ingest(self, index, offset):
+        """Open the index file and swap it in.
+
+        :param index: Not used, the index file is opened again
+        :param offset: Not used, the index file is opened again
+        :return: The new index
+        """
+        self._signature = self._file_signature()
+        self.index = self._prepare(MmapIndex(self.file_name))
+        return self.index
@@ -0,0 +1,138 @@
+"""Datasets script.
+
+A server can serve several named datasets besides the data file of
+the [text_file] section, which is the default dataset. Every other
+dataset has a [dataset:NAME] section in configs.ini:
+
+    [dataset:logs]
+    path = /data/logs.txt
+    engine = bloom
+    reread_on_query =
+    index_path =
+    snapshot_path =
+
+Requests target a dataset with an @NAME prefix, see protocol.py, and
+requests without a prefix target the default dataset.
+"""
+
+from corpus import Corpus, MmapCorpus
+from file_handling import CHUNK_SIZE
+from result_cache import ResultCache
+from search_engines import get_engine
+
+# Name of the dataset of the [text_file] section.
+DEFAULT_DATASET = "default"
+
+# Prefix of the names of the dataset sections of configs.ini.
+SECTION_PREFIX = "dataset:"
+
+
+class UnknownDataset(KeyError):
+    """A request targets a dataset the server doesn't have."""
+
+
+class Dataset:
+    """A named corpus with its own reload policy and result cache."""
+
+    def __init__(self, name, corpus, reread_on_query=False,
+                 result_cache=None, snapshot_path=""):
+        """Create a dataset.
+
+        :param name: the name requests use to target the dataset
+        :param corpus: the Corpus of the dataset
+        :param reread_on_query: whether the data file is checked for
+        changes on every query instead of only when the server starts
+        :param result_cache: the ResultCache of the dataset, or None
+        for no cache
+        :param snapshot_path: the snapshot file of the index, or an
+        empty string for none
+        """
+        self.name = name
+        self.corpus = corpus
+        self.reread_on_query = reread_on_query
+        if result_cache is None:
+            result_cache = ResultCache(0)
+        self.result_cache = result_cache
+        self.snapshot_path = snapshot_path
+
+
+def open_corpus(file_name, engine_name="", index_path="",
+                chunk_size=CHUNK_SIZE, bloom_fp_rate=None,
+                substring_index=False):
+    """Create the corpus of a dataset.
+
+    :param file_name: the path to the data file
+    :param engine_name: the name of the search engine, or an empty
+    string for the default one
+    :param index_path: the index file built with mmap_index.py, which
+    is searched instead of the data file when it is set
+    :param chunk_size: the number of bytes read at a time
+    :param bloom_fp_rate: the false-positive rate of a Bloom filter in
+    front of the index, or None for no filter
+    :param substring_index: whether the trigram index is built with
+    every new index
+    :return: A Corpus, or a MmapCorpus for an index file
+    """
+    engine = get_engine(engine_name)
+    if engine.name == "mmap" and not index_path:
+        raise ValueError(
+            "The mmap engine needs an INDEX_PATH built with mmap_index.py"
+        )
+    # The bloom engine builds its own filter, with the configured rate
+    # rather than its default one.
+    if engine.name == "bloom" and bloom_fp_rate:
+        engine.fp_rate = bloom_fp_rate
+    if index_path:
+        return MmapCorpus(
+            index_path,
+            data_file=file_name,
+            bloom_fp_rate=bloom_fp_rate,
+            substring_index=substring_index,
+            engine=get_engine("mmap"),
+        )
+    return Corpus(
+        file_name,
+        chunk_size=chunk_size,
+        bloom_fp_rate=bloom_fp_rate,
+        substring_index=substring_index,
+        engine=engine,
+    )
+
+
+def read_datasets(config_data, chunk_size=CHUNK_SIZE, bloom_fp_rate=None,
+                  substring_index=False, cache_size=0, cache_ttl=None):
+    """Create the datasets of the [dataset:NAME] sections.
+
+    The loader, Bloom filter, substring index and result cache
+    settings are shared by every dataset
+
+    :param config_data: the ConfigParser of configs.ini
+    :return: A dict of the datasets by name
+    """
+    datasets = {}
+    for section in config_data.sections():
+        if not section.startswith(SECTION_PREFIX):
+            continue
+        name = section[len(SECTION_PREFIX):]
+        if name.split() != [name] or name == DEFAULT_DATASET:
+            raise ValueError(f"Invalid dataset name in [{section}]")
+        settings = config_data[section]
+        try:
+            corpus = open_corpus(
+                settings.get("PATH", ""),
+                settings.get("ENGINE", ""),
+                settings.get("INDEX_PATH", ""),
+                chunk_size=chunk_size,
+                bloom_fp_rate=bloom_fp_rate,
+                substring_index=substring_index,
+            )
+        except ValueError as err:
+            raise ValueError(f"[{section}]: {err}") from None
+        datasets[name] = Dataset(
+            name,
+            corpus,
+            reread_on_query=bool(settings.get("REREAD_ON_QUERY", "")),
+            result_cache=ResultCache(cache_size, cache_ttl),
+            snapshot_path=settings.get("SNAPSHOT_PATH", ""),
+        )
+    return datasets
@@ -0,0 +1,125 @@
+"""External merge sort script."""
+
+import heapq
+import sys
+import tempfile
+
+# Default number of bytes of lines sorted in memory for each run.
+RUN_SIZE = 64 * 1024 * 1024
+
+
+def write_run(lines, run_dir):
+    """Write a sorted run to a file.
+
+    :param lines: The sorted, unique lines as bytes
+    :param run_dir: The directory the run file is written to
+    :return: The path of the run file
+    """
+    with tempfile.NamedTemporaryFile(
+        "wb", dir=run_dir, suffix=".run", delete=False
+    ) as f:
+        f.writelines(line + b"\n" for line in lines)
+        return f.name
+
+
+def sorted_runs(lines, run_dir, run_size=RUN_SIZE, progress=None, runs=None):
+    """Split lines into sorted runs.
+
+    It collects lines until they add up to run_size bytes, sorts them
+    and writes them to a run file, so only one run is held in memory
+
+    :param lines: The lines as bytes, in any order
+    :param run_dir: The directory the run files are written to
+    :param run_size: The number of bytes of lines in each run
+    :param progress: a function called with a message after each run
+    :param runs: a list of run files the new ones are added to
+    :return: The list of paths of the run files
+    """
+    runs = [] if runs is None else runs
+    run = set()
+    used = 0
+    for line in lines:
+        run.add(line)
+        used += len(line)
+        if used >= run_size:
+            runs.append(write_run(sorted(run), run_dir))
+            if progress is not None:
+                progress(f"Sorted run {len(runs)} ({len(run)} lines)")
+            run = set()
+            used = 0
+    if run:
+        runs.append(write_run(sorted(run), run_dir))
+        if progress is not None:
+            progress(f"Sorted run {len(runs)} ({len(run)} lines)")
+    return runs
+
+
+def merge_runs(runs, progress=None, progress_every=1000000):
+    """Merge sorted runs.
+
+    It does a k-way merge of the run files with a heap, reading every
+    file line by line, and skips the lines that appear in more than
+    one run
+
+    :param runs: The paths of the run files
+    :param progress: a function called with a message every
+    progress_every merged lines
+    :param progress_every: The number of lines between two messages
+    :return: A generator of the sorted, unique lines as bytes
+    """
+    if progress is not None:
+        progress(f"Merging {len(runs)} runs")
+    files = [open(run, "rb") for run in runs]
+    try:
+        previous = None
+        count = 0
+        # The newlines are removed before the lines are compared, a
+        # line followed by a newline would otherwise sort after the
+        # same line followed by a byte below it, such as a tab.
+        lines = [(line[:-1] for line in f) for f in files]
+        for line in heapq.merge(*lines):
+            if line != previous:
+                previous = line
+                count += 1
+                if progress is not None and count % progress_every == 0:
+                    progress(f"Merged {count} lines")
+                yield line
+        if progress is not None:
+            progress(f"Merged {count} lines")
+    finally:
+        for f in files:
+            f.close()
+
+
+def external_sort(lines, run_size=RUN_SIZE, temp_dir=None, progress=None,
+                  first_run=None):
+    """Sort lines that may not fit in memory.
+
+    The lines are split into sorted runs that are spilled to temporary
+    files and then merged, so memory only has to hold one run. The run
+    files are removed once the generator is exhausted or closed
+
+    :param lines: The lines as bytes, in any order
+    :param run_size: The number of bytes of lines in each run
+    :param temp_dir: The directory for the run files, or None for the
+    default temporary directory
+    :param progress: a function called with progress messages
+    :param first_run: lines already collected in memory, written as
+    the first run
+    :return: A generator of the sorted, unique lines as bytes
+    """
+    with tempfile.TemporaryDirectory(dir=temp_dir) as run_dir:
+        runs = []
+        if first_run:
+            runs.append(write_run(sorted(first_run), run_dir))
+            if progress is not None:
+                progress(f"Sorted run 1 ({len(first_run)} lines)")
+            # Only one run is kept in memory at a time.
+            first_run = None
+        sorted_runs(lines, run_dir, run_size, progress, runs)
+        yield from merge_runs(runs, progress)
+
+
+def print_progress(message):
+    """Print a progress message to stderr."""
+    print(message, file=sys.stderr)
@@ -0,0 +1,157 @@
+"""Structured field index script.
+
+The lines written by generate_data.generate_random_ips are records of
+eight small integers separated by ";". A field index keeps every field
+in its own column with one byte per record, so a filter such as
+"field 3 == 12 and field 5 in 0..4" is answered with a few operations
+on whole columns instead of a loop over the records:
+
+    - bytes.translate turns a column into a mask with the byte 1 for
+      every record whose field is in the wanted range and 0 otherwise,
+    - int.from_bytes turns the mask into an integer, so the masks of
+      all the conditions are combined with a single bitwise and.
+
+Filters are written as space-separated conditions on 1-based fields,
+either "3=12" or "5=0..4".
+"""
+
+import re
+import sys
+import time
+
+# Number of fields in every record.
+FIELD_COUNT = 8
+
+# Largest value of a field, so that it fits in one byte.
+FIELD_MAX = 255
+
+CONDITION = re.compile(r"(\d+)=(\d+)(?:\.\.(\d+))?")
+
+
+def parse_record(line):
+    """Parse a record into its fields.
+
+    :param line: a line as a string or bytes
+    :return: The list of field values, or None if the line is not a
+    record of FIELD_COUNT small integers
+    """
+    if isinstance(line, str):
+        line = line.encode("utf-8")
+    fields = line.rstrip(b";").split(b";")
+    if len(fields) != FIELD_COUNT or not all(f.isdigit() for f in fields):
+        return None
+    values = [int(field) for field in fields]
+    if max(values) > FIELD_MAX:
+        return None
+    return values
+
+
+def parse_filter(text):
+    """Parse a filter.
+
+    :param text: the conditions separated by spaces, like "3=12 5=0..4"
+    :return: A list of conditions as (field position, lowest value,
+    highest value), with 0-based field positions
+    """
+    conditions = []
+    for part in text.split():
+        match = CONDITION.fullmatch(part)
+        if match is None:
+            raise ValueError(f"Invalid condition: {part}")
+        field, low, high = match.groups()
+        field = int(field)
+        low = int(low)
+        high = low if high is None else int(high)
+        if not 1 <= field <= FIELD_COUNT:
+            raise ValueError(f"Invalid field: {field}")
+        conditions.append((field - 1, low, high))
+    if not conditions:
+        raise ValueError("Empty filter")
+    return conditions
+
+
+def range_table(low, high):
+    """Return a translation table that marks a range of values.
+
+    :param low: the lowest value of the range
+    :param high: the highest value of the range
+    :return: A table mapping the values in the range to 1 and the
+    others to 0
+    """
+    return bytes(1 if low <= value <= high else 0 for value in range(256))
+
+
+class FieldIndex:
+    """Records of a data file stored as one byte column per field."""
+
+    def __init__(self, lines):
+        """Build the index.
+
+        Lines that are not records are left out and only counted
+
+        :param lines: The lines of the data file as strings or bytes
+        """
+        start_time = time.perf_counter()
+        columns = [bytearray() for _ in range(FIELD_COUNT)]
+        self.skipped = 0
+        for line in lines:
+            values = parse_record(line)
+            if values is None:
+                self.skipped += 1
+                continue
+            for column, value in zip(columns, values):
+                column.append(value)
+        self.columns = [bytes(column) for column in columns]
+        self.rows = len(self.columns[0])
+        self.build_time = time.perf_counter() - start_time
+
+    def __len__(self):
+        """Return the number of records in the index."""
+        return self.rows
+
+    def memory_size(self):
+        """Return the approximate number of bytes the columns use."""
+        return sum(sys.getsizeof(column) for column in self.columns)
+
+    def record(self, row):
+        """Return a record as a line.
+
+        :param row: The position of the record
+        :return: The fields of the record separated by ";"
+        """
+        return "".join(f"{column[row]};" for column in self.columns)
+
+    def mask(self, conditions):
+        """Return the mask of the records matching every condition.
+
+        :param conditions: a list of conditions from parse_filter
+        :return: An integer with the byte 1 for every matching record,
+        the first record in the lowest byte
+        """
+        mask = None
+        for field, low, high in conditions:
+            column = self.columns[field].translate(range_table(low, high))
+            field_mask = int.from_bytes(column, "little")
+            mask = field_mask if mask is None else mask & field_mask
+            if not mask:
+                break
+        return mask
+
+    def filter(self, conditions, limit=None):
+        """Return the records matching every condition.
+
+        :param conditions: a list of conditions from parse_filter
+        :param limit: The largest number of records returned, or None
+        :return: The number of matches and the list of matching records
+        """
+        mask = self.mask(conditions)
+        if not mask:
+            return 0, []
+        count = bin(mask).count("1")
+        marks = mask.to_bytes(self.rows, "little")
+        records = []
+        row = marks.find(1)
+        while row != -1 and (limit is None or len(records) < limit):
+            records.append(self.record(row))
+            row = marks.find(1, row + 1)
+        return count, records
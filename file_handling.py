@@ -2,7 +2,18 @@
 
 import re
 
-from search_algorithms import binary_search, jump_search, linear_search
+from search_algorithms import (
+    binary_search,
+    binary_search_many,
+    hash_search,
+    jump_search,
+    linear_search,
+    prefix_search,
+    substring_search,
+)
+
+# Number of bytes read at a time by iter_lines.
+CHUNK_SIZE = 1024 * 1024
 
 
 def text_file_path(config_file):
@@ -27,7 +38,8 @@ def text_file_path(config_file):
         return f"{config_file} not found"
 
 
-def search_for_string(file_name, search_string, cached_data=None):
+def search_for_string(file_name, search_string, cached_data=None,
+                      algorithm=binary_search):
     """Search for a string given a search string and a list.
 
     It opens the file, reads the contents, and checks if the search
@@ -35,20 +47,108 @@ def search_for_string(file_name, search_string, cached_data=None):
 
     :param file_name: the name of the file you want to search
     :param search_string: the string you want to search for
+    :param algorithm: the search function used on the sorted list read
+    from the file, such as binary_search, jump_search or linear_search
     """
     if cached_data is None:
         # read from file
         try:
             search_list = strings_list(file_name)
-            return binary_search(search_list, search_string)
-            # return jump_search(search_list, search_string)
-            # return linear_search(search_list, search_string)
+            return algorithm(search_list, search_string)
         except TypeError:
             return f"File, '{file_name}' is not a text file or is encoded"\
                 + " in an unsupported format."
     else:
-        # search in cached data
-        return binary_search(cached_data, search_string)
+        # search in cached data, using the hash lookup unless the data
+        # was loaded as a sorted list
+        if isinstance(cached_data, list):
+            return binary_search(cached_data, search_string)
+        return hash_search(cached_data, search_string)
+
+
+def search_for_prefix(file_name, search_prefix, cached_data=None,
+                      limit=None):
+    """Search for the strings that start with a prefix.
+
+    It uses the sorted order of the data to find the matching strings
+    with two binary searches instead of scanning all of them
+
+    :param file_name: the name of the file you want to search
+    :param search_prefix: the prefix you want to search for
+    :param cached_data: the data to search in. If it's None, then
+    the data is read from the file
+    :param limit: the largest number of strings returned, or None
+    :return: The number of matches and the list of matching strings
+    """
+    if cached_data is None:
+        sorted_data = strings_list(file_name)
+    elif isinstance(cached_data, list):
+        sorted_data = cached_data
+    elif hasattr(cached_data, "sorted_view"):
+        sorted_data = cached_data.sorted_view()
+    else:
+        sorted_data = sorted(cached_data)
+    count, matches = prefix_search(sorted_data, search_prefix, limit)
+    return count, [
+        match.decode("utf-8") if isinstance(match, bytes) else match
+        for match in matches
+    ]
+
+
+def search_for_strings(file_name, search_strings, cached_data=None):
+    """Search for many strings in the sorted data at once.
+
+    The strings are searched with binary_search_many, which uses one
+    vectorised search for all of them when NumPy is installed
+
+    :param file_name: the name of the file you want to search
+    :param search_strings: the strings you want to search for
+    :param cached_data: the data to search in. If it's None, then
+    the data is read from the file
+    :return: A list with True for every string that exists
+    """
+    if cached_data is None:
+        sorted_data = strings_list(file_name)
+    elif isinstance(cached_data, list):
+        sorted_data = cached_data
+    elif hasattr(cached_data, "vector_view"):
+        sorted_data = cached_data.vector_view()
+    else:
+        sorted_data = sorted(cached_data)
+    return binary_search_many(sorted_data, search_strings)
+
+
+def search_for_substring(file_name, search_fragment, cached_data=None,
+                         limit=None):
+    """Search for the strings that contain a fragment.
+
+    It uses the trigram index of the data when there is one, so only
+    the strings containing every trigram of the fragment are checked,
+    and otherwise scans all of them
+
+    :param file_name: the name of the file you want to search
+    :param search_fragment: the fragment you want to search for
+    :param cached_data: the data to search in. If it's None, then
+    the data is read from the file
+    :param limit: the largest number of strings returned, or None
+    :return: The number of matches and the list of matching strings
+    """
+    if cached_data is None:
+        count, matches = substring_search(
+            strings_list(file_name), search_fragment, limit
+        )
+    elif hasattr(cached_data, "substring_view"):
+        count, matches = cached_data.substring_view().search(
+            search_fragment, limit
+        )
+    else:
+        count, matches = substring_search(
+            sorted(cached_data), search_fragment, limit
+        )
+    return count, [
+        match.decode("utf-8") if isinstance(match, bytes) else match
+        for match in matches
+    ]
 
 
 def strings_list(file_name):
@@ -72,3 +172,58 @@ def strings_list(file_name):
             return search_list
     except FileNotFoundError:
         return f"{file_name} not found"
+
+
+def strings_set(file_name):
+    """Generate a set of strings.
+
+    It opens the file, reads the lines, strips the newline characters,
+    and returns them as a frozen set so that lookups take constant time
+
+    :param file_name: The name of the file that contains the list of
+    strings to search for
+    :return: A frozenset of strings.
+    """
+    try:
+        with open(file_name, "r") as f:
+            return frozenset(search_string.strip() for search_string in f)
+    except FileNotFoundError:
+        return f"{file_name} not found"
+
+
+def iter_lines(file_name, start=0, end=None, chunk_size=CHUNK_SIZE):
+    """Read the lines of a file in large chunks.
+
+    It reads the file in binary chunks and yields the stripped lines
+    one at a time, so only a chunk and the line being built are held
+    in memory no matter how big the file is
+
+    :param file_name: The name of the file that contains the strings
+    :param start: The byte offset to start reading from
+    :param end: The byte offset to stop reading at, or None to read
+    until the end of the file
+    :param chunk_size: The number of bytes read at a time
+    :return: A generator of lines as bytes
+    """
+    with open(file_name, "rb", buffering=0) as f:
+        f.seek(start)
+        remaining = None if end is None else end - start
+        tail = b""
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(
+                chunk_size, remaining
+            )
+            chunk = f.read(size)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            lines = chunk.split(b"\n")
+            # The part after the last newline is kept for the next
+            # chunk, it is the beginning of a line.
+            lines[0] = tail + lines[0]
+            tail = lines.pop()
+            for line in lines:
+                yield line.strip()
+        if tail:
+            yield tail.strip()
@@ -33,14 +33,17 @@ def write_to_file(file_path):
                     break
 
 
-def generate_random_ips():
+def generate_random_ips(count=1000000, file_path="d1M.txt"):
     """Generate random ips.
 
     It generates a million random IP addresses and writes
     them to a file called d1M.txt
+
+    :param count: The number of addresses to generate
+    :param file_path: The path to the file the addresses are written to
     """
-    with open("d1M.txt", "w") as f:
-        for i in range(0, 1000000):
+    with open(file_path, "w") as f:
+        for i in range(0, count):
             col = ";"
             ip = (
                 str(random.randint(0, 30))
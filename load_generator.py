@@ -0,0 +1,330 @@
+"""Load generator script.
+
+It drives many concurrent connections to the server with asyncio,
+either as fast as the server answers (closed loop) or at a fixed
+target rate of queries per second (open loop). The queries are lines
+of the data file and strings that are not in it, mixed with a given
+hit ratio, so wrong answers are counted as well as failed requests.
+
+In open loop the latency of a query is measured from the time it was
+scheduled to be sent, so a server that falls behind shows up in the
+latencies instead of silently lowering the rate. Running several rates
+one after the other shows where the server saturates: the achieved
+rate stops following the target and the latencies grow.
+
+Usage: python load_generator.py [--connections N] [--qps R1,R2,...]
+                                [--duration S] [--hit-ratio F]
+                                [--protocol persistent|oneshot]
+                                [--data-file PATH] [--json PATH]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from benchmark import percentile
+from client import DATA_FORMAT, HOST, PAYLOAD_SIZE, PORT
+from file_handling import iter_lines, text_file_path
+from protocol import AsyncLineReader
+
+# Upper bounds of the latency histogram buckets, in microseconds.
+BUCKETS = tuple(2 ** power for power in range(4, 25))
+
+# Number of seconds a request may take before it counts as an error.
+TIMEOUT = 10
+
+
+def make_workload(file_name, hit_ratio=0.5, size=10000, seed=None):
+    """Pick the queries sent by the load generator.
+
+    :param file_name: the data file the hits are taken from
+    :param hit_ratio: the share of queries that are in the data file
+    :param size: the number of queries, they are sent in a loop
+    :param seed: the seed of the random choices
+    :return: A list of queries with True for the ones that exist
+    """
+    rng = random.Random(seed)
+    lines = []
+    # Reservoir sampling, so the data file is read once whatever its
+    # size and only size lines are kept.
+    for count, line in enumerate(iter_lines(file_name)):
+        if not line:
+            continue
+        if len(lines) < size:
+            lines.append(line.decode(DATA_FORMAT))
+        else:
+            position = rng.randrange(count + 1)
+            if position < size:
+                lines[position] = line.decode(DATA_FORMAT)
+    if not lines:
+        raise ValueError(f"{file_name} has no lines")
+    return [
+        (rng.choice(lines), True) if rng.random() < hit_ratio
+        else (f"{i};not;in;data;", False)
+        for i in range(size)
+    ]
+
+
+def histogram(latencies):
+    """Count latencies in buckets of doubling width.
+
+    :param latencies: the latencies in nanoseconds
+    :return: A list of (upper bound in microseconds, count) for the
+    buckets up to the last one that is not empty
+    """
+    counts = [0] * (len(BUCKETS) + 1)
+    for latency in latencies:
+        micros = latency / 1000
+        for position, bound in enumerate(BUCKETS):
+            if micros <= bound:
+                counts[position] += 1
+                break
+        else:
+            counts[-1] += 1
+    bounds = list(BUCKETS) + [float("inf")]
+    last = max((i for i, count in enumerate(counts) if count), default=-1)
+    return list(zip(bounds[:last + 1], counts[:last + 1]))
+
+
+class Stage:
+    """Results of one load stage."""
+
+    def __init__(self, target_qps, connections, duration):
+        """Create empty results.
+
+        :param target_qps: the target rate, or 0 for a closed loop
+        :param connections: the number of concurrent connections
+        :param duration: the number of seconds the stage lasts
+        """
+        self.target_qps = target_qps
+        self.connections = connections
+        self.duration = duration
+        self.latencies = []
+        self.errors = 0
+        self.wrong = 0
+        self.elapsed = 0
+
+    def report(self):
+        """Return the results as a dict.
+
+        :return: The rates, counts and latency percentiles in
+        microseconds, and the histogram
+        """
+        latencies = sorted(self.latencies)
+        elapsed = self.elapsed or self.duration
+
+        def micros(percent):
+            value = percentile(latencies, percent)
+            return None if value is None else round(value / 1000, 1)
+
+        return {
+            "target_qps": self.target_qps,
+            "connections": self.connections,
+            "completed": len(latencies),
+            "errors": self.errors,
+            "wrong": self.wrong,
+            "achieved_qps": round(len(latencies) / elapsed, 1),
+            "p50_us": micros(50),
+            "p90_us": micros(90),
+            "p99_us": micros(99),
+            "max_us": micros(100),
+            "histogram": [
+                [str(bound), count] for bound, count in histogram(latencies)
+            ],
+        }
+
+
+async def send_query(reader, writer, query, newline=True):
+    """Send a query and read the response line.
+
+    :param reader: the AsyncLineReader of the connection
+    :param writer: the stream the query is written to
+    :param query: the string to search for
+    :param newline: whether the query ends with a newline, which the
+    one-shot protocol doesn't use
+    :return: True if the server answered that the string exists
+    """
+    message = query + "\n" if newline else query
+    writer.write(message.encode(DATA_FORMAT))
+    await writer.drain()
+    response = await reader.readline()
+    if response is None:
+        raise ConnectionError("Connection closed by the server")
+    response = response.decode(DATA_FORMAT)
+    if response not in ("STRING EXISTS", "STRING NOT FOUND"):
+        raise ValueError(response)
+    return response == "STRING EXISTS"
+
+
+async def run_connection(address, protocol, workload, stage, start,
+                         offset, interval):
+    """Send queries on one connection until the stage ends.
+
+    :param address: the host and port of the server
+    :param protocol: persistent to keep the connection open, or
+    oneshot to open a new one for every query
+    :param workload: the queries and whether they exist
+    :param stage: the Stage the results are added to
+    :param start: the loop time the stage started at
+    :param offset: the delay of the first query of this connection
+    :param interval: the time between two queries of this connection
+    in open loop, or 0 for a closed loop
+    """
+    loop = asyncio.get_running_loop()
+    end = start + stage.duration
+    rng = random.Random()
+    connection = None
+    sent = 0
+    while True:
+        scheduled = start + offset + sent * interval if interval else None
+        now = loop.time()
+        if (now if scheduled is None else scheduled) >= end:
+            break
+        if scheduled is not None and scheduled > now:
+            await asyncio.sleep(scheduled - now)
+        began = time.perf_counter_ns()
+        # Open-loop latencies count the time the query waited for its
+        # turn, so they are measured from the scheduled time.
+        late = 0 if scheduled is None else loop.time() - scheduled
+        query, expected = rng.choice(workload)
+        sent += 1
+        try:
+            if connection is None:
+                streams = await asyncio.wait_for(
+                    asyncio.open_connection(*address), TIMEOUT
+                )
+                connection = (
+                    AsyncLineReader(streams[0], PAYLOAD_SIZE),
+                    streams[1],
+                )
+            found = await asyncio.wait_for(
+                send_query(*connection, query, protocol == "persistent"),
+                TIMEOUT,
+            )
+        except (OSError, ValueError, asyncio.TimeoutError):
+            stage.errors += 1
+            if connection is not None:
+                connection[1].close()
+            connection = None
+        else:
+            stage.latencies.append(
+                time.perf_counter_ns() - began + int(late * 1e9)
+            )
+            if found != expected:
+                stage.wrong += 1
+        if protocol != "persistent" and connection is not None:
+            connection[1].close()
+            connection = None
+    if connection is not None:
+        connection[1].close()
+
+
+async def run_stage(address, workload, connections, qps, duration,
+                    protocol="persistent"):
+    """Run one load stage.
+
+    :param address: the host and port of the server
+    :param workload: the queries and whether they exist
+    :param connections: the number of concurrent connections
+    :param qps: the target rate of queries per second, or 0 for a
+    closed loop
+    :param duration: the number of seconds the stage lasts
+    :param protocol: persistent or oneshot
+    :return: The Stage with the results
+    """
+    stage = Stage(qps, connections, duration)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    # In open loop the connections take turns, so the queries are
+    # evenly spread over time instead of sent in bursts.
+    interval = connections / qps if qps else 0
+    await asyncio.gather(*(
+        run_connection(
+            address,
+            protocol,
+            workload,
+            stage,
+            start,
+            i / qps if qps else 0,
+            interval,
+        )
+        for i in range(connections)
+    ))
+    stage.elapsed = loop.time() - start
+    return stage
+
+
+def print_report(report):
+    """Print the report of a stage with its latency histogram."""
+    target = report["target_qps"] or "closed loop"
+    print(f"Target: {target}, connections: {report['connections']}")
+    print(
+        f"Achieved: {report['achieved_qps']} queries/s, "
+        f"completed: {report['completed']}, errors: {report['errors']}, "
+        f"wrong answers: {report['wrong']}"
+    )
+    print(
+        f"Latency (us): p50 {report['p50_us']}, p90 {report['p90_us']}, "
+        f"p99 {report['p99_us']}, max {report['max_us']}"
+    )
+    largest = max((count for _, count in report["histogram"]), default=0)
+    for bound, count in report["histogram"]:
+        bar = "#" * round(40 * count / largest) if largest else ""
+        print(f"  <= {bound:>9} us {count:>8} {bar}")
+    print("-------------------------------------------------------")
+
+
+async def main(args):
+    """Run a stage for every target rate and report the results."""
+    workload = make_workload(args.data_file, args.hit_ratio, seed=args.seed)
+    reports = []
+    for qps in args.qps:
+        stage = await run_stage(
+            (args.host, args.port),
+            workload,
+            args.connections,
+            qps,
+            args.duration,
+            args.protocol,
+        )
+        report = stage.report()
+        print_report(report)
+        reports.append(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Send concurrent queries to the server."
+    )
+    parser.add_argument("--host", default=HOST,
+                        help="the server host, from configs.ini by default")
+    parser.add_argument("--port", type=int, default=PORT,
+                        help="the server port, from configs.ini by default")
+    parser.add_argument("--connections", type=int, default=16,
+                        help="the number of concurrent connections")
+    parser.add_argument("--qps",
+                        type=lambda text: [float(v) for v in text.split(",")],
+                        default=[0],
+                        help="comma-separated target rates, one stage "
+                             "each, 0 for a closed loop")
+    parser.add_argument("--duration", type=float, default=10,
+                        help="the number of seconds of every stage")
+    parser.add_argument("--hit-ratio", type=float, default=0.5,
+                        help="the share of queries that are in the data")
+    parser.add_argument("--protocol", default="persistent",
+                        choices=["persistent", "oneshot"],
+                        help="keep connections open or open one per query")
+    parser.add_argument("--data-file", default=None,
+                        help="the data file, from configs.ini by default")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="the seed of the random queries")
+    parser.add_argument("--json", default=None,
+                        help="a file the reports are written to as JSON")
+    args = parser.parse_args()
+    args.data_file = args.data_file or text_file_path("configs.ini")
+    asyncio.run(main(args))
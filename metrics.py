@@ -0,0 +1,175 @@
+"""Metrics script.
+
+Counters and latency histograms recorded by the server for every
+request, and gauges such as the size of every loaded dataset,
+aggregated in memory and rendered in the Prometheus text format,
+either for the STATS command or for an HTTP endpoint on a separate
+port. Durations are measured with time.perf_counter.
+"""
+
+import bisect
+import threading
+
+# Prefix of the names of all the metrics.
+NAMESPACE = "search_server"
+
+# Upper bounds of the histogram buckets in seconds, from 10
+# microseconds to 10 seconds.
+BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Histogram:
+    """Counts of observed durations in fixed buckets."""
+
+    def __init__(self, buckets=BUCKETS):
+        """Create an empty histogram.
+
+        :param buckets: the upper bounds of the buckets in seconds
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """Add a duration in seconds to the histogram."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Registry of the counters, gauges and histograms of the server.
+
+    Every update takes a single lock that is only held for a few
+    additions, so recording metrics costs far less than the request.
+    """
+
+    def __init__(self):
+        """Create an empty registry."""
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, labels="", amount=1):
+        """Add to a counter.
+
+        :param name: the name of the counter, without the namespace
+        :param labels: the labels in the Prometheus format, such as
+        'command="PREFIX"', or an empty string
+        :param amount: the number added to the counter
+        """
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set(self, name, labels="", value=0):
+        """Set a gauge.
+
+        :param name: the name of the gauge, without the namespace
+        :param labels: the labels in the Prometheus format, or an empty
+        string
+        :param value: the new value of the gauge
+        """
+        with self._lock:
+            self.gauges[(name, labels)] = value
+
+    def observe(self, name, seconds):
+        """Add a duration to a histogram.
+
+        :param name: the name of the histogram, without the namespace
+        :param seconds: the duration in seconds
+        """
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def reset(self):
+        """Remove every counter, gauge and histogram."""
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+    def render(self):
+        """Render the metrics in the Prometheus text format.
+
+        :return: The metrics as a string
+        """
+        with self._lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            histograms = sorted(
+                (name, list(histogram.counts), histogram.sum,
+                 histogram.count, histogram.buckets)
+                for name, histogram in self.histograms.items()
+            )
+        lines = []
+        typed = set()
+        for kind, values in (("counter", counters), ("gauge", gauges)):
+            for (name, labels), value in values:
+                metric = f"{NAMESPACE}_{name}"
+                if metric not in typed:
+                    typed.add(metric)
+                    lines.append(f"# TYPE {metric} {kind}")
+                labels = f"{{{labels}}}" if labels else ""
+                lines.append(f"{metric}{labels} {value}")
+        for name, counts, total, count, buckets in histograms:
+            metric = f"{NAMESPACE}_{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            seen = 0
+            for bound, bucket_count in zip(buckets, counts):
+                seen += bucket_count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {seen}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {count}')
+            lines.append(f"{metric}_sum {total}")
+            lines.append(f"{metric}_count {count}")
+        return "".join(line + "\n" for line in lines)
+
+
+# The registry shared by every thread of the process.
+metrics = Metrics()
+
+
+def start_http_server(host, port):
+    """Serve the metrics over HTTP in a background thread.
+
+    The metrics are served on GET /metrics, other paths are not found
+
+    :param host: the address to listen on
+    :param port: the port to listen on
+    :return: The HTTP server, stopped with its shutdown method
+    """
+    # Imported here, most servers never serve the metrics over HTTP.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        """Serve the metrics on GET /metrics."""
+
+        def do_GET(self):
+            """Answer with the metrics, or 404 for other paths."""
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            """Don't log every scrape."""
+
+    http_server = ThreadingHTTPServer((host, port), MetricsHandler)
+    http_server.daemon_threads = True
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+    return http_server
@@ -0,0 +1,282 @@
+"""Memory-mapped sorted index script.
+
+An index file holds the sorted, unique lines of a data file so the
+server can search them without loading the file into Python objects:
+
+    magic      8 bytes   b"SSIDX001"
+    count      8 bytes   number of lines, little-endian
+    offsets    8 bytes   for each line plus one, the offset of the line
+                         in the blob, little-endian
+    blob       the bytes of all the lines, without line endings
+
+Data files whose lines do not fit in the memory budget are sorted
+on disk with an external merge sort.
+
+Usage: python mmap_index.py [--chunk-size N] [--memory-budget N]
+                            [--run-size N] [--temp-dir DIR]
+                            <data file> <index file>
+"""
+
+import argparse
+import configparser
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+
+from external_sort import RUN_SIZE, external_sort, print_progress
+from file_handling import CHUNK_SIZE, iter_lines
+from ngram_index import TrigramIndex
+from search_algorithms import fixed_width_array
+
+MAGIC = b"SSIDX001"
+HEADER = struct.Struct("<8sQ")
+
+# Default number of bytes the builder may use for the lines it holds.
+MEMORY_BUDGET = 512 * 1024 * 1024
+
+# Approximate number of bytes a line takes in memory on top of its
+# length: the bytes object header plus its slots in a set and a list.
+LINE_OVERHEAD = sys.getsizeof(b"") + 32
+
+
+class MmapIndex:
+    """Sorted lines of a data file, searched in a memory-mapped file.
+
+    Only the pages that a lookup touches are read, and they live in
+    the page cache where every process that maps the file shares them.
+    """
+
+    def __init__(self, index_file):
+        """Open an index file.
+
+        :param index_file: The path to a file written by build_index
+        """
+        with open(index_file, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.mm) < HEADER.size:
+            raise ValueError(f"{index_file} is not an index file")
+        magic, self.count = HEADER.unpack_from(self.mm)
+        if magic != MAGIC:
+            raise ValueError(f"{index_file} is not an index file")
+        table_end = HEADER.size + 8 * (self.count + 1)
+        table = memoryview(self.mm)[HEADER.size:table_end]
+        if sys.byteorder == "little":
+            self.offsets = table.cast("Q")
+        else:
+            self.offsets = array("Q", table)
+            self.offsets.byteswap()
+        self.blob_start = table_end
+        self._substring = None
+        self._vector = None
+
+    def __len__(self):
+        """Return the number of lines in the index."""
+        return self.count
+
+    def __getitem__(self, position):
+        """Return the line at a position in sorted order as bytes."""
+        if not 0 <= position < self.count:
+            raise IndexError("index position out of range")
+        start = self.blob_start + self.offsets[position]
+        end = self.blob_start + self.offsets[position + 1]
+        return self.mm[start:end]
+
+    def __iter__(self):
+        """Iterate over the lines in sorted order as bytes."""
+        for position in range(self.count):
+            yield self[position]
+
+    def sorted_view(self):
+        """Return the index itself, its lines are already sorted."""
+        return self
+
+    def vector_view(self):
+        """Return the lines as fixed-width bytes, built on first use.
+
+        With NumPy this is a copy of the lines in memory, without it
+        the index itself is searched
+        """
+        if self._vector is None:
+            self._vector = fixed_width_array(self)
+        return self._vector
+
+    def substring_view(self):
+        """Return a trigram index of the lines, built on first use.
+
+        Only the posting lists are held in memory, the lines are still
+        read from the index file
+        """
+        if self._substring is None:
+            self._substring = TrigramIndex(self)
+        return self._substring
+
+    def bisect_left(self, target):
+        """Return the position where target would be inserted.
+
+        :param target: The string or bytes to look for
+        :return: The position of the first line not less than target
+        """
+        if isinstance(target, str):
+            target = target.encode("utf-8")
+        first, last = 0, self.count
+        while first < last:
+            midpoint = (first + last) // 2
+            if self[midpoint] < target:
+                first = midpoint + 1
+            else:
+                last = midpoint
+        return first
+
+    def __contains__(self, target):
+        """Check whether a string or bytes is one of the lines."""
+        if isinstance(target, str):
+            target = target.encode("utf-8")
+        position = self.bisect_left(target)
+        return position < self.count and self[position] == target
+
+
+def build_index(data_file, index_file, chunk_size=CHUNK_SIZE,
+                memory_budget=MEMORY_BUDGET, run_size=RUN_SIZE,
+                temp_dir=None, progress=None):
+    """Build an index file from a data file.
+
+    It streams the lines of the data file, removes duplicates, sorts
+    them and writes them in the index file format. Once the lines would
+    need more memory than the budget, the rest of the data file is
+    sorted on disk with an external merge sort instead
+
+    :param data_file: The path to the plain text data file
+    :param index_file: The path to the index file to write
+    :param chunk_size: The number of bytes read at a time
+    :param memory_budget: The number of bytes the lines may use
+    :param run_size: The number of bytes of lines in each sorted run
+    :param temp_dir: The directory for temporary files, or None for
+    the default temporary directory
+    :param progress: a function called with progress messages
+    :return: The number of lines in the index
+    """
+    lines = iter_lines(data_file, chunk_size=chunk_size)
+    collected = set()
+    used = 0
+    for line in lines:
+        if line not in collected:
+            collected.add(line)
+            used += len(line) + LINE_OVERHEAD
+            if used > memory_budget:
+                break
+    else:
+        return write_index(sorted(collected), index_file, temp_dir)
+
+    if progress is not None:
+        progress("Memory budget exceeded, sorting on disk")
+    sorted_lines = external_sort(
+        lines,
+        run_size=min(run_size, memory_budget),
+        temp_dir=temp_dir,
+        progress=progress,
+        first_run=collected,
+    )
+    # The sort holds the only reference to the lines collected so far,
+    # so they are freed once they are written as its first run.
+    collected = None
+    return write_index(sorted_lines, index_file, temp_dir)
+
+
+def write_index(lines, index_file, temp_dir=None):
+    """Write sorted lines in the index file format.
+
+    The lines are read only once, so they may come from a generator.
+    The blob is written to a temporary file while the offsets are
+    collected, and both are then copied into the index file
+
+    :param lines: The sorted, unique lines as bytes
+    :param index_file: The path to the index file to write
+    :param temp_dir: The directory for the temporary files, or None
+    for the directory of the index file
+    :return: The number of lines written
+    """
+    temp_dir = temp_dir or os.path.dirname(os.path.abspath(index_file))
+    count = 0
+    offset = 0
+    with tempfile.TemporaryFile(dir=temp_dir) as table, \
+            tempfile.TemporaryFile(dir=temp_dir) as blob:
+        offsets = array("Q", [0])
+        for line in lines:
+            blob.write(line)
+            offset += len(line)
+            offsets.append(offset)
+            count += 1
+            # Spilling the offsets so they don't grow with the file.
+            if len(offsets) >= 65536:
+                write_offsets(offsets, table)
+                offsets = array("Q")
+        write_offsets(offsets, table)
+
+        with open(index_file, "wb") as f:
+            f.write(HEADER.pack(MAGIC, count))
+            for part in (table, blob):
+                part.seek(0)
+                shutil.copyfileobj(part, f)
+    return count
+
+
+def write_offsets(offsets, f):
+    """Write offsets to a file as little-endian 8-byte integers.
+
+    :param offsets: an array of offsets
+    :param f: the file to write to
+    """
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    offsets.tofile(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert a data file into a memory-mapped index file."
+    )
+    # The defaults come from the loader section of configs.ini.
+    config_data = configparser.ConfigParser()
+    config_data.read("configs.ini")
+    loader = config_data["loader"] if "loader" in config_data else {}
+
+    parser.add_argument("data_file", help="the plain text data file")
+    parser.add_argument("index_file", help="the index file to write")
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=int(loader.get("CHUNK_SIZE", CHUNK_SIZE)),
+        help="the number of bytes read at a time",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        default=int(loader.get("MEMORY_BUDGET", MEMORY_BUDGET)),
+        help="the number of bytes the lines may use while building",
+    )
+    parser.add_argument(
+        "--run-size",
+        type=int,
+        default=int(loader.get("RUN_SIZE", RUN_SIZE)),
+        help="the number of bytes of lines in each run of the disk sort",
+    )
+    parser.add_argument(
+        "--temp-dir",
+        default=None,
+        help="the directory for the temporary files of the disk sort",
+    )
+    args = parser.parse_args()
+    count = build_index(
+        args.data_file,
+        args.index_file,
+        chunk_size=args.chunk_size,
+        memory_budget=args.memory_budget,
+        run_size=args.run_size,
+        temp_dir=args.temp_dir,
+        progress=print_progress,
+    )
+    print(f"Wrote {count} lines to {args.index_file}")
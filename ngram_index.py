@@ -0,0 +1,106 @@
+"""Trigram inverted index script.
+
+Substring queries are answered without scanning every line: every
+three-character piece (trigram) of a line points to the positions of
+the lines that contain it. A fragment can only occur in the lines that
+contain all of its trigrams, so only those lines are checked.
+"""
+
+import bisect
+import sys
+import time
+from array import array
+
+from search_algorithms import substring_search
+
+# Number of characters, or bytes, in every gram of the index.
+GRAM_SIZE = 3
+
+
+def grams(line):
+    """Return the set of trigrams of a string or bytes."""
+    return {
+        line[i:i + GRAM_SIZE] for i in range(len(line) - GRAM_SIZE + 1)
+    }
+
+
+class TrigramIndex:
+    """Inverted index from trigrams to the lines containing them.
+
+    The index only keeps line positions, so the lines themselves stay
+    in the sequence it was built from, which may be a memory-mapped
+    index holding bytes.
+    """
+
+    def __init__(self, lines):
+        """Build the index.
+
+        :param lines: A sequence of strings or bytes, searched by
+        position
+        """
+        start_time = time.perf_counter()
+        self.lines = lines
+        self.postings = {}
+        for position, line in enumerate(lines):
+            for gram in grams(line):
+                posting = self.postings.get(gram)
+                if posting is None:
+                    posting = self.postings[gram] = array("I")
+                posting.append(position)
+        self.build_time = time.perf_counter() - start_time
+
+    def __len__(self):
+        """Return the number of trigrams in the index."""
+        return len(self.postings)
+
+    def memory_size(self):
+        """Return the approximate number of bytes the index uses."""
+        return sys.getsizeof(self.postings) + sum(
+            sys.getsizeof(gram) + sys.getsizeof(posting)
+            for gram, posting in self.postings.items()
+        )
+
+    def candidates(self, fragment):
+        """Return the positions of the lines with every trigram.
+
+        The shortest posting list is intersected with the others by
+        binary search, so the work depends on the rarest trigram
+
+        :param fragment: A string or bytes at least GRAM_SIZE long
+        :return: A sorted list of line positions
+        """
+        postings = []
+        for gram in grams(fragment):
+            posting = self.postings.get(gram)
+            if posting is None:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        positions = postings[0]
+        for posting in postings[1:]:
+            positions = [
+                position for position in positions
+                if _contains_sorted(posting, position)
+            ]
+        return list(positions)
+
+    def search(self, fragment, limit=None):
+        """Search for the lines that contain a fragment.
+
+        :param fragment: The string to search for
+        :param limit: The largest number of lines returned, or None
+        :return: The number of matches and the list of matching lines
+        """
+        if self.lines and isinstance(self.lines[0], bytes):
+            fragment = fragment.encode("utf-8")
+        # Fragments shorter than a trigram have no posting list.
+        if len(fragment) < GRAM_SIZE:
+            return substring_search(self.lines, fragment, limit)
+        lines = (self.lines[i] for i in self.candidates(fragment))
+        return substring_search(lines, fragment, limit)
+
+
+def _contains_sorted(arr, value):
+    """Check whether a value is in a sorted array."""
+    position = bisect.bisect_left(arr, value)
+    return position < len(arr) and arr[position] == value
@@ -3,7 +3,13 @@
 import configparser
 import datetime
 
-from client import send_request
+from client import send_batch_request, send_request
+from file_handling import strings_list
+from search_algorithms import (
+    binary_search,
+    binary_search_many,
+    fixed_width_array,
+)
 
 
 # Reading the configs.ini file and assigning the values
@@ -72,6 +78,70 @@ def get_query_statistics(query, algorithm_name, file_path):
             f.write("\n")
             f.write(f"{count} queries completed for {algorithm_name} search\n")
 
+            # For the same queries in a single batch request
+            f.write("\n\n")
+            f.write("------------- 100 QUERIES IN ONE BATCH -------------\n")
+            queries = [str.strip() for str in all_strings[:count]]
+            start_time = datetime.datetime.now()
+            f.write(f"START TIME: {start_time}\n")
+            send_batch_request(queries)
+            end_time = datetime.datetime.now()
+            f.write(f"Total queries: {len(queries)}\n")
+            f.write(f"END TIME: {end_time}\n")
+            time_results = (end_time - start_time).total_seconds()
+            f.write(f"Total execution time (s): {time_results}\n")
+            f.write(f"Average exec time per query (s): {time_results/count}\n")
+            f.write("\n")
+            f.write(f"Batch of {count} queries completed for {algorithm_name}"
+                    " search\n")
+
+
+def get_batch_membership_statistics(file_path, count=100000):
+    """Compare batch membership searches.
+
+    It searches the same batch of queries in the sorted lines of the
+    file, once with binary_search for every query and once with
+    binary_search_many, and writes the timings to a text file. Half
+    of the queries are lines of the file and the other half are not
+
+    :param file_path: This is the path to the file that contains the
+    strings
+    :param count: The number of queries in the batch
+    """
+    sorted_data = strings_list(file_path)
+    queries = [
+        sorted_data[i % len(sorted_data)] if i % 2 else f"{i};missing;"
+        for i in range(count)
+    ]
+    with open("BATCH_membership_statistics.txt", "w") as f:
+        f.write("-------BENCHMARK STATISTICS FOR BATCH MEMBERSHIP--------\n")
+        f.write(f"Sorted lines: {len(sorted_data)}, queries: {count}\n")
+        f.write("\n")
+
+        # One binary search in Python for every query
+        start_time = datetime.datetime.now()
+        loop_results = [binary_search(sorted_data, q) for q in queries]
+        end_time = datetime.datetime.now()
+        loop_time = (end_time - start_time).total_seconds()
+        f.write(f"Per-query binary search (s): {loop_time}\n")
+
+        # All the queries in a single vectorised search
+        start_time = datetime.datetime.now()
+        vector_data = fixed_width_array(sorted_data)
+        end_time = datetime.datetime.now()
+        f.write(
+            "Fixed-width encoding of the lines (s): "
+            f"{(end_time - start_time).total_seconds()}\n"
+        )
+        start_time = datetime.datetime.now()
+        vector_results = binary_search_many(vector_data, queries)
+        end_time = datetime.datetime.now()
+        vector_time = (end_time - start_time).total_seconds()
+        f.write(f"Vectorised binary search (s): {vector_time}\n")
+        f.write(f"Speedup: {loop_time / max(vector_time, 1e-9):.1f}x\n")
+        f.write(f"Same results: {loop_results == vector_results}\n")
+
 
 if __name__ == "__main__":
     get_query_statistics("2;3;12;29;13;3;19;22;", "BINARY", file_path=file_path)
+    get_batch_membership_statistics(file_path)
@@ -0,0 +1,141 @@
+"""Pre-fork worker processes script."""
+
+import os
+import signal
+import time
+
+from server_log import logger
+
+# Number of seconds a stopped worker has to finish its connections
+# before it is killed.
+STOP_TIMEOUT = 30
+
+
+class RestartWorkers(Exception):
+    """The workers were asked to restart."""
+
+
+def _interrupt(signum, frame):
+    """Turn a termination signal into a KeyboardInterrupt."""
+    raise KeyboardInterrupt
+
+
+def _restart(signum, frame):
+    """Turn a SIGHUP into a RestartWorkers exception."""
+    raise RestartWorkers
+
+
+def start_worker(serve):
+    """Start a worker process.
+
+    It forks the current process, and the child runs the serve
+    function until it returns. A SIGTERM stops the worker the same way
+    as CTRL + C, so it finishes the connections it is handling first.
+
+    :param serve: the function that accepts and handles connections
+    :return: The process id of the worker
+    """
+    pid = os.fork()
+    if pid == 0:
+        status = 0
+        try:
+            signal.signal(signal.SIGTERM, _interrupt)
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            serve()
+        except KeyboardInterrupt:
+            pass
+        except BaseException as err:
+            logger.error("Worker %d failed: %s", os.getpid(), err)
+            status = 1
+        finally:
+            os._exit(status)
+    logger.info("Worker %d started", pid)
+    return pid
+
+
+def stop_worker(pid, timeout=STOP_TIMEOUT):
+    """Stop a worker process.
+
+    It asks the worker to finish its connections and waits for it, and
+    kills it when it is still running after the timeout, so a restart
+    never hangs on a stuck worker.
+
+    :param pid: The process id of the worker
+    :param timeout: the number of seconds the worker has to exit
+    """
+    try:
+        os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + timeout
+        while os.waitpid(pid, os.WNOHANG) == (0, 0):
+            if time.monotonic() >= deadline:
+                logger.warning(
+                    "Worker %d didn't stop in time, killing it", pid
+                )
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+                break
+            time.sleep(0.05)
+    except (ProcessLookupError, ChildProcessError):
+        pass
+    logger.info("Worker %d stopped", pid)
+
+
+def restart_workers(serve, workers, on_restart=None):
+    """Restart the worker processes one at a time.
+
+    Every old worker is only stopped once its replacement is running,
+    so connections keep being accepted during the restart.
+
+    :param serve: the function that accepts and handles connections
+    :param workers: the set of process ids of the running workers
+    :param on_restart: a function called before the new workers are
+    started, for instance to reload the search data
+    :return: The set of process ids of the new workers
+    """
+    logger.info("Restarting workers...")
+    if on_restart is not None:
+        on_restart()
+    new_workers = set()
+    for pid in list(workers):
+        new_workers.add(start_worker(serve))
+        stop_worker(pid)
+    return new_workers
+
+
+def run_workers(serve, count, on_restart=None):
+    """Run worker processes until the server is interrupted.
+
+    It starts count workers, replaces workers that exit, restarts all
+    of them on SIGHUP and stops them on SIGTERM or CTRL + C.
+
+    :param serve: the function that accepts and handles connections
+    :param count: the number of worker processes
+    :param on_restart: a function called before the workers restart
+    """
+    if not hasattr(os, "fork"):
+        raise OSError("The pre-fork server needs os.fork")
+
+    workers = set()
+    signal.signal(signal.SIGTERM, _interrupt)
+    signal.signal(signal.SIGHUP, _restart)
+    try:
+        for _ in range(count):
+            workers.add(start_worker(serve))
+        while True:
+            try:
+                pid, _ = os.wait()
+                if pid in workers:
+                    logger.warning(
+                        "Worker %d exited, starting a new one", pid
+                    )
+                    workers.remove(pid)
+                    workers.add(start_worker(serve))
+            except RestartWorkers:
+                signal.signal(signal.SIGHUP, signal.SIG_IGN)
+                workers = restart_workers(serve, workers, on_restart)
+                signal.signal(signal.SIGHUP, _restart)
+    except KeyboardInterrupt:
+        logger.info("Shutting down server...")
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        for pid in workers:
+            stop_worker(pid)
@@ -0,0 +1,527 @@
+"""Wire protocol script.
+
+Requests are either newline-delimited text, described by the commands
+below, or binary frames. A binary frame starts with the FRAME_MAGIC
+byte, which never starts a text request, so the server picks the
+protocol of a connection from the first byte the client sends.
+"""
+
+import struct
+
+# Request header for many queries in one request:
+# "BATCH <count>\n" followed by <count> newline-delimited queries.
+# The response is "RESULTS <flags>\n" with a 1 or 0 for every query.
+BATCH_COMMAND = "BATCH"
+
+# Batch request answered with a vectorised binary search of the sorted
+# data instead of a lookup per query: "VBATCH <count>\n" followed by
+# <count> queries. The response is the same as for a batch request.
+VECTOR_BATCH_COMMAND = "VBATCH"
+
+# Request for the lines that start with a prefix: "PREFIX <prefix>".
+# The response is "MATCHES <total> <returned>\n" followed by the
+# returned lines, at most the configured result limit.
+PREFIX_COMMAND = "PREFIX"
+
+# Request for the number of lines that start with a prefix:
+# "PREFIXCOUNT <prefix>". The response is "COUNT <total>\n".
+PREFIX_COUNT_COMMAND = "PREFIXCOUNT"
+
+# Request for the lines that contain a fragment: "SUBSTR <fragment>".
+# The response is the same as for a prefix request.
+SUBSTRING_COMMAND = "SUBSTR"
+
+# Request for the lines that contain any of many patterns:
+# "CONTAINSANY <count>\n" followed by <count> newline-delimited
+# patterns. The response is "MATCHES <total> <returned>\n" followed by
+# the 1-based line numbers of the returned lines. For an index file
+# served without its data file, they are the positions of the lines in
+# the sorted index file instead.
+CONTAINS_ANY_COMMAND = "CONTAINSANY"
+
+# Request for the records whose fields match conditions:
+# "FILTER <conditions>", for instance "FILTER 3=12 5=0..4" with 1-based
+# fields. The response is the same as for a prefix request.
+FILTER_COMMAND = "FILTER"
+
+# Request for the metrics of the server: "STATS", without argument.
+# The response is "STATS <count>\n" followed by <count> lines of
+# metrics in the Prometheus text format.
+STATS_COMMAND = "STATS"
+
+# Prefix of a request line that targets a named dataset instead of the
+# default one: "@<name> <request>", for instance "@logs PREFIX 1;".
+# A request for a dataset the server doesn't have is answered with
+# "UNKNOWN DATASET\n". A query of the default dataset that starts with
+# the prefix is sent with the prefix doubled, "@@1;2;" for "@1;2;".
+DATASET_PREFIX = "@"
+
+# The order of the commands is part of the binary protocol, a frame of
+# type N carries the command at index N - 1.
+COMMANDS = (
+    BATCH_COMMAND,
+    VECTOR_BATCH_COMMAND,
+    PREFIX_COMMAND,
+    PREFIX_COUNT_COMMAND,
+    SUBSTRING_COMMAND,
+    CONTAINS_ANY_COMMAND,
+    FILTER_COMMAND,
+    STATS_COMMAND,
+)
+
+# First byte of every binary frame. It is not valid in UTF-8, so no
+# text request starts with it.
+FRAME_MAGIC = 0xFF
+
+# Header of a binary request frame, followed by the name of the dataset
+# and the payload:
+#     magic | type | dataset name length | payload length (big-endian)
+# The type is 0 for a plain query, otherwise the index of the command
+# in COMMANDS plus 1. An empty name targets the default dataset. The
+# payload is the query or the argument of the command, the queries or
+# patterns of a batch request separated by newlines.
+FRAME_HEADER = struct.Struct(">BBBI")
+
+# Frame types, a plain query followed by the commands.
+FRAME_TYPES = (None,) + COMMANDS
+
+# Number of bytes of the buffer a frame reader starts with. It grows
+# when a longer frame arrives, up to the longest frame accepted.
+FRAME_BUFFER_SIZE = 65536
+
+# Status byte that starts every response to a binary frame. A response
+# is only that byte, except for STATUS_RESULT which is followed by the
+# length of the text response (4 bytes, big-endian) and the response.
+STATUS_NOT_FOUND = 0
+STATUS_FOUND = 1
+STATUS_RESULT = 2
+STATUS_UNKNOWN_DATASET = 3
+STATUS_INVALID_FILTER = 4
+STATUS_BATCH_LIMIT_EXCEEDED = 5
+STATUS_PAYLOAD_SIZE_EXCEEDED = 6
+STATUS_INVALID_FRAME = 7
+
+RESULT_LENGTH = struct.Struct(">I")
+
+# Text responses that are sent as a single status byte.
+STATUS_RESPONSES = {
+    b"STRING NOT FOUND\n": STATUS_NOT_FOUND,
+    b"STRING EXISTS\n": STATUS_FOUND,
+    b"UNKNOWN DATASET\n": STATUS_UNKNOWN_DATASET,
+    b"INVALID FILTER\n": STATUS_INVALID_FILTER,
+    b"BATCH LIMIT EXCEEDED\n": STATUS_BATCH_LIMIT_EXCEEDED,
+    b"PAYLOAD SIZE EXCEEDED\n": STATUS_PAYLOAD_SIZE_EXCEEDED,
+    b"INVALID FRAME\n": STATUS_INVALID_FRAME,
+}
+
+# Statuses after which the server closes the connection, since the
+# next frame can't be found.
+CLOSING_STATUSES = (STATUS_PAYLOAD_SIZE_EXCEEDED, STATUS_INVALID_FRAME)
+
+# Commands that are sent without an argument.
+BARE_COMMANDS = (STATS_COMMAND,)
+
+# Commands whose header is followed by a number of lines.
+BATCH_COMMANDS = (BATCH_COMMAND, VECTOR_BATCH_COMMAND, CONTAINS_ANY_COMMAND)
+
+
+class PayloadSizeExceeded(Exception):
+    """A line is longer than the payload size."""
+
+
+class BatchLimitExceeded(Exception):
+    """A batch request has more queries than the batch limit."""
+
+
+class InvalidFrame(Exception):
+    """A binary frame has a wrong magic byte, type or dataset name."""
+
+
+class LineReader:
+    """Read newline-delimited lines from a socket.
+
+    It keeps the data received after the end of a line for the next
+    one, so lines may arrive split over several reads or many lines
+    may arrive in a single one.
+    """
+
+    def __init__(self, conn, payload_size, buffer=b""):
+        """Create a reader for a connection.
+
+        :param conn: the socket object
+        :param payload_size: the longest line that is accepted
+        :param buffer: data already received from the connection
+        """
+        self.conn = conn
+        self.payload_size = payload_size
+        self.buffer = buffer
+
+    def has_line(self):
+        """Check whether a full line can be read without waiting."""
+        return b"\n" in self.buffer
+
+    def readline(self):
+        """Read a line.
+
+        It returns the next line without the line ending, the data
+        left when the client closes the connection without a final
+        newline, or None once everything was read
+
+        :return: The line as bytes, or None
+        """
+        while b"\n" not in self.buffer:
+            if len(self.buffer) > self.payload_size:
+                raise PayloadSizeExceeded
+            data = self.conn.recv(self.payload_size)
+            if not data:
+                line, self.buffer = self.buffer, b""
+                return line.rstrip(b"\r\x00") or None
+            self.buffer += data
+        line, self.buffer = self.buffer.split(b"\n", 1)
+        if len(line) > self.payload_size:
+            raise PayloadSizeExceeded
+        return line.rstrip(b"\r\x00")
+
+
+class AsyncLineReader(LineReader):
+    """Read newline-delimited lines from an asyncio stream."""
+
+    def __init__(self, reader, payload_size, buffer=b""):
+        """Create a reader for a stream.
+
+        :param reader: the asyncio stream reader
+        :param payload_size: the longest line that is accepted
+        :param buffer: data already read from the stream
+        """
+        super().__init__(None, payload_size, buffer)
+        self.reader = reader
+
+    async def readline(self):
+        """Read a line.
+
+        It does the same as LineReader.readline without blocking the
+        event loop
+
+        :return: The line as bytes, or None
+        """
+        while b"\n" not in self.buffer:
+            if len(self.buffer) > self.payload_size:
+                raise PayloadSizeExceeded
+            data = await self.reader.read(self.payload_size)
+            if not data:
+                line, self.buffer = self.buffer, b""
+                return line.rstrip(b"\r\x00") or None
+            self.buffer += data
+        line, self.buffer = self.buffer.split(b"\n", 1)
+        if len(line) > self.payload_size:
+            raise PayloadSizeExceeded
+        return line.rstrip(b"\r\x00")
+
+
+class FrameReader:
+    """Read binary frames from a socket.
+
+    The frames are received with recv_into into a buffer of the
+    connection, and their payloads are returned as views of that
+    buffer, so they are never copied. Many frames may arrive in a
+    single read, or a frame may arrive over several reads. The buffer
+    starts small and only grows for a frame that doesn't fit in it.
+    """
+
+    def __init__(self, conn, payload_size, buffer=b""):
+        """Create a reader for a connection.
+
+        :param conn: the socket object
+        :param payload_size: the longest payload that is accepted
+        :param buffer: data already received from the connection
+        """
+        self.conn = conn
+        self.payload_size = payload_size
+        self.max_size = FRAME_HEADER.size + 255 + payload_size
+        size = min(FRAME_BUFFER_SIZE, self.max_size)
+        self.buffer = bytearray(max(size, len(buffer)))
+        self.view = memoryview(self.buffer)
+        self.view[:len(buffer)] = buffer
+        self.start = 0
+        self.end = len(buffer)
+
+    def has_frame(self):
+        """Check whether a full frame can be read without waiting."""
+        available = self.end - self.start
+        if available < FRAME_HEADER.size:
+            return False
+        _, _, name_length, payload_length = FRAME_HEADER.unpack_from(
+            self.buffer, self.start
+        )
+        return available >= FRAME_HEADER.size + name_length + payload_length
+
+    def _make_room(self, size):
+        """Make room for a number of unread bytes.
+
+        The unread data is moved to the front when they don't fit after
+        it, and to a bigger buffer when they don't fit in this one.
+
+        :param size: the number of bytes
+        """
+        if self.start + size <= len(self.buffer):
+            return
+        length = self.end - self.start
+        if size > len(self.buffer):
+            # Doubling the buffer, so a run of growing frames doesn't
+            # copy the data every time.
+            buffer = bytearray(
+                min(max(size, 2 * len(self.buffer)), self.max_size)
+            )
+            buffer[:length] = self.view[self.start:self.end]
+            self.buffer, self.view = buffer, memoryview(buffer)
+        else:
+            self.view[:length] = self.view[self.start:self.end]
+        self.start, self.end = 0, length
+
+    def _fill(self, size):
+        """Receive data until a number of bytes are unread.
+
+        :param size: the number of bytes
+        :return: False when the client closed the connection first
+        """
+        self._make_room(size)
+        while self.end - self.start < size:
+            received = self.conn.recv_into(self.view[self.end:])
+            if not received:
+                return False
+            self.end += received
+        return True
+
+    def _frame_size(self):
+        """Check the header of the next frame and return its size."""
+        magic, frame_type, name_length, payload_length = (
+            FRAME_HEADER.unpack_from(self.buffer, self.start)
+        )
+        if magic != FRAME_MAGIC or frame_type >= len(FRAME_TYPES):
+            raise InvalidFrame
+        if payload_length > self.payload_size:
+            raise PayloadSizeExceeded
+        return FRAME_HEADER.size + name_length + payload_length
+
+    def _take_frame(self, size):
+        """Return the next frame and move past it."""
+        _, frame_type, name_length, _ = FRAME_HEADER.unpack_from(
+            self.buffer, self.start
+        )
+        start = self.start + FRAME_HEADER.size
+        try:
+            name = str(self.view[start:start + name_length], "utf-8")
+        except UnicodeDecodeError:
+            raise InvalidFrame from None
+        payload = self.view[start + name_length:self.start + size]
+        self.start += size
+        return frame_type, name or None, payload
+
+    def read_frame(self):
+        """Read a frame.
+
+        The payload is a view of the buffer, only valid until the next
+        frame is read
+
+        :return: The type, the dataset name or None for the default
+        dataset, and the payload as a memoryview, or None once the
+        client closed the connection
+        """
+        if not self._fill(FRAME_HEADER.size):
+            return None
+        size = self._frame_size()
+        if not self._fill(size):
+            return None
+        return self._take_frame(size)
+
+
+class AsyncFrameReader(FrameReader):
+    """Read binary frames from an asyncio stream."""
+
+    def __init__(self, reader, payload_size, buffer=b""):
+        """Create a reader for a stream.
+
+        :param reader: the asyncio stream reader
+        :param payload_size: the longest payload that is accepted
+        :param buffer: data already read from the stream
+        """
+        super().__init__(None, payload_size, buffer)
+        self.reader = reader
+
+    async def _fill(self, size):
+        """Read data until a number of bytes are unread.
+
+        Streams have no recv_into, so the data read is copied into the
+        buffer.
+
+        :param size: the number of bytes
+        :return: False when the client closed the connection first
+        """
+        self._make_room(size)
+        while self.end - self.start < size:
+            data = await self.reader.read(len(self.buffer) - self.end)
+            if not data:
+                return False
+            self.view[self.end:self.end + len(data)] = data
+            self.end += len(data)
+        return True
+
+    async def read_frame(self):
+        """Read a frame.
+
+        It does the same as FrameReader.read_frame without blocking the
+        event loop
+
+        :return: The type, the dataset name and the payload, or None
+        """
+        if not await self._fill(FRAME_HEADER.size):
+            return None
+        size = self._frame_size()
+        if not await self._fill(size):
+            return None
+        return self._take_frame(size)
+
+
+def parse_request(line):
+    """Split a request line into a command and its argument.
+
+    :param line: the first line of the request
+    :return: The command and the rest of the line, or None and the
+    whole line for a plain query
+    """
+    if line in BARE_COMMANDS:
+        return line, ""
+    command, separator, argument = line.partition(" ")
+    if separator and command in COMMANDS:
+        return command, argument
+    return None, line
+
+
+def split_dataset(line):
+    """Split the dataset name from a request line.
+
+    :param line: the first line of the request
+    :return: The name of the dataset, or None without a dataset
+    prefix, and the rest of the line
+    """
+    if not line.startswith(DATASET_PREFIX):
+        return None, line
+    if line.startswith(DATASET_PREFIX * 2):
+        return None, line[len(DATASET_PREFIX):]
+    name, _, rest = line[len(DATASET_PREFIX):].partition(" ")
+    return name, rest
+
+
+def escape_query(query):
+    """Escape a query of the default dataset for a request line.
+
+    :param query: the string to search for
+    :return: The query, with the dataset prefix doubled when it starts
+    with it
+    """
+    if query.startswith(DATASET_PREFIX):
+        return DATASET_PREFIX + query
+    return query
+
+
+def is_frame(data):
+    """Check whether the first data of a connection starts a frame.
+
+    :param data: the first bytes received from the client
+    :return: True for the binary protocol, False for the text one
+    """
+    return data[:1] == bytes((FRAME_MAGIC,))
+
+
+def encode_frame(frame_type, payload, dataset=""):
+    """Encode a binary request frame.
+
+    :param frame_type: 0 for a plain query, otherwise the index of the
+    command in FRAME_TYPES
+    :param payload: the payload as bytes
+    :param dataset: the name of the dataset, or an empty string for
+    the default one
+    :return: The frame as bytes
+    """
+    name = dataset.encode("utf-8")
+    header = FRAME_HEADER.pack(FRAME_MAGIC, frame_type, len(name),
+                               len(payload))
+    return header + name + payload
+
+
+def encode_frame_response(response):
+    """Encode the response to a binary frame.
+
+    :param response: the text response as bytes
+    :return: The status byte, followed by the length and the response
+    unless the status says it all
+    """
+    status = STATUS_RESPONSES.get(response)
+    if status is not None:
+        return bytes((status,))
+    return bytes((STATUS_RESULT,)) + RESULT_LENGTH.pack(len(response)) \
+        + response
+
+
+def parse_batch_header(line):
+    """Parse the header of a request followed by many lines.
+
+    :param line: the first line of the request
+    :return: The number of lines that follow the header, or None if
+    the line is not such a header
+    """
+    command, _, count = line.partition(" ")
+    if command not in BATCH_COMMANDS or not count.isdigit():
+        return None
+    return int(count)
+
+
+def encode_batch_results(results):
+    """Encode the results of a batch request.
+
+    :param results: a list with True for every query that exists
+    :return: The response message
+    """
+    flags = "".join("1" if found else "0" for found in results)
+    return f"RESULTS {flags}\n"
+
+
+def decode_batch_results(response):
+    """Decode the response to a batch request.
+
+    :param response: the response message
+    :return: A list with True for every query that exists
+    """
+    _, _, flags = response.strip().partition(" ")
+    return [flag == "1" for flag in flags]
+
+
+def encode_matches(total, lines):
+    """Encode the lines matching a query.
+
+    :param total: the number of matching lines
+    :param lines: the matching lines that are returned
+    :return: The response message
+    """
+    header = f"MATCHES {total} {len(lines)}\n"
+    return header + "".join(line + "\n" for line in lines)
+
+
+def encode_count(total):
+    """Encode the number of lines matching a query.
+
+    :param total: the number of matching lines
+    :return: The response message
+    """
+    return f"COUNT {total}\n"
+
+
+def encode_stats(text):
+    """Encode the metrics of the server.
+
+    :param text: the metrics in the Prometheus text format, one per
+    line
+    :return: The response message
+    """
+    lines = text.splitlines()
+    return f"STATS {len(lines)}\n" + "".join(line + "\n" for line in lines)
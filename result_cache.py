@@ -0,0 +1,109 @@
+"""Result cache script.
+
+A bounded cache of query responses in front of the search engine.
+The least recently used entries are evicted first, and entries may
+expire after a time to live. The cache belongs to one index: as soon
+as it is asked about another index, after the data file was reloaded,
+it is emptied, so it never answers with results of old data.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import metrics
+
+
+class ResultCache:
+    """LRU cache of query results with an optional time to live."""
+
+    def __init__(self, maxsize=10000, ttl=None, clock=time.monotonic):
+        """Create an empty cache.
+
+        :param maxsize: the number of results kept, 0 disables the
+        cache
+        :param ttl: the number of seconds a result is kept, or None to
+        keep it until it is evicted
+        :param clock: the function returning the current time in
+        seconds
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._index = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Return the number of cached results."""
+        return len(self._entries)
+
+    def _check_index(self, index):
+        """Empty the cache if it holds results of another index."""
+        if index is not self._index:
+            if self._entries:
+                self.invalidations += 1
+                metrics.increment("result_cache_total",
+                                  'event="invalidation"')
+            self._entries.clear()
+            self._index = index
+
+    def get(self, index, key):
+        """Return a cached result.
+
+        :param index: the index the result was computed from
+        :param key: the key of the query, for instance the command and
+        its argument
+        :return: The result, or None if it isn't cached
+        """
+        if not self.maxsize:
+            return None
+        with self._lock:
+            self._check_index(index)
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None \
+                    and entry[1] <= self.clock():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        metrics.increment(
+            "result_cache_total",
+            'event="miss"' if entry is None else 'event="hit"',
+        )
+        return None if entry is None else entry[0]
+
+    def put(self, index, key, result):
+        """Cache a result, evicting the least recently used one if full.
+
+        :param index: the index the result was computed from
+        :param key: the key of the query
+        :param result: the result, anything but None
+        """
+        if not self.maxsize:
+            return
+        expires = None if self.ttl is None else self.clock() + self.ttl
+        evicted = False
+        with self._lock:
+            self._check_index(index)
+            self._entries[key] = (result, expires)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+                evicted = True
+        if evicted:
+            metrics.increment("result_cache_total", 'event="eviction"')
+
+    def clear(self):
+        """Remove every cached result."""
+        with self._lock:
+            self._entries.clear()
+            self._index = None
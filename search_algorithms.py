@@ -1,7 +1,29 @@
 """Search algorithms."""
 
+import bisect
 import math
 
+# NumPy is optional, it is only used to answer large batches of
+# queries against a sorted array in a single vectorised call. It is
+# imported on first use, so the server doesn't wait for it to start.
+np = None
+_numpy_imported = False
+
+
+def _numpy():
+    """Return the numpy module, importing it on first use.
+
+    :return: The numpy module, or None if it isn't installed
+    """
+    global np, _numpy_imported
+    if not _numpy_imported:
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+        _numpy_imported = True
+    return np
+
 
 def linear_search(arr, target):
     """Linear search algorithm.
@@ -44,6 +66,75 @@ def binary_search(list, target):
     return False
 
 
+def fixed_width_array(arr):
+    """Encode a sorted array as fixed-width bytes.
+
+    Every value is encoded as UTF-8 and padded to the longest one, so
+    the whole array is a single NumPy array that keeps the same order.
+    Without NumPy the array is returned as it is.
+
+    :param arr: The sorted array of strings or bytes
+    :return: A NumPy array of fixed-width bytes, or the array itself
+    """
+    np = _numpy()
+    if np is None or (isinstance(arr, np.ndarray) and arr.dtype.kind == "S"):
+        return arr
+    values = [
+        value.encode("utf-8") if isinstance(value, str) else value
+        for value in arr
+    ]
+    width = max(map(len, values), default=1)
+    return np.array(values, dtype=f"S{max(width, 1)}")
+
+
+def binary_search_many(arr, targets):
+    """Binary search algorithm for many targets.
+
+    With NumPy, the targets are encoded the same way as the array and
+    all of them are searched with one call to np.searchsorted instead
+    of a Python loop. Targets longer than the values of the array are
+    never found. Without NumPy every target is searched in turn.
+
+    :param arr: The sorted array of strings or bytes, or an array
+    returned by fixed_width_array
+    :param targets: The values we're looking for
+    :return: A list with True or False for every target
+    """
+    np = _numpy()
+    if np is None:
+        return [_sorted_contains(arr, target) for target in targets]
+    arr = fixed_width_array(arr)
+    if not len(arr):
+        return [False] * len(targets)
+    width = arr.dtype.itemsize
+    queries = [
+        target.encode("utf-8") if isinstance(target, str) else target
+        for target in targets
+    ]
+    fits = np.fromiter(
+        (len(query) <= width for query in queries), bool, len(queries)
+    )
+    queries = np.array(queries, dtype=f"S{width}")
+    positions = np.searchsorted(arr, queries)
+    found = arr[np.minimum(positions, len(arr) - 1)] == queries
+    return (found & fits & (positions < len(arr))).tolist()
+
+
+def _sorted_contains(arr, target):
+    """Check whether a value is in a sorted array.
+
+    :param arr: The sorted array of strings or bytes
+    :param target: The string or bytes to look for
+    :return: True or False
+    """
+    if not len(arr):
+        return False
+    if isinstance(arr[0], bytes) and isinstance(target, str):
+        target = target.encode("utf-8")
+    position = _bisect_left(arr, target)
+    return position < len(arr) and arr[position] == target
+
+
 def jump_search(arr, target):
     """Jump search algorithm.
 
@@ -70,3 +161,207 @@ def jump_search(arr, target):
     if arr[prev] == target:
         return True
     return False
+
+
+def hash_search(index, target):
+    """Hash search algorithm.
+
+    This algorithm checks whether a target value is a member of a
+    hashed collection such as a set, which takes constant time on
+    average instead of depending on the size of the collection.
+
+    :param index: The set (or any container) to search in
+    :param target: The value we're searching for
+    :return: True or False
+    """
+    return target in index
+
+
+def hash_search_many(index, targets):
+    """Hash search algorithm for many targets.
+
+    This algorithm checks every target value against the same hashed
+    collection in a single pass, which avoids a separate search call
+    for each value.
+
+    :param index: The set (or any container) to search in
+    :param targets: The values we're searching for
+    :return: A list with True or False for every target
+    """
+    return [target in index for target in targets]
+
+
+def _bisect_left(arr, target):
+    """Return the position where target would be inserted in arr.
+
+    Sorted containers that are not lists, such as memory-mapped
+    indexes, provide their own bisect_left method.
+    """
+    if hasattr(arr, "bisect_left"):
+        return arr.bisect_left(target)
+    return bisect.bisect_left(arr, target)
+
+
+def _prefix_end(prefix):
+    """Return the smallest value above every value starting with prefix.
+
+    :param prefix: a string or bytes
+    :return: The upper bound, or None if there is no such value
+    """
+    highest = 0xFF if isinstance(prefix, bytes) else 0x10FFFF
+    while prefix:
+        last = prefix[-1] if isinstance(prefix, bytes) else ord(prefix[-1])
+        if last < highest:
+            if isinstance(prefix, bytes):
+                return prefix[:-1] + bytes([last + 1])
+            return prefix[:-1] + chr(last + 1)
+        prefix = prefix[:-1]
+    return None
+
+
+def prefix_range(arr, prefix):
+    """Prefix range algorithm.
+
+    This algorithm finds the values that start with a prefix in a
+    sorted array with two binary searches, one for the prefix itself
+    and one for the first value after every value with the prefix.
+
+    :param arr: The sorted array to search through
+    :param prefix: The prefix we're searching for
+    :return: The first position and the position after the last one
+    """
+    first = _bisect_left(arr, prefix)
+    end = _prefix_end(prefix)
+    last = len(arr) if end is None else _bisect_left(arr, end)
+    return first, last
+
+
+def prefix_search(arr, prefix, limit=None):
+    """Prefix search algorithm.
+
+    This algorithm returns the number of values that start with a
+    prefix in a sorted array, and the values themselves up to a limit.
+
+    :param arr: The sorted array to search through
+    :param prefix: The prefix we're searching for
+    :param limit: The largest number of values returned, or None
+    :return: The number of matches and the list of matching values
+    """
+    first, last = prefix_range(arr, prefix)
+    if limit is not None:
+        last_returned = min(last, first + limit)
+    else:
+        last_returned = last
+    return last - first, [arr[i] for i in range(first, last_returned)]
+
+
+def substring_search(arr, fragment, limit=None):
+    """Substring search algorithm.
+
+    This algorithm scans an array and returns the number of values
+    that contain a fragment, and the values themselves up to a limit.
+
+    :param arr: The array to search through
+    :param fragment: The fragment we're searching for
+    :param limit: The largest number of values returned, or None
+    :return: The number of matches and the list of matching values
+    """
+    count = 0
+    matches = []
+    for value in arr:
+        if fragment in value:
+            count += 1
+            if limit is None or len(matches) < limit:
+                matches.append(value)
+    return count, matches
+
+
+def aho_corasick_automaton(patterns):
+    """Aho-Corasick automaton.
+
+    This algorithm builds a trie of the patterns, then links every
+    state to the longest proper suffix that is also in the trie, so a
+    text can be matched against all the patterns in a single pass.
+
+    :param patterns: The patterns as strings or bytes
+    :return: The transitions, failure links and matching flags of
+    the states
+    """
+    goto = [{}]
+    matching = [False]
+    for pattern in patterns:
+        if isinstance(pattern, str):
+            pattern = pattern.encode("utf-8")
+        state = 0
+        for byte in pattern:
+            next_state = goto[state].get(byte)
+            if next_state is None:
+                next_state = len(goto)
+                goto[state][byte] = next_state
+                goto.append({})
+                matching.append(False)
+            state = next_state
+        matching[state] = True
+
+    # The failure links are set breadth first, so the link of a state
+    # always points to a state that is already linked.
+    fail = [0] * len(goto)
+    queue = list(goto[0].values())
+    for state in queue:
+        for byte, next_state in goto[state].items():
+            link = fail[state]
+            while link and byte not in goto[link]:
+                link = fail[link]
+            fail[next_state] = goto[link].get(byte, 0)
+            matching[next_state] = (
+                matching[next_state] or matching[fail[next_state]]
+            )
+            queue.append(next_state)
+    return goto, fail, matching
+
+
+def aho_corasick_search(automaton, text):
+    """Aho-Corasick search algorithm.
+
+    This algorithm feeds a text to an automaton built by
+    aho_corasick_automaton and stops at the first pattern found.
+
+    :param automaton: The automaton of the patterns
+    :param text: The string or bytes to search in
+    :return: True if the text contains any of the patterns
+    """
+    goto, fail, matching = automaton
+    if matching[0]:
+        return True
+    if isinstance(text, str):
+        text = text.encode("utf-8")
+    state = 0
+    for byte in text:
+        while state and byte not in goto[state]:
+            state = fail[state]
+        state = goto[state].get(byte, 0)
+        if matching[state]:
+            return True
+    return False
+
+
+def aho_corasick_scan(automaton, lines, limit=None):
+    """Aho-Corasick scan algorithm.
+
+    This algorithm reads the lines once and returns the number of
+    lines that contain any of the patterns of an automaton, and their
+    line numbers up to a limit.
+
+    :param automaton: The automaton of the patterns
+    :param lines: The lines to search in, as strings or bytes
+    :param limit: The largest number of line numbers returned, or None
+    :return: The number of matches and the list of 1-based line numbers
+    """
+    count = 0
+    line_ids = []
+    for line_id, line in enumerate(lines, 1):
+        if aho_corasick_search(automaton, line):
+            count += 1
+            if limit is None or len(line_ids) < limit:
+                line_ids.append(line_id)
+    return count, line_ids
@@ -0,0 +1,269 @@
+"""Search engines script.
+
+A search engine builds the search data of a data file, answers
+exact-match lookups in it and reports the memory it uses. The engines
+are registered by name, so configs.ini can pick one for a data file:
+
+    linear  sorted list scanned with linear_search
+    binary  sorted list searched with binary_search
+    jump    sorted list searched with jump_search
+    hash    hash index of frozen sets, the default
+    bloom   hash index with a Bloom filter in front of it
+    mmap    memory-mapped index file built with mmap_index.py
+"""
+
+import inspect
+import sys
+from abc import ABC, abstractmethod
+
+from bloom_filter import BloomFilter
+from corpus import BloomIndex, HashIndex
+from search_algorithms import (
+    binary_search,
+    hash_search,
+    jump_search,
+    linear_search,
+)
+
+# Name of the engine used when configs.ini doesn't pick one.
+DEFAULT_ENGINE = "hash"
+
+ENGINES = {}
+
+
+def register(engine_class):
+    """Register an engine class under its name.
+
+    An engine that doesn't implement every abstract method is refused
+    here, when it is defined, instead of on its first query.
+
+    :param engine_class: a SearchEngine subclass
+    :return: The engine class, so it can be used as a decorator
+    """
+    if inspect.isabstract(engine_class):
+        missing = ", ".join(sorted(engine_class.__abstractmethods__))
+        raise TypeError(
+            f"Search engine '{engine_class.name}' doesn't implement "
+            f"{missing}"
+        )
+    ENGINES[engine_class.name] = engine_class
+    return engine_class
+
+
+def get_engine(name):
+    """Return a new engine by name.
+
+    :param name: the name of a registered engine, or an empty string
+    for the default engine
+    :return: A SearchEngine
+    """
+    try:
+        return ENGINES[name or DEFAULT_ENGINE]()
+    except KeyError:
+        raise ValueError(
+            f"Unknown search engine '{name}', expected one of "
+            f"{', '.join(sorted(ENGINES))}"
+        ) from None
+
+
+def container_size(container):
+    """Return the approximate number of bytes of a container.
+
+    :param container: a list or set of strings
+    :return: The size of the container and of the strings in it
+    """
+    return sys.getsizeof(container) + sum(map(sys.getsizeof, container))
+
+
+class SearchEngine(ABC):
+    """Common interface of the search engines.
+
+    Engines whose data can take appended lines without being built
+    again set incremental, the others are built again whenever the
+    data file changes. Engines that search bytes as well as strings
+    set accepts_bytes, so binary requests skip decoding their query.
+    Engines whose lookups take constant time set constant_time, so
+    exact queries skip the result cache and its lock.
+    """
+
+    name = None
+    incremental = False
+    accepts_bytes = False
+    constant_time = False
+
+    @abstractmethod
+    def build(self, lines):
+        """Build the search data from lines.
+
+        :param lines: The strings of the data file
+        :return: The search data
+        """
+
+    def extend(self, data, lines):
+        """Add appended lines to search data.
+
+        :param data: The search data built by this engine
+        :param lines: The appended strings
+        :return: The new search data
+        """
+        return data.extend(lines)
+
+    @abstractmethod
+    def lookup(self, data, target):
+        """Check whether a string is in the search data.
+
+        :param data: The search data built by this engine
+        :param target: The string to search for
+        :return: True or False
+        """
+
+    def memory_size(self, data):
+        """Return the approximate number of bytes of search data."""
+        return container_size(data)
+
+    def dump(self, data):
+        """Return search data in a form that is quick to pickle.
+
+        :param data: The search data built by this engine
+        :return: The search data made of built-in types
+        """
+        return data
+
+    def restore(self, dumped):
+        """Return search data from the result of dump.
+
+        :param dumped: The search data returned by dump
+        :return: The search data
+        """
+        return dumped
+
+
+@register
+class BinaryEngine(SearchEngine):
+    """Sorted lines, searched with a binary search."""
+
+    name = "binary"
+
+    def build(self, lines):
+        """Keep the lines in a sorted list."""
+        return sorted(lines)
+
+    def lookup(self, data, target):
+        """Search the sorted list with a binary search."""
+        return binary_search(data, target)
+
+
+@register
+class LinearEngine(BinaryEngine):
+    """Sorted lines, scanned for every lookup.
+
+    The lines are sorted like for the other list engines, so prefix
+    queries work the same, but lookups don't rely on the order.
+    """
+
+    name = "linear"
+
+    def lookup(self, data, target):
+        """Scan the list for the string."""
+        return linear_search(data, target)
+
+
+@register
+class JumpEngine(BinaryEngine):
+    """Sorted lines, searched with a jump search."""
+
+    name = "jump"
+
+    def lookup(self, data, target):
+        """Search the sorted list with a jump search."""
+        return jump_search(data, target)
+
+
+@register
+class HashEngine(SearchEngine):
+    """Hash index of frozen sets, with appended lines in new layers."""
+
+    name = "hash"
+    incremental = True
+    constant_time = True
+
+    def build(self, lines):
+        """Put the lines in a hash index."""
+        return HashIndex().extend(lines)
+
+    def lookup(self, data, target):
+        """Look the string up in the hash index."""
+        return hash_search(data, target)
+
+    def memory_size(self, data):
+        """Return the size of the layers and of the filter, if any."""
+        if isinstance(data, BloomIndex):
+            return len(data.bloom.bits) + self.memory_size(data.index)
+        return sum(container_size(layer) for layer in data.layers)
+
+    def dump(self, data):
+        """Return the frozen sets of the hash index."""
+        return data.layers
+
+    def restore(self, dumped):
+        """Put the frozen sets back in a hash index."""
+        return HashIndex(tuple(dumped))
+
+
+@register
+class BloomEngine(HashEngine):
+    """Hash index with a Bloom filter that answers most misses."""
+
+    name = "bloom"
+
+    # False-positive rate of the filter.
+    fp_rate = 0.01
+
+    def build(self, lines):
+        """Put the lines in a hash index behind a Bloom filter."""
+        return BloomIndex.build(super().build(lines), self.fp_rate)
+
+    def dump(self, data):
+        """Return the frozen sets and the state of the filter."""
+        bloom = data.bloom
+        return data.index.layers, bloom.size, bloom.hash_count, bloom.bits
+
+    def restore(self, dumped):
+        """Put the frozen sets and the filter back together."""
+        layers, size, hash_count, bits = dumped
+        return BloomIndex(
+            HashIndex(tuple(layers)),
+            BloomFilter.from_bits(size, hash_count, bits),
+        )
+
+
+@register
+class MmapEngine(SearchEngine):
+    """Sorted lines in a memory-mapped index file.
+
+    The data file of this engine is the index file itself, which
+    MmapCorpus opens as a MmapIndex.
+    """
+
+    name = "mmap"
+    accepts_bytes = True
+
+    def build(self, lines):
+        """Index files are built with mmap_index.py instead."""
+        raise TypeError("The mmap engine is loaded from an index file")
+
+    def lookup(self, data, target):
+        """Search the index file with a binary search."""
+        return target in data
+
+    def dump(self, data):
+        """The index file is already on disk."""
+        raise TypeError("The mmap engine has no snapshots")
+
+    def memory_size(self, data):
+        """Return the size of the mapping and of the filter, if any."""
+        if isinstance(data, BloomIndex):
+            return len(data.bloom.bits) + self.memory_size(data.index)
+        # The mapped pages live in the page cache, shared by every
+        # process, so only the mapping itself is reported.
+        return len(data.mm)
@@ -1,40 +1,326 @@
 """Server to handle client requests."""
 
+import asyncio
 import configparser
 import socket
 import sys
-import datetime
+import gc
+import threading
+import time
+from functools import lru_cache, partial
 
 # Importing the ThreadPoolExecutor class from the
 # concurrent.futures modulE
 from concurrent.futures import ThreadPoolExecutor
-from file_handling import text_file_path, search_for_string, strings_list
-
-# Reading the configs.ini file and assigning the
-# values to the variables.
-config_data = configparser.ConfigParser()
-config_data.read("configs.ini")
-
-# Reading the configs.ini file and assigning the
-# values to the variables.
-DATA_FORMAT = config_data["socket_info"]["DATA_FORMAT"]
-PAYLOAD_SIZE = int(config_data["socket_info"]["PAYLOAD_SIZE"])
-HOST = config_data["socket_info"]["HOST"]
-PORT = int(config_data["socket_info"]["PORT"])
-REREAD_ON_QUERY = bool(config_data["query_file"]["REREAD_ON_QUERY"])
-
-SOCK_ADDRESS = (HOST, PORT)
+from datasets import (
+    DEFAULT_DATASET,
+    Dataset,
+    UnknownDataset,
+    open_corpus,
+    read_datasets,
+)
+from field_index import parse_filter
+from file_handling import (
+    search_for_prefix,
+    search_for_substring,
+    text_file_path,
+)
+from metrics import metrics, start_http_server
+from prefork import run_workers
+from protocol import (
+    BATCH_COMMANDS,
+    CLOSING_STATUSES,
+    CONTAINS_ANY_COMMAND,
+    FRAME_TYPES,
+    FILTER_COMMAND,
+    PREFIX_COMMAND,
+    PREFIX_COUNT_COMMAND,
+    STATS_COMMAND,
+    SUBSTRING_COMMAND,
+    VECTOR_BATCH_COMMAND,
+    AsyncFrameReader,
+    AsyncLineReader,
+    BatchLimitExceeded,
+    FrameReader,
+    InvalidFrame,
+    LineReader,
+    PayloadSizeExceeded,
+    encode_batch_results,
+    encode_count,
+    encode_frame_response,
+    encode_matches,
+    encode_stats,
+    is_frame,
+    parse_batch_header,
+    parse_request,
+    split_dataset,
+)
+from result_cache import ResultCache
+from search_algorithms import (
+    aho_corasick_automaton,
+    aho_corasick_scan,
+    binary_search_many,
+    hash_search_many,
+)
+from server_log import logger, query_logger, setup_logging, stop_logging
+
 MAX_WORKERS = 4
 
+# Errors of binary frames that are answered with a status.
+FRAME_ERRORS = (
+    UnknownDataset,
+    PayloadSizeExceeded,
+    BatchLimitExceeded,
+    InvalidFrame,
+    UnicodeDecodeError,
+)
+
+# The address and the listening socket of the server, set when it
+# starts by configure and open_socket.
+SOCK_ADDRESS = None
+server_sock = None
+
+
+def configure(config_path="configs.ini"):
+    """Read the settings of the server.
+
+    It reads the configs.ini file and creates the search data of every
+    dataset, without loading it yet. It runs when the server starts
+    rather than when this module is imported.
+
+    :param config_path: the path to the configs.ini file
+    """
+    global config_data, corpus, datasets, result_cache, compile_patterns
+    global DATA_FORMAT, PAYLOAD_SIZE, HOST, PORT, SOCK_ADDRESS
+    global REREAD_ON_QUERY, SERVER_MODE, PROTOCOL, FRAME_SIZE
+    global IDLE_TIMEOUT, WORKERS, BUSY_TIMEOUT, BATCH_LIMIT, PREFIX_LIMIT
+    global INDEX_PATH, SNAPSHOT_PATH, ENGINE, CHUNK_SIZE, BLOOM_FP_RATE
+    global SUBSTRING_INDEX, AUTOMATON_CACHE_SIZE, STRUCTURED_INDEX
+    global RESULT_CACHE_SIZE, RESULT_CACHE_TTL, METRICS_PORT, LOG_LEVEL
+    global LOG_QUEUE_SIZE, LOG_BATCH_SIZE, LOG_SAMPLE_RATE, QUERY_LOG_PATH
+    global QUERY_LOG_MAX_BYTES, QUERY_LOG_BACKUPS
+
+    # Reading the configs.ini file and assigning the
+    # values to the variables.
+    config_data = configparser.ConfigParser()
+    config_data.read(config_path)
+    socket_info = config_data["socket_info"]
+    text_file = config_data["text_file"]
+    query_file = config_data["query_file"]
+    server_settings = config_data["server"]
+    log_settings = config_data["logging"]
+
+    DATA_FORMAT = socket_info["DATA_FORMAT"]
+    PAYLOAD_SIZE = int(socket_info["PAYLOAD_SIZE"])
+    HOST = socket_info["HOST"]
+    PORT = int(socket_info["PORT"])
+    REREAD_ON_QUERY = bool(query_file["REREAD_ON_QUERY"])
+    SERVER_MODE = server_settings["MODE"]
+    PROTOCOL = socket_info["PROTOCOL"]
+    FRAME_SIZE = int(socket_info["FRAME_SIZE"])
+    IDLE_TIMEOUT = float(socket_info["IDLE_TIMEOUT"] or 0)
+    WORKERS = int(server_settings["WORKERS"])
+    BUSY_TIMEOUT = float(server_settings["BUSY_TIMEOUT"])
+    BATCH_LIMIT = int(query_file["BATCH_LIMIT"])
+    PREFIX_LIMIT = int(query_file["PREFIX_LIMIT"])
+    INDEX_PATH = text_file["INDEX_PATH"]
+    SNAPSHOT_PATH = text_file["SNAPSHOT_PATH"]
+    ENGINE = text_file.get("ENGINE", "")
+    CHUNK_SIZE = int(config_data["loader"]["CHUNK_SIZE"])
+    BLOOM_FP_RATE = float(query_file["BLOOM_FP_RATE"] or 0)
+    SUBSTRING_INDEX = bool(query_file["SUBSTRING_INDEX"])
+    AUTOMATON_CACHE_SIZE = int(query_file["AUTOMATON_CACHE_SIZE"])
+    STRUCTURED_INDEX = bool(query_file["STRUCTURED_INDEX"])
+    RESULT_CACHE_SIZE = int(query_file["RESULT_CACHE_SIZE"])
+    RESULT_CACHE_TTL = float(query_file["RESULT_CACHE_TTL"] or 0)
+    METRICS_PORT = int(server_settings["METRICS_PORT"] or 0)
+    LOG_LEVEL = log_settings["LEVEL"].upper()
+    LOG_QUEUE_SIZE = int(log_settings["QUEUE_SIZE"])
+    LOG_BATCH_SIZE = int(log_settings["BATCH_SIZE"])
+    LOG_SAMPLE_RATE = float(log_settings["SAMPLE_RATE"])
+    QUERY_LOG_PATH = log_settings["QUERY_LOG_PATH"]
+    QUERY_LOG_MAX_BYTES = int(log_settings["QUERY_LOG_MAX_BYTES"])
+    QUERY_LOG_BACKUPS = int(log_settings["QUERY_LOG_BACKUPS"])
+    SOCK_ADDRESS = (HOST, PORT)
+
+    # The search data shared by every worker thread. It is loaded once
+    # when the server starts instead of once per connection, either
+    # from the data file or from a prebuilt memory-mapped index file.
+    # The search engine picked in configs.ini builds the index, and the
+    # mmap engine searches the index file instead of the data file.
+    # The named datasets of the [dataset:NAME] sections are served next
+    # to it, each with its own search engine and reload policy.
+    try:
+        corpus = open_corpus(
+            text_file_path(config_path),
+            ENGINE,
+            INDEX_PATH,
+            chunk_size=CHUNK_SIZE,
+            bloom_fp_rate=BLOOM_FP_RATE,
+            substring_index=SUBSTRING_INDEX,
+        )
+        datasets = read_datasets(
+            config_data,
+            chunk_size=CHUNK_SIZE,
+            bloom_fp_rate=BLOOM_FP_RATE,
+            substring_index=SUBSTRING_INDEX,
+            cache_size=RESULT_CACHE_SIZE,
+            cache_ttl=RESULT_CACHE_TTL or None,
+        )
+    except ValueError as err:
+        print(f"Error in configs.ini: {err}")
+        sys.exit(1)
+
+    # Responses of the latest exact, prefix and substring queries, keyed
+    # by the query for exact queries and by the command, its argument
+    # and the result limit for the others.
+    result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL or None)
+
+    # Compiled automata of the latest contains any queries, keyed by
+    # their set of patterns, so repeated screening jobs skip the
+    # compilation.
+    compile_patterns = lru_cache(maxsize=AUTOMATON_CACHE_SIZE)(
+        aho_corasick_automaton
+    )
+
+
+def open_socket():
+    """Create the listening socket of the server.
+
+    It binds the socket to the address of the configs.ini file, or
+    exits when the address can't be used.
+    """
+    global server_sock
+
+    try:
+        server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server_sock.bind(SOCK_ADDRESS)
+        server_sock.listen()
+    except socket.error as err:
+        print(f"Error creating socket: {err}")
+        sys.exit(1)
+
+
+def default_dataset():
+    """Return the dataset of the [text_file] section.
+
+    It is created on every call from the module settings, so it always
+    follows the current corpus, reload policy and result cache.
+    """
+    return Dataset(
+        DEFAULT_DATASET, corpus, REREAD_ON_QUERY, result_cache, SNAPSHOT_PATH
+    )
+
+
+def all_datasets():
+    """Return the default dataset followed by the named ones."""
+    return [default_dataset(), *datasets.values()]
+
+
+def find_dataset(name):
+    """Find the dataset a request targets.
+
+    :param name: the name of the dataset, or None for the default one
+    :return: The Dataset
+    """
+    if name is None or name == DEFAULT_DATASET:
+        return default_dataset()
+    try:
+        return datasets[name]
+    except KeyError:
+        raise UnknownDataset(name) from None
+
+
+def load_dataset(dataset):
+    """Load the search data of a dataset.
+
+    With a snapshot path the index is loaded from the snapshot while it
+    matches the data file, and written to it whenever it had to be
+    built. The number of strings, the memory size and the load time of
+    the dataset are logged and set as gauges of the metrics.
+
+    :param dataset: the Dataset to load
+    """
+    data_corpus = dataset.corpus
+    start_time = time.perf_counter()
+    try:
+        snapshot = None
+        if dataset.snapshot_path:
+            snapshot = data_corpus.load_snapshot(dataset.snapshot_path)
+        if snapshot is None:
+            data_corpus.load()
+        else:
+            # The lines appended since the snapshot was written are
+            # read, a data file that changed otherwise is loaded again.
+            data_corpus.refresh()
+        index = data_corpus.index
+    except OSError as err:
+        logger.error("Error loading dataset %s: %s", dataset.name, err)
+        sys.exit(1)
+    load_time = time.perf_counter() - start_time
+    memory = data_corpus.engine.memory_size(index)
+    logger.info(
+        "Dataset %s: search engine %s, %d strings, %.1f MiB, "
+        "loaded in %.3fs%s",
+        dataset.name, data_corpus.engine.name, len(index),
+        memory / (1024 * 1024), load_time,
+        " from snapshot" if index is snapshot else "",
+    )
+    labels = f'dataset="{dataset.name}"'
+    metrics.set("dataset_strings", labels, len(index))
+    metrics.set("dataset_memory_bytes", labels, memory)
+    metrics.set("dataset_load_seconds", labels, round(load_time, 6))
+    if dataset.snapshot_path and index is not snapshot:
+        try:
+            if data_corpus.save_snapshot(dataset.snapshot_path):
+                logger.info("Snapshot written to %s", dataset.snapshot_path)
+        except Exception as err:
+            # The snapshot only speeds up the next start, so the server
+            # keeps running whatever went wrong writing it.
+            logger.error("Error writing snapshot: %s", err)
+    # The sorted lists of the list engines are scanned by substring
+    # queries, only the indexes have a trigram index.
+    if SUBSTRING_INDEX and hasattr(index, "substring_view"):
+        substring_index = index.substring_view()
+        memory = substring_index.memory_size() / (1024 * 1024)
+        logger.info(
+            "Substring index of %s: %d trigrams, %.1f MiB, built in %.3fs",
+            dataset.name, len(substring_index), memory,
+            substring_index.build_time,
+        )
+    if STRUCTURED_INDEX:
+        field_index = data_corpus.get_field_index()
+        memory = field_index.memory_size() / (1024 * 1024)
+        logger.info(
+            "Field index of %s: %d records, %d other lines, %.1f MiB, "
+            "built in %.3fs",
+            dataset.name, len(field_index), field_index.skipped, memory,
+            field_index.build_time,
+        )
+
 
-# Creating a socket object and binding it to the address.
-try:
-    server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server_sock.bind(SOCK_ADDRESS)
-    server_sock.listen()
-except socket.error as err:
-    print(f"Error creating socket: {err}")
-    sys.exit(1)
+def load_corpus():
+    """Load the search data.
+
+    It loads the index of every dataset before the first connection is
+    accepted, except for the datasets whose data file is read again on
+    every query.
+    """
+    for dataset in all_datasets():
+        if not dataset.reread_on_query:
+            load_dataset(dataset)
+
+
+def refresh_datasets():
+    """Reload the data files of the datasets that changed.
+
+    The pre-fork server calls it on SIGHUP before it forks the new
+    workers, so the reloaded index is kept out of the garbage collector
+    like the first one and its pages stay shared.
+    """
+    for dataset in all_datasets():
+        dataset.corpus.refresh()
+    gc.freeze()
 
 
 def start_server():
@@ -42,28 +328,304 @@ def start_server():
 
     It starts the server and listens for connections.
     """
-    print(f"Starting server ...")
-    print(f"Server listening on {HOST}:{PORT}")
-    print(f"Use CTRL + C to end operation")
-    print("-------------------------------------------------------")
+    logger.info("Starting server ...")
+    load_corpus()
+    start_metrics_server()
+    logger.info("Server listening on %s:%d", HOST, PORT)
+    logger.info("Use CTRL + C to end operation")
+    accept_connections()
 
+
+def accept_connections():
+    """Accept connections.
+
+    It accepts connections on the listening socket and hands them to
+    a thread pool until the server is interrupted. Connections that
+    are being handled are finished before it returns.
+    """
+    # Every connection holds a worker thread until it is closed, so a
+    # connection that finds no free worker within the busy timeout is
+    # refused instead of waiting behind idle persistent connections.
+    free_workers = threading.BoundedSemaphore(MAX_WORKERS)
     # Creating a thread pool executor with a maximum of 4 workers.
     with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
         while True:
             try:
                 # It accepts a connection from a client.
                 conn, addr = server_sock.accept()
+                metrics.increment("connections_total")
+                if not free_workers.acquire(timeout=BUSY_TIMEOUT):
+                    refuse_connection(conn, addr)
+                    continue
                 # Submitting the handle_client function to the
-                # thread pool executor.
-                executor.submit(handle_client, conn, addr)
+                # thread pool executor, with the time the connection
+                # was accepted to measure how long it waits for a
+                # worker thread.
+                future = executor.submit(
+                    handle_client, conn, addr, time.perf_counter()
+                )
+                future.add_done_callback(lambda _: free_workers.release())
             except socket.error as err:
-                print(f"Error accepting connection: {err}")
+                logger.error("Error accepting connection: %s", err)
             except KeyboardInterrupt:
-                print("Shutting down server...")
+                logger.info("Shutting down server...")
                 break
 
 
-def execute_search_query(data, addr, conn, cached_data=None):
+def refuse_connection(conn, addr):
+    """Refuse a connection because every worker thread is busy.
+
+    :param conn: the socket object
+    :param addr: ("127.0.0.1", 5051)
+    """
+    logger.warning("Server busy, connection refused for %s", addr)
+    metrics.increment("errors_total", 'error="server_busy"')
+    with conn:
+        try:
+            conn.sendall("SERVER BUSY\n".encode(DATA_FORMAT))
+        except OSError:
+            pass
+
+
+def search_query(data, addr, cached_data=None, dataset=None):
+    """Search query.
+
+    It searches for a string in the search data and returns the
+    response for the client
+
+    :param data: The string to search for
+    :param addr: The IP address of the client
+    :param cached_data: The data to search in. If it's None, then
+    the shared index is reloaded first when the data file changed
+    :param dataset: The Dataset to search, or None for the default one
+    :return: The response message
+    """
+    start_time = time.perf_counter()
+    dataset = dataset or default_dataset()
+    if cached_data is None:
+        # Only the lines that changed since the last query are read.
+        dataset.corpus.refresh()
+        cached_data = dataset.corpus.index
+    # Frequent queries are answered from the result cache, which is
+    # emptied when another index is searched. Lookups that take constant
+    # time are faster than the cache and skip it.
+    engine = dataset.corpus.engine
+    use_cache = engine is not None and not engine.constant_time
+    response = None
+    if use_cache:
+        response = dataset.result_cache.get(cached_data, data)
+    if response is None:
+        found = dataset.corpus.lookup(cached_data, data)
+        # Response from the server to the client for search query
+        response = "STRING EXISTS\n" if found else "STRING NOT FOUND\n"
+        if use_cache:
+            dataset.result_cache.put(cached_data, data, response)
+    execution_time = time.perf_counter() - start_time
+    query_logger.info(
+        "Search query: %s, Dataset: %s, IP: %s, Exec.time: %.6fs",
+        data, dataset.name, addr, execution_time,
+    )
+    return response
+
+
+def batch_query(queries, addr, vectorized=False, cached_data=None,
+                dataset=None):
+    """Batch query.
+
+    It searches for many strings in one pass over the search data and
+    returns a single response with the result of every query
+
+    :param queries: The strings to search for
+    :param addr: The IP address of the client
+    :param vectorized: Whether the strings are searched in the sorted
+    data with one vectorised binary search
+    :param cached_data: The data to search in. If it's None, then
+    the shared index is reloaded first when the data file changed
+    :param dataset: The Dataset to search, or None for the default one
+    :return: The response message
+    """
+    start_time = time.perf_counter()
+    dataset = dataset or default_dataset()
+    if cached_data is None:
+        dataset.corpus.refresh()
+        cached_data = dataset.corpus.index
+    if vectorized:
+        # The sorted data is encoded once for every new index.
+        results = binary_search_many(
+            dataset.corpus.vector_view(cached_data), queries
+        )
+    else:
+        results = hash_search_many(cached_data, queries)
+    execution_time = time.perf_counter() - start_time
+
+    query_logger.info(
+        "Batch query: %d strings, Dataset: %s, IP: %s, Exec.time: %.6fs",
+        len(queries), dataset.name, addr, execution_time,
+    )
+    return encode_batch_results(results)
+
+
+def prefix_query(prefix, addr, count_only, cached_data=None, dataset=None):
+    """Prefix query.
+
+    It searches for the strings that start with a prefix and returns
+    either the number of matches or the matches themselves, up to
+    the prefix limit
+
+    :param prefix: The prefix to search for
+    :param addr: The IP address of the client
+    :param count_only: Whether only the number of matches is returned
+    :param cached_data: The data to search in. If it's None, then
+    the shared index is reloaded first when the data file changed
+    :param dataset: The Dataset to search, or None for the default one
+    :return: The response message
+    """
+    start_time = time.perf_counter()
+    dataset = dataset or default_dataset()
+    if cached_data is None:
+        dataset.corpus.refresh()
+        cached_data = dataset.corpus.index
+    limit = 0 if count_only else PREFIX_LIMIT
+    key = (PREFIX_COMMAND, prefix, limit)
+    result = dataset.result_cache.get(cached_data, key)
+    if result is None:
+        count, matches = search_for_prefix(
+            dataset.corpus.file_name, prefix, cached_data, limit
+        )
+        if count_only:
+            result = count, encode_count(count)
+        else:
+            result = count, encode_matches(count, matches)
+        dataset.result_cache.put(cached_data, key, result)
+    count, response = result
+    execution_time = time.perf_counter() - start_time
+
+    query_logger.info(
+        "Prefix query: %s, Dataset: %s, IP: %s, Matches: %d, "
+        "Exec.time: %.6fs",
+        prefix, dataset.name, addr, count, execution_time,
+    )
+    return response
+
+
+def substring_query(fragment, addr, cached_data=None, dataset=None):
+    """Substring query.
+
+    It searches for the strings that contain a fragment and returns
+    the response with their number and the strings themselves, up to
+    the prefix limit
+
+    :param fragment: The fragment to search for
+    :param addr: The IP address of the client
+    :param cached_data: The data to search in. If it's None, then
+    the shared index is reloaded first when the data file changed
+    :param dataset: The Dataset to search, or None for the default one
+    :return: The response message
+    """
+    start_time = time.perf_counter()
+    dataset = dataset or default_dataset()
+    if cached_data is None:
+        dataset.corpus.refresh()
+        cached_data = dataset.corpus.index
+    key = (SUBSTRING_COMMAND, fragment, PREFIX_LIMIT)
+    result = dataset.result_cache.get(cached_data, key)
+    if result is None:
+        count, matches = search_for_substring(
+            dataset.corpus.file_name, fragment, cached_data, PREFIX_LIMIT
+        )
+        result = count, encode_matches(count, matches)
+        dataset.result_cache.put(cached_data, key, result)
+    count, response = result
+    execution_time = time.perf_counter() - start_time
+
+    query_logger.info(
+        "Substring query: %s, Dataset: %s, IP: %s, Matches: %d, "
+        "Exec.time: %.6fs",
+        fragment, dataset.name, addr, count, execution_time,
+    )
+    return response
+
+
+def contains_any_query(patterns, addr, cached_data=None, dataset=None):
+    """Contains any query.
+
+    It compiles the patterns into an automaton, or takes it from the
+    cache, and scans the data once for the lines that contain any of
+    them. It returns their number and their line numbers, up to the
+    prefix limit
+
+    :param patterns: The list of patterns to search for
+    :param addr: The IP address of the client
+    :param cached_data: Not used, the data is scanned in its order
+    :param dataset: The Dataset to scan, or None for the default one
+    :return: The response message
+    """
+    start_time = time.perf_counter()
+    dataset = dataset or default_dataset()
+    automaton = compile_patterns(frozenset(patterns))
+    count, line_ids = aho_corasick_scan(
+        automaton, dataset.corpus.scan(), PREFIX_LIMIT
+    )
+    execution_time = time.perf_counter() - start_time
+
+    query_logger.info(
+        "Contains any query: %d patterns, Dataset: %s, IP: %s, "
+        "Matches: %d, Exec.time: %.6fs",
+        len(patterns), dataset.name, addr, count, execution_time,
+    )
+    return encode_matches(count, [str(line_id) for line_id in line_ids])
+
+
+def filter_query(text, addr, cached_data=None, dataset=None):
+    """Filter query.
+
+    It searches the field index for the records whose fields match
+    every condition and returns their number and the records
+    themselves, up to the prefix limit
+
+    :param text: The conditions, like "3=12 5=0..4"
+    :param addr: The IP address of the client
+    :param cached_data: Not used, the field index of the shared data
+    is searched
+    :param dataset: The Dataset to search, or None for the default one
+    :return: The response message
+    """
+    start_time = time.perf_counter()
+    try:
+        conditions = parse_filter(text)
+    except ValueError as err:
+        logger.warning("Invalid filter from %s: %s", addr, err)
+        return "INVALID FILTER\n"
+    dataset = dataset or default_dataset()
+    if cached_data is None:
+        dataset.corpus.refresh()
+    count, records = dataset.corpus.get_field_index().filter(
+        conditions, PREFIX_LIMIT
+    )
+    execution_time = time.perf_counter() - start_time
+
+    query_logger.info(
+        "Filter query: %s, Dataset: %s, IP: %s, Matches: %d, "
+        "Exec.time: %.6fs",
+        text, dataset.name, addr, count, execution_time,
+    )
+    return encode_matches(count, records)
+
+
+def stats_query(addr, cached_data=None, dataset=None):
+    """Stats query.
+
+    It returns the metrics of the server, shared by every dataset
+
+    :param addr: The IP address of the client
+    :param cached_data: Not used, no data is searched
+    :param dataset: Not used, no data is searched
+    :return: The response message
+    """
+    return encode_stats(metrics.render())
+
+
+def execute_search_query(data, addr, conn, cached_data=None, dataset=None):
     """Execute search query.
 
     It searches for a string in a file and returns the result to
@@ -73,63 +635,704 @@ def execute_search_query(data, addr, conn, cached_data=None):
     :param addr: The IP address of the client
     :param conn: The connection object
     :param cached_data: The data to search in. If it's None, then
-    the data is read from the file
+    the shared index is reloaded first when the data file changed
+    :param dataset: The Dataset to search, or None for the default one
     """
-    # Getting the file path for the search data
-    file_path = text_file_path("configs.ini") if cached_data is None else None
-
-    start_time = datetime.datetime.now()
-    found = search_for_string(cached_data or file_path, data)
-    end_time = datetime.datetime.now()
-    execution_time = (end_time - start_time).total_seconds()
-
-    # Response from the server to the client for search query
-    response = "STRING EXISTS\n" if found else "STRING NOT FOUND\n"
+    start_time = time.perf_counter()
+    response = search_query(data, addr, cached_data, dataset)
+    record_request(None, start_time, dataset)
+    start_time = time.perf_counter()
     conn.send(response.encode(DATA_FORMAT))
-    print(
-        f"DEBUG: Search query: {data}, IP: {addr},\n"
-        f"Exec.time: {execution_time}s, Timestamp: {datetime.datetime.now()}\n"
-    )
+    metrics.observe("send", time.perf_counter() - start_time)
 
 
-def handle_client(conn, addr):
+def handle_client(conn, addr, accepted=None):
     """Handle client requests.
 
     It receives a message from the client, and if the message is not
     empty, it sends a message back to
     the client.
 
+    :param conn: the socket object
+    :param addr: ("127.0.0.1", 5051)
+    :param accepted: The time.perf_counter value of the time the
+    connection was accepted, or None
+    """
+    if accepted is not None:
+        metrics.observe("accept_wait", time.perf_counter() - accepted)
+    # A client that sends nothing for the idle timeout is disconnected,
+    # so it doesn't keep a worker thread from other connections.
+    conn.settimeout(IDLE_TIMEOUT or None)
+    try:
+        # With the persistent protocol the connection is kept open for
+        # many queries, otherwise it only carries a single one.
+        if PROTOCOL == "persistent":
+            handle_persistent_client(conn, addr)
+        else:
+            handle_oneshot_client(conn, addr)
+    except TimeoutError:
+        logger.debug("Connection timed out for %s", addr)
+        metrics.increment("errors_total", 'error="idle_timeout"')
+        conn.close()
+
+
+def handle_oneshot_client(conn, addr):
+    """Handle a connection that carries a single request.
+
     :param conn: the socket object
     :param addr: ("127.0.0.1", 5051)
     """
-    print(f"Creating new connection...")
     with conn:
-        print(f"Connection established for {addr}")
+        logger.debug("Connection established for %s", addr)
 
-        # Assigning the value of None to the variable cached_data.
-        cached_data = None
         while True:
-            data = conn.recv(PAYLOAD_SIZE).decode(DATA_FORMAT).rstrip("\x00")
+            start_time = time.perf_counter()
+            data = conn.recv(PAYLOAD_SIZE)
+            metrics.observe("recv", time.perf_counter() - start_time)
+            if is_frame(data):
+                # The client speaks the binary protocol, which carries
+                # many requests on the connection.
+                handle_frame_client(conn, addr, data)
+                break
+            data = data.decode(DATA_FORMAT).rstrip("\x00")
             if len(data) > PAYLOAD_SIZE:
-                print(f"Buffer size exceeded and cannot process data")
+                logger.warning("Payload size exceeded by %s", addr)
                 conn.send("PAYLOAD SIZE EXCEEDED\n".encode(DATA_FORMAT))
                 break
+            name, request = split_dataset(data)
+            if data and parse_request(request.split("\n")[0])[0] is not None:
+                # Commands are answered like on a persistent connection,
+                # a batch may be longer than the payload size so the
+                # rest of its queries are read line by line.
+                buffer = end_request(data.encode(DATA_FORMAT))
+                reader = LineReader(conn, PAYLOAD_SIZE, buffer)
+                send_response(conn, answer_line(reader, addr))
+                break
+            # A single query may end with a line ending, like the
+            # queries of persistent connections.
+            data, request = data.rstrip("\r\n"), request.rstrip("\r\n")
+            if data and name is not None:
+                # A query for a named dataset, which may have its own
+                # reload policy.
+                try:
+                    dataset = find_dataset(name)
+                except UnknownDataset:
+                    send_response(conn, unknown_dataset(name, addr))
+                    break
+                cached_data = None
+                if not dataset.reread_on_query:
+                    cached_data = dataset.corpus.get_index()
+                execute_search_query(request, addr, conn, cached_data, dataset)
+                break
             if data:
                 # A flag that is used to determine whether the data should be
                 # read from the file every time a search query is made or not.
                 if REREAD_ON_QUERY:
-                    execute_search_query(data, addr, conn)
+                    execute_search_query(request, addr, conn)
                     break
                 else:
-                    if cached_data is None:
-                        file_path = text_file_path("configs.ini")
-                        cached_data = strings_list(file_path)
-                    execute_search_query(data, addr, conn, cached_data)
+                    # The index is shared by all connections and is
+                    # only built by the first one when it is missing.
+                    cached_data = corpus.get_index()
+                    execute_search_query(request, addr, conn, cached_data)
                     break
             else:
                 break
-        print(f"Connection closed for {addr}")
-        print("-------------------------------------------------------")
+        logger.debug("Connection closed for %s", addr)
+
+
+def end_request(data):
+    """End the last line of a request received in a single read.
+
+    A request shorter than the payload size was received whole, so on
+    a oneshot connection the end of the data is the end of its last
+    line, like for a plain query, and the reader doesn't wait for a
+    newline that never comes.
+
+    :param data: the data of the first read as bytes
+    :return: The data ending with a newline
+    """
+    if data.endswith(b"\n") or len(data) >= PAYLOAD_SIZE:
+        return data
+    return data + b"\n"
+
+
+def send_response(conn, response):
+    """Send a response and record how long it took.
+
+    :param conn: the socket object
+    :param response: the response as bytes
+    """
+    start_time = time.perf_counter()
+    conn.sendall(response)
+    metrics.observe("send", time.perf_counter() - start_time)
+
+
+def record_request(command, start_time, dataset=None):
+    """Record the search time of a request and count it.
+
+    :param command: the command of the request, or None for a plain
+    query
+    :param start_time: the time.perf_counter value of the time the
+    search started
+    :param dataset: the Dataset of the request, or None for the
+    default one
+    """
+    metrics.observe("search", time.perf_counter() - start_time)
+    metrics.increment("requests_total", f'command="{command or "QUERY"}"')
+    name = DEFAULT_DATASET if dataset is None else dataset.name
+    metrics.increment("dataset_requests_total", f'dataset="{name}"')
+
+
+def unknown_dataset(name, addr):
+    """Count a request for a dataset the server doesn't have.
+
+    :param name: the name of the dataset
+    :param addr: The IP address of the client
+    :return: The response as bytes
+    """
+    logger.warning("Unknown dataset %s from %s", name, addr)
+    metrics.increment("errors_total", 'error="unknown_dataset"')
+    return "UNKNOWN DATASET\n".encode(DATA_FORMAT)
+
+
+def read_batch(reader, count):
+    """Read the queries of a batch request.
+
+    :param reader: the LineReader of the connection
+    :param count: the number of queries in the batch
+    :return: The list of queries
+    """
+    if count > BATCH_LIMIT:
+        raise BatchLimitExceeded
+    queries = []
+    for _ in range(count):
+        query = reader.readline()
+        if query is None:
+            break
+        queries.append(query.decode(DATA_FORMAT))
+    return queries
+
+
+def select_query(data, addr, queries=None):
+    """Select the search that answers a request.
+
+    :param data: The first line of the request
+    :param addr: The IP address of the client
+    :param queries: The queries of a batch request or the patterns of
+    a contains any request, or None
+    :return: The search function and its arguments, the data to search
+    in is added as the last argument
+    """
+    command, argument = parse_request(data)
+    if queries is not None and command == CONTAINS_ANY_COMMAND:
+        return contains_any_query, (queries, addr)
+    if queries is not None:
+        vectorized = command == VECTOR_BATCH_COMMAND
+        return batch_query, (queries, addr, vectorized)
+    if command == PREFIX_COMMAND:
+        return prefix_query, (argument, addr, False)
+    if command == PREFIX_COUNT_COMMAND:
+        return prefix_query, (argument, addr, True)
+    if command == SUBSTRING_COMMAND:
+        return substring_query, (argument, addr)
+    if command == FILTER_COMMAND:
+        return filter_query, (argument, addr)
+    if command == STATS_COMMAND:
+        return stats_query, (addr,)
+    return search_query, (data, addr)
+
+
+def answer_request(reader, data, addr):
+    """Answer a request.
+
+    It answers a single query, a command, or when the data is a batch
+    header, the batch of queries that follows it. The search runs in
+    the dataset named by the request, either after reloading its data
+    file or directly in its shared index
+
+    :param reader: the LineReader of the connection
+    :param data: The first line of the request
+    :param addr: The IP address of the client
+    :return: The response message
+    """
+    start_time = time.perf_counter()
+    name, data = split_dataset(data)
+    count = parse_batch_header(data)
+    queries = read_batch(reader, count) if count is not None else None
+    # The dataset is looked up once the whole request was read, so an
+    # unknown one doesn't leave the queries of a batch on the
+    # connection.
+    dataset = find_dataset(name)
+    query, args = select_query(data, addr, queries)
+    parsed = time.perf_counter()
+    metrics.observe("parse", parsed - start_time)
+    if dataset.reread_on_query:
+        response = query(*args, dataset=dataset)
+    else:
+        response = query(*args, dataset.corpus.get_index(), dataset=dataset)
+    record_request(parse_request(data)[0], parsed, dataset)
+    return response
+
+
+def answer_line(reader, addr):
+    """Read a request from a connection and answer it.
+
+    :param reader: the LineReader of the connection
+    :param addr: The IP address of the client
+    :return: The response as bytes, or None when the client closed
+    the connection
+    """
+    try:
+        # On a persistent connection the receive time also counts the
+        # time the client took to send its next request.
+        start_time = time.perf_counter()
+        line = reader.readline()
+        if line is None:
+            return None
+        metrics.observe("recv", time.perf_counter() - start_time)
+        response = answer_request(reader, line.decode(DATA_FORMAT), addr)
+    except UnknownDataset as err:
+        return unknown_dataset(err.args[0], addr)
+    except PayloadSizeExceeded:
+        logger.warning("Payload size exceeded by %s", addr)
+        metrics.increment("errors_total", 'error="payload_size"')
+        response = "PAYLOAD SIZE EXCEEDED\n"
+    except BatchLimitExceeded:
+        logger.warning("Batch limit exceeded by %s", addr)
+        metrics.increment("errors_total", 'error="batch_limit"')
+        response = "BATCH LIMIT EXCEEDED\n"
+    return response.encode(DATA_FORMAT)
+
+
+def handle_persistent_client(conn, addr):
+    """Handle many queries on one connection.
+
+    It reads newline-delimited requests until the client closes the
+    connection and answers them in the order they were sent. Clients
+    may send many requests without waiting for the answers, all the
+    requests that arrive together are answered with a single send.
+
+    :param conn: the socket object
+    :param addr: ("127.0.0.1", 5051)
+    """
+    with conn:
+        logger.debug("Persistent connection established for %s", addr)
+        # The first byte tells binary frames from text requests.
+        data = conn.recv(PAYLOAD_SIZE)
+        if is_frame(data):
+            handle_frame_client(conn, addr, data)
+            logger.debug("Connection closed for %s", addr)
+            return
+        reader = LineReader(conn, PAYLOAD_SIZE, data)
+        responses = []
+        while True:
+            response = answer_line(reader, addr)
+            if response is not None:
+                responses.append(response)
+            # The answers are sent once there is no other request
+            # waiting, or when the connection has to be closed.
+            closing = response is None or response.endswith(b"EXCEEDED\n")
+            if responses and (closing or not reader.has_line()):
+                send_response(conn, b"".join(responses))
+                responses = []
+            if closing:
+                break
+        logger.debug("Connection closed for %s", addr)
+
+
+def select_frame_query(frame, addr, dataset):
+    """Select the search that answers a binary frame.
+
+    Plain queries are searched as bytes when the search engine of the
+    dataset accepts them, so they are never decoded
+
+    :param frame: The type, dataset name and payload of the frame
+    :param addr: The IP address of the client
+    :param dataset: The Dataset the frame targets
+    :return: The search function and its arguments, the data to search
+    in is added as the last argument
+    """
+    frame_type, _, payload = frame
+    command = FRAME_TYPES[frame_type]
+    if command is None:
+        engine = dataset.corpus.engine
+        if engine is not None and engine.accepts_bytes:
+            return search_query, (bytes(payload), addr)
+        return search_query, (str(payload, DATA_FORMAT), addr)
+    argument = str(payload, DATA_FORMAT)
+    if command in BATCH_COMMANDS:
+        lines = argument.split("\n") if argument else []
+        if len(lines) > BATCH_LIMIT:
+            raise BatchLimitExceeded
+        return select_query(f"{command} {len(lines)}", addr, lines)
+    return select_query(f"{command} {argument}", addr)
+
+
+def reject_frame(err, addr):
+    """Answer a binary frame that can't be searched.
+
+    :param err: the exception raised while the frame was read
+    :param addr: The IP address of the client
+    :return: The text response as bytes
+    """
+    if isinstance(err, UnknownDataset):
+        return unknown_dataset(err.args[0], addr)
+    if isinstance(err, PayloadSizeExceeded):
+        error, response = "payload_size", "PAYLOAD SIZE EXCEEDED\n"
+    elif isinstance(err, BatchLimitExceeded):
+        error, response = "batch_limit", "BATCH LIMIT EXCEEDED\n"
+    else:
+        error, response = "invalid_frame", "INVALID FRAME\n"
+    logger.warning("Frame rejected from %s: %s", addr, response.strip())
+    metrics.increment("errors_total", f'error="{error}"')
+    return response.encode(DATA_FORMAT)
+
+
+def answer_frame(reader, addr):
+    """Read a binary frame from a connection and answer it.
+
+    :param reader: the FrameReader of the connection
+    :param addr: The IP address of the client
+    :return: The response as bytes, or None when the client closed
+    the connection
+    """
+    try:
+        start_time = time.perf_counter()
+        frame = reader.read_frame()
+        if frame is None:
+            return None
+        parsed = time.perf_counter()
+        metrics.observe("recv", parsed - start_time)
+        dataset = find_dataset(frame[1])
+        query, args = select_frame_query(frame, addr, dataset)
+        start_time, parsed = parsed, time.perf_counter()
+        metrics.observe("parse", parsed - start_time)
+        if dataset.reread_on_query:
+            response = query(*args, dataset=dataset)
+        else:
+            response = query(*args, dataset.corpus.get_index(),
+                             dataset=dataset)
+        record_request(FRAME_TYPES[frame[0]], parsed, dataset)
+        response = response.encode(DATA_FORMAT)
+    except FRAME_ERRORS as err:
+        response = reject_frame(err, addr)
+    return encode_frame_response(response)
+
+
+def handle_frame_client(conn, addr, data):
+    """Handle binary frames on one connection.
+
+    It reads frames until the client closes the connection and answers
+    them in the order they were sent. The answers to the frames that
+    arrive together are sent with a single send.
+
+    :param conn: the socket object
+    :param addr: ("127.0.0.1", 5051)
+    :param data: the data already received from the connection
+    """
+    logger.debug("Binary protocol for %s", addr)
+    reader = FrameReader(conn, FRAME_SIZE, data)
+    responses = []
+    while True:
+        response = answer_frame(reader, addr)
+        if response is not None:
+            responses.append(response)
+        closing = response is None or response[0] in CLOSING_STATUSES
+        if responses and (closing or not reader.has_frame()):
+            send_response(conn, b"".join(responses))
+            responses = []
+        if closing:
+            break
+
+
+# Queries answered on the event loop, the others scan the data, sort it
+# or build one of its indexes on their first use.
+INLINE_QUERIES = (search_query, stats_query)
+
+
+async def run_query_async(query, args, dataset):
+    """Run the search that answers a request from the event loop.
+
+    Exact lookups in the loaded index and stats run inline, while the
+    other queries and the queries that may reload the data file are
+    handed to the thread pool, so they don't block other connections.
+
+    :param query: The search function
+    :param args: The arguments of the search function
+    :param dataset: The Dataset to search
+    :return: The response message
+    """
+    if dataset.reread_on_query:
+        call = partial(query, *args, dataset=dataset)
+    elif query in INLINE_QUERIES:
+        return query(*args, dataset.corpus.get_index(), dataset=dataset)
+    else:
+        call = partial(
+            query, *args, dataset.corpus.get_index(), dataset=dataset
+        )
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, call)
+
+
+async def answer_frame_async(reader, addr):
+    """Read a binary frame from a stream and answer it.
+
+    It does the same as answer_frame on the event loop, and hands the
+    requests that don't take constant time to the thread pool like
+    answer_line_async.
+
+    :param reader: the AsyncFrameReader of the connection
+    :param addr: The IP address of the client
+    :return: The response as bytes, or None when the client closed
+    the connection
+    """
+    try:
+        start_time = time.perf_counter()
+        frame = await reader.read_frame()
+        if frame is None:
+            return None
+        parsed = time.perf_counter()
+        metrics.observe("recv", parsed - start_time)
+        dataset = find_dataset(frame[1])
+        query, args = select_frame_query(frame, addr, dataset)
+        start_time, parsed = parsed, time.perf_counter()
+        metrics.observe("parse", parsed - start_time)
+        response = await run_query_async(query, args, dataset)
+        record_request(FRAME_TYPES[frame[0]], parsed, dataset)
+        response = response.encode(DATA_FORMAT)
+    except FRAME_ERRORS as err:
+        response = reject_frame(err, addr)
+    return encode_frame_response(response)
+
+
+async def handle_frame_client_async(reader, writer, addr, data):
+    """Handle binary frames on one connection on the event loop.
+
+    It does the same as handle_frame_client for a connection accepted
+    by the asyncio server.
+
+    :param reader: the stream the frames are read from
+    :param writer: the stream the responses are written to
+    :param addr: ("127.0.0.1", 5051)
+    :param data: the data already read from the stream
+    """
+    logger.debug("Binary protocol for %s", addr)
+    reader = AsyncFrameReader(reader, FRAME_SIZE, data)
+    while True:
+        response = await answer_frame_async(reader, addr)
+        if response is None:
+            break
+        writer.write(response)
+        # The answers are written out once there is no other frame
+        # waiting.
+        closing = response[0] in CLOSING_STATUSES
+        if closing or not reader.has_frame():
+            start_time = time.perf_counter()
+            await writer.drain()
+            metrics.observe("send", time.perf_counter() - start_time)
+        if closing:
+            break
+
+
+async def answer_line_async(reader, addr):
+    """Read a request from a stream and answer it.
+
+    It does the same as answer_line on the event loop. Lookups in the
+    loaded index run inline, while the other requests are handed to
+    the thread pool.
+
+    :param reader: the AsyncLineReader of the connection
+    :param addr: The IP address of the client
+    :return: The response as bytes, or None when the client closed
+    the connection
+    """
+    try:
+        start_time = time.perf_counter()
+        line = await reader.readline()
+        if line is None:
+            return None
+        parsed = time.perf_counter()
+        metrics.observe("recv", parsed - start_time)
+        name, data = split_dataset(line.decode(DATA_FORMAT))
+        count = parse_batch_header(data)
+        queries = None
+        if count is not None:
+            if count > BATCH_LIMIT:
+                raise BatchLimitExceeded
+            queries = []
+            for _ in range(count):
+                query = await reader.readline()
+                if query is None:
+                    break
+                queries.append(query.decode(DATA_FORMAT))
+        dataset = find_dataset(name)
+        query, args = select_query(data, addr, queries)
+        start_time, parsed = parsed, time.perf_counter()
+        metrics.observe("parse", parsed - start_time)
+        response = await run_query_async(query, args, dataset)
+        record_request(parse_request(data)[0], parsed, dataset)
+    except UnknownDataset as err:
+        return unknown_dataset(err.args[0], addr)
+    except PayloadSizeExceeded:
+        logger.warning("Payload size exceeded by %s", addr)
+        metrics.increment("errors_total", 'error="payload_size"')
+        response = "PAYLOAD SIZE EXCEEDED\n"
+    except BatchLimitExceeded:
+        logger.warning("Batch limit exceeded by %s", addr)
+        metrics.increment("errors_total", 'error="batch_limit"')
+        response = "BATCH LIMIT EXCEEDED\n"
+    return response.encode(DATA_FORMAT)
+
+
+async def handle_persistent_client_async(reader, writer, addr):
+    """Handle many queries on one connection on the event loop.
+
+    It does the same as handle_persistent_client for a connection
+    accepted by the asyncio server.
+
+    :param reader: the stream the queries are read from
+    :param writer: the stream the responses are written to
+    :param addr: ("127.0.0.1", 5051)
+    """
+    # The first byte tells binary frames from text requests.
+    data = await reader.read(PAYLOAD_SIZE)
+    if is_frame(data):
+        await handle_frame_client_async(reader, writer, addr, data)
+        return
+    reader = AsyncLineReader(reader, PAYLOAD_SIZE, data)
+    while True:
+        response = await answer_line_async(reader, addr)
+        if response is None:
+            break
+        start_time = time.perf_counter()
+        writer.write(response)
+        await writer.drain()
+        metrics.observe("send", time.perf_counter() - start_time)
+        if response.endswith(b"EXCEEDED\n"):
+            break
+
+
+async def handle_client_async(reader, writer):
+    """Handle client requests on the event loop.
+
+    It does the same as handle_client for a connection accepted by the
+    asyncio server. Lookups in the loaded index take constant time and
+    run inline, while queries that may have to reload the data file are
+    handed to the thread pool so they don't block other connections.
+
+    :param reader: the stream the query is read from
+    :param writer: the stream the response is written to
+    """
+    addr = writer.get_extra_info("peername")
+    metrics.increment("connections_total")
+    logger.debug("Connection established for %s", addr)
+    try:
+        if PROTOCOL == "persistent":
+            await handle_persistent_client_async(reader, writer, addr)
+            return
+        data = await reader.read(PAYLOAD_SIZE)
+        if is_frame(data):
+            await handle_frame_client_async(reader, writer, addr, data)
+            return
+        first_line = data.split(b"\n")[0].decode(DATA_FORMAT)
+        name, first_line = split_dataset(first_line)
+        if parse_request(first_line)[0] is not None:
+            data = end_request(data.rstrip(b"\x00"))
+            reader = AsyncLineReader(reader, PAYLOAD_SIZE, data)
+            writer.write(await answer_line_async(reader, addr))
+            await writer.drain()
+            return
+        # A single query may end with a line ending, like the queries of
+        # persistent connections.
+        data = data.decode(DATA_FORMAT).rstrip("\x00").rstrip("\r\n")
+        request = split_dataset(data)[1]
+        if len(data) > PAYLOAD_SIZE:
+            logger.warning("Payload size exceeded by %s", addr)
+            writer.write("PAYLOAD SIZE EXCEEDED\n".encode(DATA_FORMAT))
+        elif data and name is not None:
+            # A query for a named dataset, which may have its own
+            # reload policy.
+            try:
+                dataset = find_dataset(name)
+            except UnknownDataset:
+                writer.write(unknown_dataset(name, addr))
+            else:
+                start_time = time.perf_counter()
+                if dataset.reread_on_query:
+                    loop = asyncio.get_running_loop()
+                    response = await loop.run_in_executor(
+                        None, search_query, request, addr, None, dataset
+                    )
+                else:
+                    response = search_query(
+                        request, addr, dataset.corpus.get_index(), dataset
+                    )
+                record_request(None, start_time, dataset)
+                writer.write(response.encode(DATA_FORMAT))
+        elif data:
+            start_time = time.perf_counter()
+            if REREAD_ON_QUERY:
+                loop = asyncio.get_running_loop()
+                response = await loop.run_in_executor(
+                    None, search_query, request, addr
+                )
+            else:
+                response = search_query(request, addr, corpus.get_index())
+            record_request(None, start_time)
+            writer.write(response.encode(DATA_FORMAT))
+        await writer.drain()
+    except ConnectionError as err:
+        logger.error("Error handling connection: %s", err)
+    finally:
+        writer.close()
+        logger.debug("Connection closed for %s", addr)
+
+
+async def serve_async():
+    """Serve connections with asyncio.
+
+    It runs an asyncio server on the listening socket until it is
+    cancelled, with a thread pool for the expensive queries.
+    """
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=MAX_WORKERS))
+    server = await asyncio.start_server(handle_client_async, sock=server_sock)
+    async with server:
+        await server.serve_forever()
+
+
+def start_async_server():
+    """Start the asyncio server.
+
+    It starts the server and serves every connection on a single
+    event loop, which keeps slow clients from holding worker threads.
+    """
+    logger.info("Starting asyncio server ...")
+    load_corpus()
+    start_metrics_server()
+    logger.info("Server listening on %s:%d", HOST, PORT)
+    logger.info("Use CTRL + C to end operation")
+    try:
+        asyncio.run(serve_async())
+    except KeyboardInterrupt:
+        logger.info("Shutting down server...")
+
+
+def start_metrics_server():
+    """Start the metrics endpoint.
+
+    It serves the metrics in the Prometheus text format on
+    http://HOST:METRICS_PORT/metrics, unless no metrics port is set.
+    """
+    if not METRICS_PORT:
+        return
+    try:
+        start_http_server(HOST, METRICS_PORT)
+    except OSError as err:
+        logger.error("Error starting metrics endpoint: %s", err)
+        return
+    logger.info("Metrics served on http://%s:%d/metrics", HOST, METRICS_PORT)
 
 
 def stop_server():
@@ -140,5 +1343,68 @@ def stop_server():
     server_sock.close()
 
 
+def serve_worker():
+    """Accept connections in a worker process.
+
+    The records logged by the worker are written before it exits,
+    since worker processes exit without the usual clean-up.
+    """
+    try:
+        accept_connections()
+    finally:
+        stop_logging()
+
+
+def start_prefork_server():
+    """Start the pre-fork server.
+
+    It loads the search data once and starts worker processes that
+    all accept connections on the same listening socket. The workers
+    share the loaded index with the main process copy-on-write, and
+    on SIGHUP the data file is reloaded and the workers are replaced
+    one at a time.
+    """
+    logger.info("Starting pre-fork server with %d workers ...", WORKERS)
+    load_corpus()
+    logger.info("Server listening on %s:%d", HOST, PORT)
+    logger.info("Use CTRL + C to end operation")
+    # Every worker keeps the metrics of the connections it accepts,
+    # which are read with the STATS command. The HTTP endpoint isn't
+    # started since the main process accepts no connection.
+    # Keeping the loaded index out of the garbage collector, which
+    # would otherwise write to its pages and copy them in every worker.
+    gc.freeze()
+    try:
+        run_workers(serve_worker, WORKERS, on_restart=refresh_datasets)
+    except OSError as err:
+        logger.error("Error starting workers: %s", err)
+        sys.exit(1)
+
+
+def main():
+    """Start the server in the mode chosen in the configs.ini file."""
+    configure()
+    setup_logging(
+        level=LOG_LEVEL,
+        queue_size=LOG_QUEUE_SIZE,
+        batch_size=LOG_BATCH_SIZE,
+        sample_rate=LOG_SAMPLE_RATE,
+        query_log_path=QUERY_LOG_PATH,
+        query_log_max_bytes=QUERY_LOG_MAX_BYTES,
+        query_log_backups=QUERY_LOG_BACKUPS,
+    )
+    open_socket()
+    try:
+        # The server mode is chosen in the configs.ini file.
+        if SERVER_MODE == "asyncio":
+            start_async_server()
+        elif SERVER_MODE == "prefork":
+            start_prefork_server()
+        else:
+            start_server()
+    finally:
+        stop_logging()
+
+
 if __name__ == "__main__":
-    start_server()
+    main()
@@ -0,0 +1,242 @@
+"""Server logging script.
+
+The server logs through the standard logging module, but the records
+are only put on a bounded queue by the threads handling requests. A
+background writer thread takes them off the queue in batches, formats
+and writes them, and flushes once per batch. When the queue is full
+the records are dropped and counted instead of blocking a request.
+
+Per-query records go to the server.queries logger. They can be
+sampled, and written to a rotating file instead of the console.
+"""
+
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from logging.handlers import QueueHandler, RotatingFileHandler
+
+from metrics import metrics
+
+# Logger of the server events: startup, connections and errors.
+logger = logging.getLogger("server")
+
+# Logger of a record for every query.
+query_logger = logging.getLogger("server.queries")
+
+CONSOLE_FORMAT = "%(asctime)s %(levelname)s %(message)s"
+QUERY_LOG_FORMAT = "%(asctime)s %(message)s"
+
+# Put on the queue to stop the writer thread.
+_STOP = object()
+
+# The writer of the process, if logging was set up.
+_writer = None
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Put records on a bounded queue without ever waiting.
+
+    The records are formatted by the writer thread, so the threads
+    handling requests only create them.
+    """
+
+    def __init__(self, log_queue):
+        """Create a handler for a queue.
+
+        :param log_queue: a queue.Queue with a maximum size
+        """
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        """Leave the formatting to the writer thread."""
+        return record
+
+    def enqueue(self, record):
+        """Put a record on the queue, or drop it if the queue is full."""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            metrics.increment("log_records_dropped_total")
+
+
+class SampleFilter(logging.Filter):
+    """Keep a random share of the records."""
+
+    def __init__(self, rate):
+        """Create a filter.
+
+        :param rate: the share of records kept, between 0 and 1
+        """
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        """Check whether the record is kept."""
+        return self.rate >= 1 or random.random() < self.rate
+
+
+class BatchStreamHandler(logging.StreamHandler):
+    """Write records to a stream that the writer flushes per batch."""
+
+    def emit(self, record):
+        """Write a record without flushing the stream."""
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+
+class BatchRotatingFileHandler(RotatingFileHandler):
+    """Write records to a rotating file that the writer flushes."""
+
+    def emit(self, record):
+        """Write a record without flushing the file."""
+        try:
+            if self.shouldRollover(record):
+                self.doRollover()
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+
+class LogWriter:
+    """Take records off a queue in a thread and write them."""
+
+    def __init__(self, queue_handler, handlers, batch_size=100):
+        """Create a writer.
+
+        :param queue_handler: the DroppingQueueHandler of the loggers
+        :param handlers: the handlers that write the records
+        :param batch_size: the largest number of records written
+        before the handlers are flushed
+        """
+        self.queue_handler = queue_handler
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.thread = None
+
+    def start(self):
+        """Start the writer thread."""
+        self.thread = threading.Thread(
+            target=self._run, name="log-writer", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self):
+        """Write the records left on the queue and stop the thread."""
+        self.queue_handler.queue.put(_STOP)
+        self.thread.join()
+        for handler in self.handlers:
+            handler.close()
+
+    def restart(self):
+        """Start the writer again in a forked process.
+
+        The thread of the parent process doesn't exist in the child,
+        and the queue may have been locked by it, so the child gets a
+        new queue and a new thread.
+        """
+        maxsize = self.queue_handler.queue.maxsize
+        self.queue_handler.queue = queue.Queue(maxsize)
+        self.start()
+
+    def _run(self):
+        """Write the records in batches until the stop marker."""
+        log_queue = self.queue_handler.queue
+        stopping = False
+        while not stopping:
+            batch = [log_queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(log_queue.get_nowait())
+                except queue.Empty:
+                    break
+            for record in batch:
+                if record is _STOP:
+                    stopping = True
+                    continue
+                for handler in self.handlers:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+            for handler in self.handlers:
+                handler.flush()
+
+
+def setup_logging(level="INFO", queue_size=10000, batch_size=100,
+                  sample_rate=1.0, query_log_path="",
+                  query_log_max_bytes=10485760, query_log_backups=5):
+    """Send the server logs through a queue to a writer thread.
+
+    :param level: the lowest level of the records that are logged
+    :param queue_size: the number of records the queue holds before
+    new ones are dropped
+    :param batch_size: the largest number of records written at once
+    :param sample_rate: the share of query records that are logged
+    :param query_log_path: the file the query records are written to,
+    or an empty string to write them to the console
+    :param query_log_max_bytes: the size at which the query log file
+    is rotated
+    :param query_log_backups: the number of rotated query log files
+    that are kept
+    :return: The LogWriter
+    """
+    global _writer
+    console = BatchStreamHandler(sys.stdout)
+    console.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+    handlers = [console]
+    if query_log_path:
+        query_file = BatchRotatingFileHandler(
+            query_log_path,
+            maxBytes=query_log_max_bytes,
+            backupCount=query_log_backups,
+        )
+        query_file.setFormatter(logging.Formatter(QUERY_LOG_FORMAT))
+        query_file.addFilter(logging.Filter(query_logger.name))
+        handlers.append(query_file)
+        console.addFilter(lambda record: record.name != query_logger.name)
+    # With a query log file the query records are written to it
+    # whatever the level of the console, otherwise they follow it.
+    query_logger.setLevel(logging.INFO if query_log_path else logging.NOTSET)
+    queue_handler = DroppingQueueHandler(queue.Queue(queue_size))
+    logger.handlers = [queue_handler]
+    logger.setLevel(level)
+    logger.propagate = False
+    query_logger.filters = []
+    if sample_rate < 1:
+        query_logger.addFilter(SampleFilter(sample_rate))
+    _writer = LogWriter(queue_handler, handlers, batch_size)
+    _writer.start()
+    return _writer
+
+
+def stop_logging():
+    """Write the queued records and stop the writer thread.
+
+    The number of dropped records, if any, is written to stderr.
+    """
+    global _writer
+    if _writer is None:
+        return
+    writer, _writer = _writer, None
+    logger.handlers = []
+    writer.stop()
+    if writer.queue_handler.dropped:
+        print(
+            f"{writer.queue_handler.dropped} log records were dropped "
+            f"because the log queue was full",
+            file=sys.stderr,
+        )
+
+
+def _restart_after_fork():
+    """Restart the writer thread in a forked worker process."""
+    if _writer is not None:
+        _writer.restart()
+
+
+os.register_at_fork(after_in_child=_restart_after_fork)
@@ -2,4 +2,9 @@
 
 from setuptools import setup, find_packages
 
-setup(name='string-search-server', version='1.0', packages=find_packages())
+setup(
+    name='string-search-server',
+    version='1.0',
+    packages=find_packages(),
+    extras_require={'numpy': ['numpy']},
+)
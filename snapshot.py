@@ -0,0 +1,92 @@
+"""Index snapshot script.
+
+A snapshot is the built search data of a data file written to disk,
+so a restarted server loads it instead of reading and sorting the
+data file again. The file starts with a header that records the
+format, the search engine and the state of the data file it was
+built from, followed by the search data serialized with pickle:
+
+    MAGIC | header length (4 bytes) | JSON header | pickled data
+
+Snapshots are trusted like the configs.ini file, since unpickling a
+crafted file can run code.
+
+A snapshot is only used while the data file has the same inode, size
+and modification time, and the same checksum of its last bytes, or
+when it only grew since, in which case the new lines are added to it.
+"""
+
+import json
+import os
+import pickle
+import struct
+
+MAGIC = b"SSSNAP\x00\x01"
+
+# Version of the layout of the snapshot files, increased whenever it
+# changes so older snapshots are rebuilt instead of misread.
+FORMAT_VERSION = 1
+
+HEADER_LENGTH = struct.Struct(">I")
+
+
+class SnapshotError(ValueError):
+    """The snapshot file can't be used."""
+
+
+def write_snapshot(path, header, data):
+    """Write a snapshot file.
+
+    The file is written next to its final path and renamed, so a
+    reader never sees a partly written snapshot
+
+    :param path: the path of the snapshot file
+    :param header: a dict with the state of the data file
+    :param data: the search data, made of built-in types
+    """
+    header = dict(header, format=FORMAT_VERSION)
+    payload = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+    header["payload_size"] = len(payload)
+    header = json.dumps(header).encode("utf-8")
+    temp_path = f"{path}.tmp{os.getpid()}"
+    with open(temp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(HEADER_LENGTH.pack(len(header)))
+        f.write(header)
+        f.write(payload)
+    os.replace(temp_path, path)
+
+
+def read_header(f):
+    """Read the header of a snapshot file.
+
+    :param f: the snapshot file opened in binary mode
+    :return: The header as a dict
+    """
+    if f.read(len(MAGIC)) != MAGIC:
+        raise SnapshotError("Not a snapshot file")
+    try:
+        (length,) = HEADER_LENGTH.unpack(f.read(HEADER_LENGTH.size))
+        header = json.loads(f.read(length))
+    except (struct.error, ValueError):
+        raise SnapshotError("Invalid snapshot header") from None
+    if header.get("format") != FORMAT_VERSION:
+        raise SnapshotError(f"Unsupported format {header.get('format')}")
+    return header
+
+
+def read_snapshot(path):
+    """Read a snapshot file.
+
+    :param path: the path of the snapshot file
+    :return: The header as a dict and the search data
+    """
+    with open(path, "rb") as f:
+        header = read_header(f)
+        payload = f.read()
+    if len(payload) != header["payload_size"]:
+        raise SnapshotError("Truncated snapshot")
+    try:
+        return header, pickle.loads(payload)
+    except (EOFError, ValueError, TypeError, pickle.UnpicklingError):
+        raise SnapshotError("Invalid snapshot data") from None
@@ -0,0 +1,139 @@
+"""Unit test for benchmark.py"""
+
+import configparser
+import csv
+import json
+import socket
+import threading
+
+from benchmark import (
+    make_queries,
+    percentile,
+    run_client,
+    summarize,
+    write_config,
+    write_results,
+)
+from generate_data import generate_random_ips
+from mmap_index import MmapIndex
+
+
+def test_percentile():
+    """Test percentile.
+
+    It checks the nearest-rank percentiles of a list of values
+    """
+    values = list(range(1, 1001))
+    assert percentile(values, 50) == 500
+    assert percentile(values, 99) == 990
+    assert percentile(values, 99.9) == 999
+    assert percentile(values, 100) == 1000
+    assert percentile([7], 99.9) == 7
+    assert percentile([], 50) is None
+
+
+def test_summarize():
+    """Test summarize.
+
+    It checks the throughput and that percentiles are in microseconds
+    """
+    summary = summarize([3000, 1000, 2000, 4000], 2.0, errors=1)
+    assert summary["requests"] == 4
+    assert summary["errors"] == 1
+    assert summary["throughput"] == 2.0
+    assert summary["p50_us"] == 2.0
+    assert summary["p999_us"] == 4.0
+    assert summary["max_us"] == 4.0
+
+
+def test_write_results(tmp_path):
+    """Test write results.
+
+    It checks that the results are written as JSON and CSV
+    """
+    result = {"lines": 10, "engine": "hash", "concurrency": 1}
+    result.update(summarize([1000], 1.0))
+    output = str(tmp_path / "results")
+    write_results([result], output)
+
+    with open(output + ".json") as f:
+        assert json.load(f) == [result]
+    with open(output + ".csv") as f:
+        rows = list(csv.DictReader(f))
+    assert rows[0]["engine"] == "hash"
+    assert rows[0]["p99_us"] == "1.0"
+
+
+def test_make_queries(tmp_path):
+    """Test make queries.
+
+    It checks that queries are generated from a data file, with about
+    as many hits as misses
+    """
+    file_path = str(tmp_path / "d50.txt")
+    generate_random_ips(count=50, file_path=file_path)
+    with open(file_path) as f:
+        lines = set(line.strip() for line in f)
+    assert len(lines) <= 50
+
+    queries = make_queries(file_path, 200)
+    hits = sum(query in lines for query in queries)
+    assert len(queries) == 200
+    assert 50 < hits < 150
+
+
+def test_write_config_mmap(tmp_path):
+    """Test write config with the mmap engine.
+
+    It checks that an index file is built from the data file and set as
+    the INDEX_PATH of the server
+    """
+    file_path = str(tmp_path / "d50.txt")
+    generate_random_ips(count=50, file_path=file_path)
+    config_path = write_config(str(tmp_path), file_path, 5052, "mmap",
+                               False, "threaded", "persistent")
+    config = configparser.ConfigParser()
+    config.read(config_path)
+    index_path = config["text_file"]["INDEX_PATH"]
+    with open(file_path) as f:
+        line = f.readline().strip()
+    index = MmapIndex(index_path)
+    assert line in index
+
+
+def test_run_client_persistent_errors():
+    """Test run client with the persistent protocol.
+
+    It checks that a connection closed by the server and a response
+    that isn't an answer count as failed queries, and that the next
+    queries are sent on a new connection
+    """
+    server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_sock.bind(("127.0.0.1", 0))
+    server_sock.listen()
+
+    def serve():
+        # The first connection is closed without an answer, the second
+        # one is refused as busy, the third one answers every query.
+        conn, _ = server_sock.accept()
+        conn.recv(1024)
+        conn.close()
+        conn, _ = server_sock.accept()
+        conn.recv(1024)
+        conn.sendall(b"SERVER BUSY\n")
+        conn.close()
+        conn, _ = server_sock.accept()
+        with conn:
+            while conn.recv(1024):
+                conn.sendall(b"STRING NOT FOUND\n")
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    port = server_sock.getsockname()[1]
+    latencies, errors = run_client(
+        port, ["foo", "bar", "baz"], "persistent"
+    )
+    thread.join(timeout=5)
+    server_sock.close()
+    assert errors == 2
+    assert len(latencies) == 1
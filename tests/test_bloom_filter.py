@@ -0,0 +1,40 @@
+"""Unit test for bloom_filter.py"""
+
+from bloom_filter import BloomFilter
+
+
+def test_bloom_filter_no_false_negatives():
+    """Test bloom filter has no false negatives.
+
+    It checks that every added string or bytes is reported as present
+    """
+    bloom = BloomFilter(1000, 0.01)
+    bloom.update(f"{i};{i * 7};" for i in range(1000))
+    assert all(f"{i};{i * 7};" in bloom for i in range(1000))
+    assert all(f"{i};{i * 7};".encode() in bloom for i in range(1000))
+
+
+def test_bloom_filter_false_positive_rate():
+    """Test bloom filter false positive rate.
+
+    It checks that strings that were not added are rarely reported as
+    present, close to the rate the filter was sized for
+    """
+    bloom = BloomFilter(10000, 0.01)
+    bloom.update(f"{i};" for i in range(10000))
+    false_positives = sum(f"x{i};" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_bloom_filter_copy():
+    """Test bloom filter copy.
+
+    It checks that adding to a copy leaves the original unchanged
+    """
+    bloom = BloomFilter(10, 0.01)
+    bloom.add("1;2;3;")
+    other = bloom.copy()
+    other.add("4;5;6;")
+    assert "4;5;6;" in other
+    assert "4;5;6;" not in bloom
+    assert "1;2;3;" in other
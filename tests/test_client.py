@@ -1,10 +1,29 @@
 """Unit test for client.py"""
 
+import asyncio
+import io
 import pytest
 import socket
+import socketserver
+import threading
 
 from unittest.mock import MagicMock, patch
-from client import send_request, PAYLOAD_SIZE, DATA_FORMAT
+from protocol import encode_frame
+from client import (
+    AsyncSearchClient,
+    SearchClient,
+    SearchClientError,
+    send_request,
+    send_requests,
+    send_batch_request,
+    send_contains_any_request,
+    send_filter_request,
+    send_frame_requests,
+    send_prefix_request,
+    send_substring_request,
+    PAYLOAD_SIZE,
+    DATA_FORMAT,
+)
 
 
 @pytest.fixture
@@ -94,3 +113,328 @@ def test_send_request_socket_connection_error():
         mock_socket.return_value.connect.side_effect = ConnectionRefusedError
         with pytest.raises(SystemExit):
             send_request("3;0;1;28;0;23;4;0;")
+
+
+def test_send_requests_pipelined():
+    """Test pipelined requests.
+
+    It checks that all the queries are sent at once and that the
+    responses, which may arrive split across several reads, are
+    matched to the queries in order
+    """
+    with patch("socket.create_connection") as mock_create_connection:
+        mock_sock = mock_create_connection.return_value.__enter__.return_value
+        mock_sock.recv.side_effect = [
+            b"STRING EXISTS\nSTRING NO",
+            b"T FOUND\nSTRING EXISTS\n",
+        ]
+        results = send_requests(["a", "b", "c"])
+    mock_sock.sendall.assert_called_once_with(b"a\nb\nc\n")
+    assert results == [True, False, True]
+
+
+def test_send_requests_connection_closed():
+    """Test pipelined requests with a closed connection.
+
+    It checks that the client exits when the server closes the
+    connection before answering every query
+    """
+    with patch("socket.create_connection") as mock_create_connection:
+        mock_sock = mock_create_connection.return_value.__enter__.return_value
+        mock_sock.recv.side_effect = [b"STRING EXISTS\n", b""]
+        with pytest.raises(SystemExit):
+            send_requests(["a", "b"])
+
+
+def test_send_batch_request():
+    """Test batch request.
+
+    It checks that the queries are sent after a batch header and that
+    the single response is decoded into one result per query
+    """
+    with patch("socket.create_connection") as mock_create_connection:
+        mock_sock = mock_create_connection.return_value.__enter__.return_value
+        mock_sock.recv.side_effect = [b"RESULTS 1", b"0\n"]
+        results = send_batch_request(["a", "b"])
+    mock_sock.sendall.assert_called_once_with(b"BATCH 2\na\nb\n")
+    assert results == [True, False]
+
+
+def test_send_frame_requests():
+    """Test binary frame requests.
+
+    It checks that a frame is sent for every query and that the status
+    bytes of the answers are decoded
+    """
+    with patch("socket.create_connection") as mock_create_connection:
+        mock_sock = mock_create_connection.return_value.__enter__.return_value
+        mock_sock.makefile.return_value = io.BytesIO(b"\x01\x00")
+        results = send_frame_requests(["a", "b"], "logs")
+    mock_sock.sendall.assert_called_once_with(
+        encode_frame(0, b"a", "logs") + encode_frame(0, b"b", "logs")
+    )
+    assert results == [True, False]
+
+
+def test_send_frame_requests_error():
+    """Test binary frame requests refused by the server."""
+    with patch("socket.create_connection") as mock_create_connection:
+        mock_sock = mock_create_connection.return_value.__enter__.return_value
+        mock_sock.makefile.return_value = io.BytesIO(b"\x03")
+        with pytest.raises(SearchClientError):
+            send_frame_requests(["a"], "nope")
+
+
+def test_send_vector_batch_request():
+    """Test vectorised batch request.
+
+    It checks that the vectorised batch header is sent
+    """
+    with patch("socket.create_connection") as mock_create_connection:
+        mock_sock = mock_create_connection.return_value.__enter__.return_value
+        mock_sock.recv.return_value = b"RESULTS 01\n"
+        results = send_batch_request(["a", "b"], vectorized=True)
+    mock_sock.sendall.assert_called_once_with(b"VBATCH 2\na\nb\n")
+    assert results == [False, True]
+
+
+def test_send_batch_request_limit_exceeded():
+    """Test batch request over the batch limit.
+
+    It checks that the client exits when the server refuses the batch
+    """
+    with patch("socket.create_connection") as mock_create_connection:
+        mock_sock = mock_create_connection.return_value.__enter__.return_value
+        mock_sock.recv.return_value = b"BATCH LIMIT EXCEEDED\n"
+        with pytest.raises(SystemExit):
+            send_batch_request(["a", "b"])
+
+
+def test_send_prefix_request():
+    """Test prefix request.
+
+    It checks that the matches following the header are read
+    """
+    with patch("socket.create_connection") as mock_create_connection:
+        mock_sock = mock_create_connection.return_value.__enter__.return_value
+        mock_sock.recv.side_effect = [b"MATCHES 5 2\n2;3;0;\n2;3;", b"1;\n"]
+        result = send_prefix_request("2;3;")
+    mock_sock.sendall.assert_called_once_with(b"PREFIX 2;3;\n")
+    assert result == (5, ["2;3;0;", "2;3;1;"])
+
+
+def test_send_prefix_count_request():
+    """Test prefix count request.
+
+    It checks that only the number of matches is returned
+    """
+    with patch("socket.create_connection") as mock_create_connection:
+        mock_sock = mock_create_connection.return_value.__enter__.return_value
+        mock_sock.recv.return_value = b"COUNT 7\n"
+        result = send_prefix_request("2;", count_only=True)
+    mock_sock.sendall.assert_called_once_with(b"PREFIXCOUNT 2;\n")
+    assert result == (7, [])
+
+
+def test_send_substring_request():
+    """Test substring request.
+
+    It checks that the substring command is sent and the matches read
+    """
+    with patch("socket.create_connection") as mock_create_connection:
+        mock_sock = mock_create_connection.return_value.__enter__.return_value
+        mock_sock.recv.return_value = b"MATCHES 1 1\n12;3;0;\n"
+        result = send_substring_request(";3;")
+    mock_sock.sendall.assert_called_once_with(b"SUBSTR ;3;\n")
+    assert result == (1, ["12;3;0;"])
+
+
+def test_send_contains_any_request():
+    """Test contains any request.
+
+    It checks that the patterns follow the header and that the line
+    numbers are returned as integers
+    """
+    with patch("socket.create_connection") as mock_create_connection:
+        mock_sock = mock_create_connection.return_value.__enter__.return_value
+        mock_sock.recv.return_value = b"MATCHES 3 2\n4\n9\n"
+        result = send_contains_any_request(["a;", "b;"])
+    mock_sock.sendall.assert_called_once_with(b"CONTAINSANY 2\na;\nb;\n")
+    assert result == (3, [4, 9])
+
+
+def test_send_filter_request():
+    """Test filter request.
+
+    It checks that the conditions are sent and the records read
+    """
+    with patch("socket.create_connection") as mock_create_connection:
+        mock_sock = mock_create_connection.return_value.__enter__.return_value
+        mock_sock.recv.return_value = b"MATCHES 1 1\n1;2;12;4;0;6;7;8;\n"
+        result = send_filter_request("3=12 5=0..4")
+    mock_sock.sendall.assert_called_once_with(b"FILTER 3=12 5=0..4\n")
+    assert result == (1, ["1;2;12;4;0;6;7;8;"])
+
+
+class StubServer(socketserver.ThreadingTCPServer):
+    """Server that knows a few strings and counts its connections.
+
+    With answers_per_connection set, it closes every connection after
+    that many answers, like a server restarting between requests.
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, answers_per_connection=None):
+        """Listen on a free port of the loopback interface."""
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.strings = {"1;2;3;", "4;5;6;"}
+        self.answers_per_connection = answers_per_connection
+        self.connections = 0
+
+
+class StubHandler(socketserver.StreamRequestHandler):
+    """Answer queries and batches like the persistent protocol."""
+
+    def handle(self):
+        """Answer the requests of a connection."""
+        self.server.connections += 1
+        answers = 0
+        for line in self.rfile:
+            query = line.decode().rstrip("\n")
+            if query.startswith("BATCH "):
+                batch = [
+                    self.rfile.readline().decode().rstrip("\n")
+                    for _ in range(int(query.split()[1]))
+                ]
+                flags = "".join(
+                    "1" if q in self.server.strings else "0" for q in batch
+                )
+                self.wfile.write(f"RESULTS {flags}\n".encode())
+            elif query == "too long":
+                self.wfile.write(b"PAYLOAD SIZE EXCEEDED\n")
+                return
+            elif query in self.server.strings:
+                self.wfile.write(b"STRING EXISTS\n")
+            else:
+                self.wfile.write(b"STRING NOT FOUND\n")
+            answers += 1
+            if answers == self.server.answers_per_connection:
+                return
+
+
+@pytest.fixture
+def stub_server():
+    """Stub server.
+
+    It starts a StubServer in a thread and yields it
+    """
+    servers = []
+
+    def start(answers_per_connection=None):
+        server = StubServer(answers_per_connection)
+        threading.Thread(
+            target=server.serve_forever, args=(0.05,), daemon=True
+        ).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_search_client_reuses_connections(stub_server):
+    """Test search client connection reuse.
+
+    It checks that the answers are returned and that every call uses
+    the same connection
+    """
+    server = stub_server()
+    with SearchClient(server.server_address) as client:
+        assert client.exists("1;2;3;") == True
+        assert client.exists("7;8;9;") == False
+        assert client.exists_many(["4;5;6;", "x", "1;2;3;"]) == [
+            True, False, True
+        ]
+    assert server.connections == 1
+
+
+def test_search_client_batches(stub_server):
+    """Test search client batches.
+
+    It checks that exists_many splits the queries in batches
+    """
+    server = stub_server()
+    queries = ["1;2;3;", "a", "b", "4;5;6;", "c"]
+    with SearchClient(server.server_address, batch_size=2) as client:
+        assert client.exists_many(queries) == [
+            True, False, False, True, False
+        ]
+        assert client.exists_many([]) == []
+
+
+def test_search_client_retries(stub_server):
+    """Test search client retries.
+
+    It checks that a request on a connection closed by the server is
+    sent again on a new connection
+    """
+    server = stub_server(answers_per_connection=1)
+    with SearchClient(server.server_address, retry_delay=0) as client:
+        assert client.exists("1;2;3;") == True
+        assert client.exists("4;5;6;") == True
+    assert server.connections == 2
+
+
+def test_search_client_errors(stub_server):
+    """Test search client errors.
+
+    It checks that refused requests and unreachable servers raise a
+    SearchClientError instead of exiting
+    """
+    server = stub_server()
+    with SearchClient(server.server_address) as client:
+        with pytest.raises(SearchClientError):
+            client.exists("too long")
+        assert client.exists("1;2;3;") == True
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        address = sock.getsockname()
+    client = SearchClient(address, retries=1, retry_delay=0, timeout=1)
+    with pytest.raises(SearchClientError):
+        client.exists("1;2;3;")
+
+
+def test_async_search_client(stub_server):
+    """Test async search client.
+
+    It checks concurrent queries on a pool of two connections, batches
+    and retries on a closed connection
+    """
+    server = stub_server()
+    closing_server = stub_server(answers_per_connection=1)
+
+    async def run():
+        async with AsyncSearchClient(
+            server.server_address, pool_size=2
+        ) as client:
+            found = await asyncio.gather(
+                *(client.exists(q) for q in ["1;2;3;", "x", "4;5;6;"] * 3)
+            )
+            batch = await client.exists_many(["x", "4;5;6;"])
+        async with AsyncSearchClient(
+            closing_server.server_address, retry_delay=0
+        ) as client:
+            retried = [await client.exists("1;2;3;") for _ in range(2)]
+        return found, batch, retried
+
+    found, batch, retried = asyncio.run(run())
+    assert found == [True, False, True] * 3
+    assert batch == [False, True]
+    assert retried == [True, True]
+    assert server.connections <= 2
+    assert closing_server.connections == 2
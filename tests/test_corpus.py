@@ -0,0 +1,328 @@
+"""Unit test for corpus.py"""
+
+import os
+import pytest
+
+from unittest.mock import MagicMock
+
+from corpus import BloomIndex, Corpus, HashIndex, MmapCorpus
+from mmap_index import build_index
+from search_engines import get_engine
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    """Data file.
+
+    It writes a small data file and yields its path
+    """
+    file_path = tmp_path / "data.txt"
+    file_path.write_text("1;2;3;\n4;5;6;\n7;8;9;\n")
+    yield str(file_path)
+
+
+def test_corpus_contains(data_file):
+    """Test corpus contains.
+
+    It checks that lines of the data file are found and other
+    strings are not
+    """
+    corpus = Corpus(data_file)
+    assert corpus.contains("4;5;6;") == True
+    assert corpus.contains("4;5;") == False
+
+
+def test_corpus_loads_once(data_file):
+    """Test corpus loads once.
+
+    It checks that the index is built on first use and then reused
+    """
+    corpus = Corpus(data_file)
+    index = corpus.get_index()
+    assert corpus.get_index() is index
+    assert len(index) == 3
+
+
+def test_corpus_file_not_found(tmp_path):
+    """Test corpus file not found.
+
+    It checks that loading a missing data file raises an error
+    """
+    corpus = Corpus(str(tmp_path / "missing.txt"))
+    with pytest.raises(FileNotFoundError):
+        corpus.load()
+
+
+def test_refresh_unchanged_file(data_file):
+    """Test refresh with an unchanged file.
+
+    It checks that the index is not rebuilt when the file is the same
+    """
+    corpus = Corpus(data_file)
+    index = corpus.get_index()
+    assert corpus.refresh() == False
+    assert corpus.index is index
+
+
+def test_refresh_appended_lines(data_file):
+    """Test refresh with appended lines.
+
+    It checks that only the new lines are read and added on top of the
+    existing index, while the old index is left untouched
+    """
+    corpus = Corpus(data_file)
+    old_index = corpus.get_index()
+    with open(data_file, "a") as f:
+        f.write("10;11;12;\n")
+
+    assert corpus.refresh() == True
+    assert corpus.contains("10;11;12;") == True
+    assert corpus.contains("1;2;3;") == True
+    assert corpus.index.layers[0] is old_index.layers[0]
+    assert "10;11;12;" not in old_index
+
+
+def test_refresh_rewritten_file(data_file):
+    """Test refresh with a rewritten file.
+
+    It checks that the index is rebuilt when existing lines changed
+    """
+    corpus = Corpus(data_file)
+    corpus.get_index()
+    with open(data_file, "w") as f:
+        f.write("1;2;3;\n4;5;0;\n7;8;9;\n10;\n")
+    os.utime(data_file, ns=(0, 0))
+
+    assert corpus.refresh() == True
+    assert corpus.contains("4;5;6;") == False
+    assert corpus.contains("4;5;0;") == True
+    assert len(corpus.index.layers) == 1
+
+
+def test_hash_index_merges_layers():
+    """Test hash index merges layers.
+
+    It checks that appended layers are merged once there are too many
+    """
+    index = HashIndex()
+    for i in range(20):
+        index = index.extend([str(i)])
+    assert len(index.layers) <= 8
+    assert len(index) == 20
+    assert "19" in index
+
+
+def test_mmap_corpus_refresh(data_file, tmp_path):
+    """Test mmap corpus refresh.
+
+    It checks that the corpus searches the index file and opens it
+    again when it is rebuilt
+    """
+    index_file = str(tmp_path / "data.idx")
+    build_index(data_file, index_file)
+    corpus = MmapCorpus(index_file)
+    assert corpus.contains("4;5;6;") == True
+    assert corpus.refresh() == False
+
+    with open(data_file, "a") as f:
+        f.write("10;11;12;\n")
+    build_index(data_file, index_file)
+    os.utime(index_file, ns=(0, 0))
+
+    assert corpus.refresh() == True
+    assert corpus.contains("10;11;12;") == True
+
+
+def test_corpus_bloom_filter(data_file):
+    """Test corpus with a Bloom filter.
+
+    It checks that misses are answered by the filter without searching
+    the index, and that appended lines are added to the filter
+    """
+    corpus = Corpus(data_file, bloom_fp_rate=0.0001)
+    index = corpus.get_index()
+    assert isinstance(index, BloomIndex)
+    assert corpus.contains("4;5;6;") == True
+
+    index.index = MagicMock()
+    assert corpus.contains("0;0;0;") == False
+    index.index.__contains__.assert_not_called()
+
+    corpus = Corpus(data_file, bloom_fp_rate=0.0001)
+    corpus.get_index()
+    with open(data_file, "a") as f:
+        f.write("10;11;12;\n")
+    corpus.refresh()
+    assert isinstance(corpus.index, BloomIndex)
+    assert corpus.contains("10;11;12;") == True
+
+
+def test_corpus_substring_index(data_file):
+    """Test corpus substring index.
+
+    It checks that the trigram index is built with every new index
+    when it is wanted, also after lines are appended
+    """
+    corpus = Corpus(data_file, substring_index=True)
+    index = corpus.load()
+    assert index._substring is not None
+    assert index.substring_view().search(";5;") == (1, ["4;5;6;"])
+
+    with open(data_file, "a") as f:
+        f.write("3;5;7;\n")
+    corpus.refresh()
+    assert corpus.index._substring is not None
+    assert corpus.index.substring_view().search(";5;") == (
+        2,
+        ["3;5;7;", "4;5;6;"],
+    )
+
+
+def test_corpus_scan(data_file, tmp_path):
+    """Test corpus scan.
+
+    It checks that the data file is scanned in its order, also for an
+    index file built from it, and an index file alone in sorted order
+    """
+    assert list(Corpus(data_file).scan()) == [b"1;2;3;", b"4;5;6;", b"7;8;9;"]
+    with open(data_file, "w") as f:
+        f.write("7;8;9;\n1;2;3;\n")
+    index_file = str(tmp_path / "data.idx")
+    build_index(data_file, index_file)
+    assert list(MmapCorpus(index_file).scan()) == [b"1;2;3;", b"7;8;9;"]
+    assert list(MmapCorpus(index_file, data_file=data_file).scan()) == [
+        b"7;8;9;", b"1;2;3;"
+    ]
+
+
+def test_corpus_field_index(data_file):
+    """Test corpus field index.
+
+    It checks that the field index is kept until a new index is
+    swapped in
+    """
+    with open(data_file, "w") as f:
+        f.write("1;2;3;4;5;6;7;8;\n")
+    corpus = Corpus(data_file)
+    field_index = corpus.get_field_index()
+    assert corpus.get_field_index() is field_index
+    assert len(field_index) == 1
+
+    with open(data_file, "a") as f:
+        f.write("8;7;6;5;4;3;2;1;\n")
+    corpus.refresh()
+    assert len(corpus.get_field_index()) == 2
+
+
+def test_corpus_vector_view(data_file):
+    """Test corpus vector view.
+
+    It checks that the encoded sorted list of a list engine is kept
+    until a new index is swapped in
+    """
+    corpus = Corpus(data_file, engine=get_engine("binary"))
+    index = corpus.get_index()
+    vector = corpus.vector_view(index)
+    assert corpus.vector_view(index) is vector
+    assert len(vector) == 3
+
+    with open(data_file, "a") as f:
+        f.write("0;1;2;\n")
+    corpus.refresh()
+    assert len(corpus.vector_view(corpus.get_index())) == 4
+
+
+def test_corpus_snapshot(data_file, tmp_path):
+    """Test corpus snapshot.
+
+    It checks that a snapshot of an unchanged data file is loaded
+    without reading the data file
+    """
+    snapshot_path = str(tmp_path / "data.snap")
+    corpus = Corpus(data_file)
+    corpus.load()
+    assert corpus.save_snapshot(snapshot_path) == True
+
+    corpus = Corpus(data_file)
+    corpus._ingest = MagicMock()
+    index = corpus.load_snapshot(snapshot_path)
+    assert index is corpus.index
+    assert corpus.refresh() == False
+    corpus._ingest.assert_not_called()
+    assert corpus.contains("4;5;6;") == True
+    assert corpus.contains("4;5;") == False
+
+
+def test_corpus_snapshot_appended_lines(data_file, tmp_path):
+    """Test corpus snapshot with appended lines.
+
+    It checks that the lines appended after the snapshot was written
+    are added to the loaded snapshot
+    """
+    snapshot_path = str(tmp_path / "data.snap")
+    corpus = Corpus(data_file)
+    corpus.load()
+    corpus.save_snapshot(snapshot_path)
+    with open(data_file, "a") as f:
+        f.write("10;11;12;\n")
+
+    corpus = Corpus(data_file)
+    snapshot = corpus.load_snapshot(snapshot_path)
+    assert corpus.refresh() == True
+    assert corpus.index.layers[0] is snapshot.layers[0]
+    assert corpus.contains("10;11;12;") == True
+    assert corpus.contains("1;2;3;") == True
+
+
+def test_corpus_snapshot_bloom_appended_lines(data_file, tmp_path):
+    """Test corpus snapshot with a Bloom filter and appended lines.
+
+    It checks that the lines appended to a hash index behind a Bloom
+    filter are added to the engine data, so a snapshot can still be
+    written and loaded
+    """
+    snapshot_path = str(tmp_path / "data.snap")
+    corpus = Corpus(data_file, bloom_fp_rate=0.01, engine=get_engine("hash"))
+    corpus.load()
+    with open(data_file, "a") as f:
+        f.write("10;11;12;\n")
+    assert corpus.refresh() == True
+    assert isinstance(corpus.index, BloomIndex)
+    assert isinstance(corpus.index.index, HashIndex)
+    assert corpus.contains("10;11;12;") == True
+    assert corpus.save_snapshot(snapshot_path) == True
+
+    corpus = Corpus(data_file, bloom_fp_rate=0.01, engine=get_engine("hash"))
+    assert corpus.load_snapshot(snapshot_path) is not None
+    assert corpus.refresh() == False
+    assert corpus.contains("10;11;12;") == True
+    assert corpus.contains("1;2;3;") == True
+
+
+def test_corpus_snapshot_invalid(data_file, tmp_path):
+    """Test corpus snapshot that can't be used.
+
+    It checks that snapshots of another engine, of a rewritten data
+    file or that are not snapshot files are not used
+    """
+    snapshot_path = str(tmp_path / "data.snap")
+    corpus = Corpus(data_file)
+    corpus.load()
+    corpus.save_snapshot(snapshot_path)
+    engine = MagicMock()
+    engine.name = "jump"
+    assert Corpus(data_file, engine=engine).load_snapshot(
+        snapshot_path
+    ) is None
+
+    with open(data_file, "w") as f:
+        f.write("1;2;3;\n4;5;0;\n7;8;9;\n10;\n")
+    os.utime(data_file, ns=(0, 0))
+    corpus = Corpus(data_file)
+    corpus.load_snapshot(snapshot_path)
+    assert corpus.refresh() == True
+    assert corpus.contains("4;5;6;") == False
+    assert corpus.contains("4;5;0;") == True
+
+    assert Corpus(data_file).load_snapshot(data_file) is None
+    assert Corpus(data_file).load_snapshot(str(tmp_path / "none")) is None
@@ -0,0 +1,79 @@
+"""Unit test for datasets.py"""
+
+import configparser
+
+import pytest
+
+from corpus import Corpus, MmapCorpus
+from datasets import open_corpus, read_datasets
+
+
+def make_config(sections):
+    """Create a ConfigParser with the given sections."""
+    config_data = configparser.ConfigParser()
+    config_data.read_dict(sections)
+    return config_data
+
+
+def test_open_corpus(tmp_path):
+    """Test open corpus.
+
+    It checks that the engine is picked by name, that the bloom engine
+    gets the configured false-positive rate, and that an index path
+    gives a memory-mapped corpus, which the mmap engine requires
+    """
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("1;2;3;\n")
+    data_corpus = open_corpus(str(data_file), "bloom", bloom_fp_rate=0.2)
+    assert isinstance(data_corpus, Corpus)
+    assert data_corpus.engine.name == "bloom"
+    assert data_corpus.engine.fp_rate == 0.2
+    assert open_corpus(str(data_file), "bloom").engine.fp_rate == 0.01
+    index_file = tmp_path / "data.idx"
+    index_file.write_bytes(b"")
+    index_corpus = open_corpus("", "mmap", str(index_file))
+    assert isinstance(index_corpus, MmapCorpus)
+    with pytest.raises(ValueError, match="INDEX_PATH"):
+        open_corpus(str(data_file), "mmap")
+    with pytest.raises(ValueError):
+        open_corpus(str(data_file), "unknown")
+
+
+def test_read_datasets(tmp_path):
+    """Test read datasets.
+
+    It checks that every dataset section gives a dataset with its own
+    engine, reload policy and result cache, and that the other
+    sections are ignored
+    """
+    logs = tmp_path / "logs.txt"
+    logs.write_text("1;2;3;\n")
+    config_data = make_config({
+        "text_file": {"INDEX_PATH": ""},
+        "dataset:logs": {"PATH": str(logs), "ENGINE": "binary"},
+        "dataset:live": {"PATH": str(logs), "REREAD_ON_QUERY": "True"},
+    })
+    datasets = read_datasets(config_data, cache_size=10)
+    assert sorted(datasets) == ["live", "logs"]
+    assert datasets["logs"].corpus.engine.name == "binary"
+    assert not datasets["logs"].reread_on_query
+    assert datasets["live"].reread_on_query
+    assert datasets["logs"].result_cache.maxsize == 10
+    assert datasets["logs"].result_cache is not datasets["live"].result_cache
+    assert datasets["logs"].corpus.lookup(
+        datasets["logs"].corpus.get_index(), "1;2;3;"
+    )
+
+
+def test_read_datasets_invalid():
+    """Test read datasets with invalid sections.
+
+    It checks that invalid names and unknown engines are rejected with
+    the name of the section
+    """
+    for name in ("default", "two words", ""):
+        with pytest.raises(ValueError):
+            read_datasets(make_config({f"dataset:{name}": {}}))
+    config_data = make_config({"dataset:logs": {"ENGINE": "unknown"}})
+    with pytest.raises(ValueError, match=r"\[dataset:logs\]"):
+        read_datasets(config_data)
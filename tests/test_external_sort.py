@@ -0,0 +1,73 @@
+"""Unit test for external_sort.py"""
+
+import os
+
+from external_sort import external_sort, merge_runs, sorted_runs
+from mmap_index import MmapIndex, build_index
+
+
+def test_sorted_runs(tmp_path):
+    """Test sorted runs.
+
+    It checks that the lines are split into sorted run files of about
+    the run size
+    """
+    lines = [b"5;", b"3;", b"9;", b"1;", b"3;", b"7;"]
+    runs = sorted_runs(iter(lines), str(tmp_path), run_size=4)
+    contents = [open(run, "rb").read() for run in runs]
+    assert contents == [b"3;\n5;\n", b"1;\n9;\n", b"3;\n7;\n"]
+
+
+def test_merge_runs(tmp_path):
+    """Test merge runs.
+
+    It checks that the runs are merged in order without duplicates
+    """
+    runs = sorted_runs(
+        iter([b"5;", b"3;", b"9;", b"1;", b"3;", b"7;"]),
+        str(tmp_path),
+        run_size=4,
+    )
+    messages = []
+    merged = list(merge_runs(runs, progress=messages.append))
+    assert merged == [b"1;", b"3;", b"5;", b"7;", b"9;"]
+    assert messages == ["Merging 3 runs", "Merged 5 lines"]
+
+
+def test_external_sort_removes_runs(tmp_path):
+    """Test external sort removes runs.
+
+    It checks that the lines are sorted, including the first run
+    collected in memory, and that no run files are left behind
+    """
+    sorted_lines = external_sort(
+        iter([b"b", b"d", b"a"]),
+        run_size=1,
+        temp_dir=str(tmp_path),
+        first_run={b"c", b"a"},
+    )
+    assert list(sorted_lines) == [b"a", b"b", b"c", b"d"]
+    assert os.listdir(tmp_path) == []
+
+
+def test_merge_runs_control_bytes(tmp_path):
+    """Test merge runs with lines that contain bytes below newline.
+
+    It checks that a line sorts before the same line followed by a tab,
+    and that the index file built from such runs finds every line
+    """
+    lines = [b"a\tb", b"a", b"a\x01", b"b", b"a\tb", b"ab"]
+    runs = sorted_runs(iter(lines), str(tmp_path), run_size=2)
+    merged = list(merge_runs(runs))
+    assert merged == sorted(set(lines))
+
+    data_file = tmp_path / "data.txt"
+    index_file = tmp_path / "data.idx"
+    data_file.write_bytes(b"".join(line + b"\n" for line in lines))
+    build_index(str(data_file), str(index_file), memory_budget=1,
+                run_size=2, temp_dir=str(tmp_path))
+    index = MmapIndex(str(index_file))
+    assert list(index) == sorted(set(lines))
+    for line in lines:
+        assert line in index
+    assert b"a\t" not in index
@@ -0,0 +1,77 @@
+"""Unit test for field_index.py"""
+
+import pytest
+
+from field_index import FieldIndex, parse_filter, parse_record
+
+
+@pytest.fixture
+def field_index():
+    """Field index.
+
+    It yields a field index built from a few records and a line that
+    is not a record
+    """
+    lines = [
+        b"1;2;12;4;0;6;7;8;",
+        b"1;2;12;4;9;6;7;8;",
+        b"not a record",
+        b"5;5;12;5;4;5;5;5;",
+        b"5;5;11;5;4;5;5;5;",
+    ]
+    yield FieldIndex(lines)
+
+
+def test_parse_record():
+    """Test parse record.
+
+    It checks that only lines with eight small integers are records
+    """
+    assert parse_record("1;28;30;16;9;24;29;24;") == [
+        1, 28, 30, 16, 9, 24, 29, 24
+    ]
+    assert parse_record(b"1;2;3;") is None
+    assert parse_record(b"1;2;3;4;5;6;7;256;") is None
+    assert parse_record(b"1;2;3;4;5;6;7;x;") is None
+
+
+def test_parse_filter():
+    """Test parse filter.
+
+    It checks that conditions use 1-based fields and that invalid
+    filters raise a ValueError
+    """
+    assert parse_filter("3=12 5=0..4") == [(2, 12, 12), (4, 0, 4)]
+    for text in ("", "3==12", "0=1", "9=1", "3=a"):
+        with pytest.raises(ValueError):
+            parse_filter(text)
+
+
+def test_field_index_filter(field_index):
+    """Test field index filter.
+
+    It checks that the records matching every condition are returned
+    in the order of the data file
+    """
+    assert len(field_index) == 4
+    assert field_index.skipped == 1
+    assert field_index.filter(parse_filter("3=12 5=0..4")) == (
+        2,
+        ["1;2;12;4;0;6;7;8;", "5;5;12;5;4;5;5;5;"],
+    )
+    assert field_index.filter(parse_filter("3=12 5=0..4"), limit=1) == (
+        2,
+        ["1;2;12;4;0;6;7;8;"],
+    )
+    assert field_index.filter(parse_filter("1=5")) == (
+        2,
+        ["5;5;12;5;4;5;5;5;", "5;5;11;5;4;5;5;5;"],
+    )
+    assert field_index.filter(parse_filter("3=12 5=5..8")) == (0, [])
+
+
+def test_field_index_empty():
+    """Test an empty field index."""
+    field_index = FieldIndex([])
+    assert field_index.filter(parse_filter("1=0")) == (0, [])
+    assert field_index.memory_size() > 0
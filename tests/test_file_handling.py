@@ -2,7 +2,17 @@
 
 import pytest
 
-from file_handling import text_file_path, search_for_string, strings_list
+from file_handling import (
+    iter_lines,
+    text_file_path,
+    search_for_prefix,
+    search_for_string,
+    search_for_strings,
+    search_for_substring,
+    strings_list,
+    strings_set,
+)
+from search_algorithms import jump_search, linear_search
 
 
 @pytest.fixture(scope="module")
@@ -12,6 +22,23 @@ def get_file_path():
     yield file_path
 
 
+@pytest.fixture
+def data_file(tmp_path):
+    """Data file.
+
+    It writes a small data file and yields its path
+    """
+    file_path = tmp_path / "data.txt"
+    file_path.write_text(
+        "26;29;2;3;25;26;11;6;\n"
+        "2;3;12;29;13;3;19;22;\n"
+        "11;4;5;6;\n"
+        "2;8;3;0;\n"
+        "5;3;1;11;\n"
+    )
+    yield str(file_path)
+
+
 @pytest.fixture(scope="module")
 def get_file_path_not_found():
     config_file = "text_configs.ini"
@@ -63,6 +90,127 @@ def test_search_for_string_without_cached_data(get_file_path):
     query = "26;29;2;3;25;26;11;6;"
     assert search_for_string(get_file_path, query) == True
     assert search_for_string(get_file_path, "foo") == False
+    assert search_for_string(
+        get_file_path, query, algorithm=jump_search
+    ) == True
+    assert search_for_string(
+        get_file_path, "foo", algorithm=linear_search
+    ) == False
+
+
+def test_search_for_string_with_cached_set(data_file):
+    """Test search for string with a cached set.
+
+    It searches for a string in the set built from the file
+
+    :param data_file: the path to the data file
+    """
+    cached_data = strings_set(data_file)
+    query = "26;29;2;3;25;26;11;6;"
+    assert search_for_string(
+        data_file, query, cached_data=cached_data
+    ) == True
+    assert search_for_string(
+        data_file, "foo", cached_data=cached_data
+    ) == False
+
+
+def test_strings_set_file_not_found():
+    """Test strings set file not found.
+
+    It tests that the function `strings_set` returns a message when
+    the file is not found
+    """
+    file_name = "unknown_text_file.txt"
+    assert strings_set(file_name) == f"{file_name} not found"
+
+
+def test_iter_lines(tmp_path):
+    """Test iter lines.
+
+    It reads a file in chunks smaller than its lines and checks that
+    the lines are put back together, including a last line without a
+    newline
+
+    :param tmp_path: a temporary directory
+    """
+    file_path = tmp_path / "data.txt"
+    file_path.write_bytes(b"1;28;30;\r\n18;29;\n\n9;2;13;")
+    lines = list(iter_lines(str(file_path), chunk_size=4))
+    assert lines == [b"1;28;30;", b"18;29;", b"", b"9;2;13;"]
+
+
+def test_iter_lines_range(tmp_path):
+    """Test iter lines with a byte range.
+
+    It checks that only the lines between the start and end offsets
+    are read
+
+    :param tmp_path: a temporary directory
+    """
+    file_path = tmp_path / "data.txt"
+    file_path.write_bytes(b"1;2;\n3;4;\n5;6;\n")
+    lines = list(iter_lines(str(file_path), start=5, end=10, chunk_size=3))
+    assert lines == [b"3;4;"]
+
+
+def test_search_for_prefix_with_cached_set(data_file):
+    """Test search for prefix with a cached set.
+
+    It searches for the strings that start with a prefix in the set
+    built from the file
+
+    :param data_file: the path to the data file
+    """
+    cached_data = strings_set(data_file)
+    expected = ["2;3;12;29;13;3;19;22;", "2;8;3;0;"]
+    assert search_for_prefix(
+        data_file, "2;", cached_data=cached_data
+    ) == (len(expected), expected)
+    assert search_for_prefix(
+        data_file, "2;", cached_data=cached_data, limit=1
+    ) == (len(expected), expected[:1])
+
+
+def test_search_for_substring(data_file):
+    """Test search for substring.
+
+    It searches for the strings that contain a fragment in the file and
+    in the set built from it, which gives the same sorted matches
+
+    :param data_file: the path to the data file
+    """
+    cached_data = strings_set(data_file)
+    expected = [
+        "26;29;2;3;25;26;11;6;",
+        "2;3;12;29;13;3;19;22;",
+        "2;8;3;0;",
+        "5;3;1;11;",
+    ]
+    assert search_for_substring(data_file, ";3;") == (
+        len(expected),
+        expected,
+    )
+    assert search_for_substring(
+        data_file, ";3;", cached_data=cached_data, limit=2
+    ) == (len(expected), expected[:2])
+
+
+def test_search_for_strings(data_file):
+    """Test search for strings.
+
+    It searches for many strings at once in the file and in the set
+    built from it
+
+    :param data_file: the path to the data file
+    """
+    cached_data = strings_set(data_file)
+    queries = ["2;3;12;29;13;3;19;22;", "foo", "11;4;5;6;"]
+    expected = [True, False, True]
+    assert search_for_strings(data_file, queries) == expected
+    assert search_for_strings(
+        data_file, queries, cached_data=cached_data
+    ) == expected
 
 
 # def test_search_for_string_with_cached_data(get_catched_data, get_file_path):
@@ -0,0 +1,66 @@
+"""Unit test for load_generator.py"""
+
+import asyncio
+
+from load_generator import histogram, make_workload, run_stage
+
+
+def test_make_workload(tmp_path):
+    """Test make workload.
+
+    It checks that hits are lines of the data file and misses are not
+    """
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("1;2;3;\n4;5;6;\n\n7;8;9;\n")
+    workload = make_workload(str(data_file), hit_ratio=0.5, size=100, seed=1)
+    lines = {"1;2;3;", "4;5;6;", "7;8;9;"}
+    assert len(workload) == 100
+    assert all((query in lines) == expected for query, expected in workload)
+    assert 20 < sum(expected for _, expected in workload) < 80
+
+
+def test_histogram():
+    """Test histogram.
+
+    It checks that latencies are counted in doubling buckets up to the
+    last one that is not empty
+    """
+    assert histogram([10000, 20000, 20000, 100000]) == [
+        (16, 1), (32, 2), (64, 0), (128, 1)
+    ]
+    assert histogram([]) == []
+    assert histogram([10 ** 12])[-1] == (float("inf"), 1)
+
+
+def test_run_stage():
+    """Test run stage.
+
+    It runs a closed-loop stage and an open-loop stage against a server
+    that knows a single string, and checks that every query is answered
+    correctly and the open loop follows the target rate
+    """
+    async def handle(reader, writer):
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            found = line.strip() == b"1;2;3;"
+            writer.write(b"STRING EXISTS\n" if found
+                         else b"STRING NOT FOUND\n")
+            await writer.drain()
+        writer.close()
+
+    async def run():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        address = server.sockets[0].getsockname()[:2]
+        workload = [("1;2;3;", True), ("x;", False)]
+        async with server:
+            closed = await run_stage(address, workload, 4, 0, 0.2)
+            opened = await run_stage(address, workload, 2, 100, 0.5)
+        return closed.report(), opened.report()
+
+    closed, opened = asyncio.run(run())
+    assert closed["completed"] > 0
+    assert closed["errors"] == 0 and closed["wrong"] == 0
+    assert opened["errors"] == 0 and opened["wrong"] == 0
+    assert 40 <= opened["completed"] <= 51
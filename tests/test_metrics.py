@@ -0,0 +1,78 @@
+"""Unit test for metrics.py"""
+
+import urllib.request
+
+import pytest
+
+from metrics import Histogram, Metrics, metrics, start_http_server
+
+
+def test_histogram():
+    """Test histogram.
+
+    It checks that durations are counted in the first bucket whose
+    upper bound is not below them
+    """
+    histogram = Histogram((0.001, 0.01, 0.1))
+    for value in (0.0005, 0.001, 0.005, 0.05, 2.0):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 1, 1]
+    assert histogram.count == 5
+    assert histogram.sum == pytest.approx(2.0565)
+
+
+def test_metrics_render():
+    """Test metrics render.
+
+    It checks the counters with and without labels, the gauges and the
+    cumulative buckets of the histograms in the Prometheus text format
+    """
+    registry = Metrics()
+    registry.increment("requests_total", 'command="QUERY"')
+    registry.increment("requests_total", 'command="QUERY"')
+    registry.increment("connections_total", amount=3)
+    registry.observe("search", 0.00002)
+    registry.observe("search", 20)
+    lines = registry.render().splitlines()
+    assert lines[:4] == [
+        "# TYPE search_server_connections_total counter",
+        "search_server_connections_total 3",
+        "# TYPE search_server_requests_total counter",
+        'search_server_requests_total{command="QUERY"} 2',
+    ]
+    assert "# TYPE search_server_search_seconds histogram" in lines
+    assert 'search_server_search_seconds_bucket{le="1e-05"} 0' in lines
+    assert 'search_server_search_seconds_bucket{le="2.5e-05"} 1' in lines
+    assert 'search_server_search_seconds_bucket{le="10.0"} 1' in lines
+    assert 'search_server_search_seconds_bucket{le="+Inf"} 2' in lines
+    assert "search_server_search_seconds_count 2" in lines
+    registry.set("dataset_strings", 'dataset="logs"', 5)
+    registry.set("dataset_strings", 'dataset="logs"', 7)
+    lines = registry.render().splitlines()
+    assert "# TYPE search_server_dataset_strings gauge" in lines
+    assert 'search_server_dataset_strings{dataset="logs"} 7' in lines
+    registry.reset()
+    assert registry.render() == ""
+
+
+def test_start_http_server():
+    """Test start http server.
+
+    It checks that the metrics are served on /metrics and that other
+    paths are not found
+    """
+    metrics.reset()
+    metrics.increment("connections_total")
+    http_server = start_http_server("127.0.0.1", 0)
+    port = http_server.server_address[1]
+    try:
+        url = f"http://127.0.0.1:{port}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            body = response.read().decode("utf-8")
+        assert "search_server_connections_total 1\n" in body
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=5)
+    finally:
+        http_server.shutdown()
+        http_server.server_close()
+        metrics.reset()
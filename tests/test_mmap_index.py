@@ -0,0 +1,119 @@
+"""Unit test for mmap_index.py"""
+
+import pytest
+
+from mmap_index import MmapIndex, build_index
+from search_algorithms import prefix_search
+
+
+@pytest.fixture
+def index_file(tmp_path):
+    """Index file.
+
+    It writes a small data file with a duplicate line, builds an index
+    file from it and yields the path of the index file
+    """
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("7;8;9;\n1;2;3;\n4;5;6;\n1;2;3;\n")
+    index_file = tmp_path / "data.idx"
+    build_index(str(data_file), str(index_file))
+    yield str(index_file)
+
+
+def test_build_index(index_file):
+    """Test build index.
+
+    It checks that the index holds the unique lines in sorted order
+    """
+    index = MmapIndex(index_file)
+    assert len(index) == 3
+    assert [index[i] for i in range(len(index))] == [
+        b"1;2;3;",
+        b"4;5;6;",
+        b"7;8;9;",
+    ]
+    with pytest.raises(IndexError):
+        index[3]
+
+
+def test_mmap_index_contains(index_file):
+    """Test mmap index contains.
+
+    It checks that lines are found as strings or bytes, and that other
+    strings, including prefixes of lines, are not
+    """
+    index = MmapIndex(index_file)
+    assert "4;5;6;" in index
+    assert b"7;8;9;" in index
+    assert "4;5;" not in index
+    assert "0" not in index
+    assert "9" not in index
+
+
+def test_mmap_index_empty(tmp_path):
+    """Test mmap index with an empty data file.
+
+    It checks that an empty index can be opened and searched
+    """
+    data_file = tmp_path / "empty.txt"
+    data_file.write_text("")
+    index_file = tmp_path / "empty.idx"
+    assert build_index(str(data_file), str(index_file)) == 0
+    assert "foo" not in MmapIndex(str(index_file))
+
+
+def test_mmap_index_not_an_index(tmp_path):
+    """Test mmap index with a file that is not an index.
+
+    It checks that opening a plain text file raises an error
+    """
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("1;2;3;\n4;5;6;\n7;8;9;\n")
+    with pytest.raises(ValueError):
+        MmapIndex(str(data_file))
+
+
+def test_build_index_memory_budget(tmp_path):
+    """Test build index with a small memory budget.
+
+    It checks that a data file that doesn't fit in the memory budget
+    is sorted on disk and gives the same index
+    """
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("".join(f"{i % 700};{i};\n" for i in range(1000)) * 2)
+    messages = []
+    count = build_index(
+        str(data_file),
+        str(tmp_path / "data.idx"),
+        memory_budget=4096,
+        run_size=1024,
+        progress=messages.append,
+    )
+
+    index = MmapIndex(str(tmp_path / "data.idx"))
+    expected = sorted({f"{i % 700};{i};".encode() for i in range(1000)})
+    assert count == len(index) == 1000
+    assert [index[i] for i in range(len(index))] == expected
+    assert messages[0] == "Memory budget exceeded, sorting on disk"
+    assert messages[-1] == "Merged 1000 lines"
+
+
+def test_mmap_index_prefix(index_file):
+    """Test mmap index prefix search.
+
+    It checks that the lines starting with a prefix are found with
+    string prefixes
+    """
+    index = MmapIndex(index_file)
+    assert prefix_search(index.sorted_view(), "4;") == (1, [b"4;5;6;"])
+    assert prefix_search(index.sorted_view(), "0;") == (0, [])
+
+
+def test_mmap_index_substring(index_file):
+    """Test mmap index substring search.
+
+    It checks that the trigram index finds lines kept in the index file
+    """
+    index = MmapIndex(index_file)
+    assert index.substring_view() is index.substring_view()
+    assert index.substring_view().search(";5;") == (1, [b"4;5;6;"])
@@ -0,0 +1,63 @@
+"""Unit test for ngram_index.py"""
+
+import pytest
+
+from ngram_index import TrigramIndex, grams
+
+
+@pytest.fixture
+def lines():
+    """Lines.
+
+    It yields a sorted list of lines for the index
+    """
+    yield sorted(["1;2;3;", "12;3;4;", "2;3;45;", "7;8;9;", "abcabc"])
+
+
+def test_grams():
+    """Test grams.
+
+    It checks that every trigram of a line is returned once
+    """
+    assert grams("abcabc") == {"abc", "bca", "cab"}
+    assert grams(b"abcd") == {b"abc", b"bcd"}
+    assert grams("ab") == set()
+
+
+def test_trigram_index_search(lines):
+    """Test trigram index search.
+
+    It checks that the lines containing a fragment are found in sorted
+    order, including fragments shorter than a trigram
+    """
+    index = TrigramIndex(lines)
+    assert index.search(";3;4") == (2, ["12;3;4;", "2;3;45;"])
+    assert index.search(";3;4", limit=1) == (2, ["12;3;4;"])
+    assert index.search("2;3;") == (3, ["12;3;4;", "1;2;3;", "2;3;45;"])
+    assert index.search("8;") == (1, ["7;8;9;"])
+    assert index.search("cabc") == (1, ["abcabc"])
+    assert index.search("3;2") == (0, [])
+    assert index.search("xyz") == (0, [])
+
+
+def test_trigram_index_candidates(lines):
+    """Test trigram index candidates.
+
+    It checks that only the lines with every trigram are candidates,
+    even when the trigrams are not next to each other in them
+    """
+    index = TrigramIndex(["abc;xbc", "abcbc", "bcd"])
+    assert index.candidates("abcbc") == [1]
+    assert index.candidates("abc") == [0, 1]
+
+
+def test_trigram_index_bytes():
+    """Test trigram index over bytes.
+
+    It checks that string fragments are searched in lines kept as bytes
+    """
+    index = TrigramIndex([b"1;2;3;", b"4;5;6;"])
+    assert index.search("5;6") == (1, [b"4;5;6;"])
+    assert len(index) == 8
+    assert index.memory_size() > 0
+    assert index.build_time >= 0
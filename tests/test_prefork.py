@@ -0,0 +1,117 @@
+"""Unit test for prefork.py"""
+
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(os, "fork"), reason="the pre-fork server needs os.fork"
+)
+
+SUPERVISOR = """
+import logging, os, signal, sys
+from prefork import run_workers
+
+logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+
+def serve():
+    open(os.path.join(sys.argv[1], str(os.getpid())), "w").close()
+    signal.pause()
+
+run_workers(serve, 2, on_restart=lambda: print("reloaded"))
+"""
+
+STUCK_WORKER = """
+import logging, os, signal, sys, time
+from prefork import start_worker, stop_worker
+
+logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+
+def serve():
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    open(os.path.join(sys.argv[1], str(os.getpid())), "w").close()
+    signal.pause()
+
+pid = start_worker(serve)
+while not os.listdir(sys.argv[1]):
+    time.sleep(0.05)
+stop_worker(pid, timeout=0.5)
+"""
+
+
+def wait_for_workers(path, count, timeout=10):
+    """Wait for workers.
+
+    It waits until count workers wrote their process id to the
+    directory and returns the process ids
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        pids = {int(name) for name in os.listdir(path)}
+        if len(pids) >= count:
+            return pids
+        time.sleep(0.05)
+    raise TimeoutError(f"{count} workers did not start")
+
+
+def is_running(pid):
+    """Check whether a process is still running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def test_run_workers(tmp_path):
+    """Test run workers.
+
+    It starts a supervisor with two workers, restarts them with SIGHUP
+    and stops everything with SIGTERM
+    """
+    supervisor = subprocess.Popen(
+        [sys.executable, "-c", SUPERVISOR, str(tmp_path)],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        first_workers = wait_for_workers(tmp_path, 2)
+
+        supervisor.send_signal(signal.SIGHUP)
+        all_workers = wait_for_workers(tmp_path, 4)
+        new_workers = all_workers - first_workers
+        time.sleep(0.2)
+        assert not any(is_running(pid) for pid in first_workers)
+
+        supervisor.send_signal(signal.SIGTERM)
+        output, _ = supervisor.communicate(timeout=10)
+    finally:
+        if supervisor.poll() is None:
+            supervisor.kill()
+
+    assert supervisor.returncode == 0
+    assert "reloaded" in output
+    assert "Restarting workers" in output
+    assert not any(is_running(pid) for pid in new_workers)
+
+
+def test_stop_worker_timeout(tmp_path):
+    """Test stop worker with a worker that ignores SIGTERM.
+
+    It checks that the worker is killed once the timeout is over
+    """
+    output = subprocess.run(
+        [sys.executable, "-c", STUCK_WORKER, str(tmp_path)],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True,
+        text=True,
+        timeout=10,
+    ).stdout
+    (pid,) = wait_for_workers(tmp_path, 1)
+    assert "didn't stop in time" in output
+    assert not is_running(pid)
@@ -0,0 +1,272 @@
+"""Unit test for protocol.py"""
+
+import asyncio
+import socket
+import threading
+
+import pytest
+
+from protocol import (
+    FRAME_BUFFER_SIZE,
+    FRAME_HEADER,
+    STATUS_FOUND,
+    STATUS_RESULT,
+    AsyncFrameReader,
+    AsyncLineReader,
+    FrameReader,
+    InvalidFrame,
+    LineReader,
+    PayloadSizeExceeded,
+    decode_batch_results,
+    encode_batch_results,
+    encode_count,
+    encode_frame,
+    encode_frame_response,
+    encode_matches,
+    encode_stats,
+    escape_query,
+    is_frame,
+    parse_batch_header,
+    parse_request,
+    split_dataset,
+)
+
+
+def test_line_reader_split_lines():
+    """Test line reader with split lines.
+
+    It checks that lines split over several reads are joined and that
+    the data after the last newline is returned at the end
+    """
+    client_sock, server_conn = socket.socketpair()
+    client_sock.sendall(b"1;2;\r\n3;")
+    client_sock.sendall(b"4;\nlast")
+    client_sock.close()
+
+    reader = LineReader(server_conn, 1024)
+    assert reader.readline() == b"1;2;"
+    assert reader.readline() == b"3;4;"
+    assert reader.readline() == b"last"
+    assert reader.readline() is None
+    server_conn.close()
+
+
+def test_line_reader_has_line():
+    """Test line reader has line.
+
+    It checks that a line is only reported once its newline arrived
+    """
+    reader = LineReader(None, 1024, b"1;2;\n3;")
+    assert reader.has_line() == True
+    assert reader.readline() == b"1;2;"
+    assert reader.has_line() == False
+
+
+def test_line_reader_payload_size_exceeded():
+    """Test line reader with a line that is too long.
+
+    It checks that an error is raised instead of buffering the line
+    """
+    client_sock, server_conn = socket.socketpair()
+    client_sock.sendall(b"a" * 32)
+
+    reader = LineReader(server_conn, 8)
+    with pytest.raises(PayloadSizeExceeded):
+        reader.readline()
+    client_sock.close()
+    server_conn.close()
+
+
+def test_async_line_reader():
+    """Test async line reader.
+
+    It checks that lines are read from an asyncio stream, starting
+    with the data that was already read
+    """
+    async def read_lines():
+        stream = asyncio.StreamReader()
+        stream.feed_data(b"2;\n3;\n")
+        stream.feed_eof()
+        reader = AsyncLineReader(stream, 1024, b"BATCH 2\n1;")
+        return [await reader.readline() for _ in range(4)]
+
+    lines = asyncio.run(read_lines())
+    assert lines == [b"BATCH 2", b"1;2;", b"3;", None]
+
+
+def test_parse_batch_header():
+    """Test parse batch header.
+
+    It checks that the number of queries is returned for batch
+    headers and None for anything else
+    """
+    assert parse_batch_header("BATCH 12") == 12
+    assert parse_batch_header("BATCH") is None
+    assert parse_batch_header("BATCH x") is None
+    assert parse_batch_header("1;2;3;") is None
+    assert parse_batch_header("CONTAINSANY 3") == 3
+
+
+def test_batch_results():
+    """Test batch results.
+
+    It checks that the results are encoded as one flag per query and
+    decoded back
+    """
+    response = encode_batch_results([True, False, True])
+    assert response == "RESULTS 101\n"
+    assert decode_batch_results(response) == [True, False, True]
+    assert decode_batch_results(encode_batch_results([])) == []
+
+
+def test_parse_request():
+    """Test parse request.
+
+    It checks that commands are split from their argument and that
+    plain queries are left as they are
+    """
+    assert parse_request("PREFIX 2;3;") == ("PREFIX", "2;3;")
+    assert parse_request("PREFIXCOUNT 2;") == ("PREFIXCOUNT", "2;")
+    assert parse_request("PREFIX") == (None, "PREFIX")
+    assert parse_request("2;3; 4;") == (None, "2;3; 4;")
+    assert parse_request("STATS") == ("STATS", "")
+
+
+def test_split_dataset():
+    """Test split dataset.
+
+    It checks that the dataset name is split from the request, that
+    requests without a prefix are left as they are and that a doubled
+    prefix escapes a query of the default dataset
+    """
+    assert split_dataset("@logs PREFIX 2;") == ("logs", "PREFIX 2;")
+    assert split_dataset("@logs 1;2;3;") == ("logs", "1;2;3;")
+    assert split_dataset("1;2;3;") == (None, "1;2;3;")
+    assert split_dataset("@@1;2;3;") == (None, "@1;2;3;")
+    assert split_dataset(escape_query("@logs 1;")) == (None, "@logs 1;")
+    assert escape_query("1;2;3;") == "1;2;3;"
+
+
+def test_encode_matches():
+    """Test encode matches and encode count."""
+    assert encode_matches(3, ["a", "b"]) == "MATCHES 3 2\na\nb\n"
+    assert encode_matches(0, []) == "MATCHES 0 0\n"
+    assert encode_count(7) == "COUNT 7\n"
+
+
+def test_encode_stats():
+    """Test encode stats."""
+    assert encode_stats("a 1\nb 2\n") == "STATS 2\na 1\nb 2\n"
+    assert encode_stats("") == "STATS 0\n"
+
+
+def test_frame_reader():
+    """Test frame reader.
+
+    It checks that frames split over several reads and many frames in
+    one read are returned with their type, dataset and payload
+    """
+    client_sock, server_conn = socket.socketpair()
+    first = encode_frame(0, b"1;2;3;", "logs")
+    second = encode_frame(3, b"4;")
+    client_sock.sendall(first[:4])
+    client_sock.sendall(first[4:] + second)
+    client_sock.close()
+    reader = FrameReader(server_conn, 64)
+    frame_type, dataset, payload = reader.read_frame()
+    assert (frame_type, dataset, bytes(payload)) == (0, "logs", b"1;2;3;")
+    assert isinstance(payload, memoryview)
+    assert reader.has_frame()
+    frame_type, dataset, payload = reader.read_frame()
+    assert (frame_type, dataset, bytes(payload)) == (3, None, b"4;")
+    assert reader.read_frame() is None
+    server_conn.close()
+
+
+def test_frame_reader_reuses_buffer():
+    """Test frame reader with more data than its buffer.
+
+    It checks that the unread data is moved to the front of the buffer
+    instead of growing it
+    """
+    client_sock, server_conn = socket.socketpair()
+    frames = [encode_frame(0, str(i).encode() * 8) for i in range(100)]
+    client_sock.sendall(b"".join(frames))
+    client_sock.close()
+    reader = FrameReader(server_conn, 16)
+    size = len(reader.buffer)
+    payloads = []
+    while (frame := reader.read_frame()) is not None:
+        payloads.append(bytes(frame[2]))
+    assert payloads == [str(i).encode() * 8 for i in range(100)]
+    assert len(reader.buffer) == size
+    server_conn.close()
+
+
+def test_frame_reader_grows_buffer():
+    """Test frame reader with a frame longer than its buffer.
+
+    It checks that the buffer starts small and only grows to the size
+    of the frame
+    """
+    client_sock, server_conn = socket.socketpair()
+    payload = b"1;2;3;" * (FRAME_BUFFER_SIZE // 4)
+    reader = FrameReader(server_conn, 1024 * 1024)
+    assert len(reader.buffer) == FRAME_BUFFER_SIZE
+    thread = threading.Thread(
+        target=client_sock.sendall,
+        args=(encode_frame(0, b"4;") + encode_frame(0, payload),),
+    )
+    thread.start()
+    assert bytes(reader.read_frame()[2]) == b"4;"
+    assert bytes(reader.read_frame()[2]) == payload
+    thread.join()
+    assert len(reader.buffer) == 2 * FRAME_BUFFER_SIZE
+    client_sock.close()
+    assert reader.read_frame() is None
+    server_conn.close()
+
+
+def test_frame_reader_errors():
+    """Test frame reader with invalid frames.
+
+    It checks that payloads longer than the limit and frames without
+    the magic byte are rejected
+    """
+    reader = FrameReader(None, 4, encode_frame(0, b"12345"))
+    with pytest.raises(PayloadSizeExceeded):
+        reader.read_frame()
+    reader = FrameReader(None, 4, b"1;2;3;\n")
+    with pytest.raises(InvalidFrame):
+        reader.read_frame()
+    header = FRAME_HEADER.pack(0xFF, 99, 0, 0)
+    with pytest.raises(InvalidFrame):
+        FrameReader(None, 4, header).read_frame()
+
+
+def test_async_frame_reader():
+    """Test async frame reader."""
+    async def read_frames():
+        stream = asyncio.StreamReader()
+        stream.feed_data(encode_frame(0, b"1;") + encode_frame(8, b""))
+        stream.feed_eof()
+        reader = AsyncFrameReader(stream, 16)
+        frames = []
+        while (frame := await reader.read_frame()) is not None:
+            frames.append((frame[0], frame[1], bytes(frame[2])))
+        return frames
+
+    assert asyncio.run(read_frames()) == [(0, None, b"1;"), (8, None, b"")]
+
+
+def test_encode_frame_response():
+    """Test encode frame response.
+
+    It checks that known responses are a single status byte and that
+    the others carry their length
+    """
+    assert is_frame(encode_frame(0, b"1;"))
+    assert not is_frame(b"1;2;3;")
+    assert encode_frame_response(b"STRING EXISTS\n") == bytes((STATUS_FOUND,))
+    response = encode_frame_response(b"COUNT 3\n")
+    assert response == bytes((STATUS_RESULT,)) + b"\x00\x00\x00\x08COUNT 3\n"
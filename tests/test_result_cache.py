@@ -0,0 +1,74 @@
+"""Unit test for result_cache.py"""
+
+from result_cache import ResultCache
+
+
+class Clock:
+    """A clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_result_cache_lru():
+    """Test result cache LRU eviction.
+
+    It checks that the least recently used result is evicted first
+    and that hits, misses and evictions are counted
+    """
+    index = object()
+    cache = ResultCache(maxsize=2)
+    cache.put(index, "a", 1)
+    cache.put(index, "b", 2)
+    assert cache.get(index, "a") == 1
+    cache.put(index, "c", 3)
+    assert cache.get(index, "b") is None
+    assert cache.get(index, "a") == 1
+    assert cache.get(index, "c") == 3
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses, cache.evictions) == (3, 1, 1)
+
+
+def test_result_cache_ttl():
+    """Test result cache time to live.
+
+    It checks that results are not returned once they expired
+    """
+    index = object()
+    clock = Clock()
+    cache = ResultCache(maxsize=10, ttl=5, clock=clock)
+    cache.put(index, "a", 1)
+    clock.now = 4.9
+    assert cache.get(index, "a") == 1
+    clock.now = 5
+    assert cache.get(index, "a") is None
+    assert len(cache) == 0
+
+
+def test_result_cache_invalidation():
+    """Test result cache invalidation.
+
+    It checks that the results of an index are dropped as soon as the
+    cache is used with another index
+    """
+    old_index, new_index = object(), object()
+    cache = ResultCache(maxsize=10)
+    cache.put(old_index, "a", 1)
+    assert cache.get(new_index, "a") is None
+    assert cache.get(old_index, "a") is None
+    assert cache.invalidations == 1
+
+
+def test_result_cache_disabled():
+    """Test result cache disabled.
+
+    It checks that nothing is cached with a size of 0
+    """
+    index = object()
+    cache = ResultCache(maxsize=0)
+    cache.put(index, "a", 1)
+    assert cache.get(index, "a") is None
+    assert len(cache) == 0
@@ -2,15 +2,40 @@
 
 import pytest
 
-from file_handling import strings_list, text_file_path
-from search_algorithms import linear_search, binary_search, jump_search
+from file_handling import strings_list
+from search_algorithms import (
+    aho_corasick_automaton,
+    aho_corasick_scan,
+    aho_corasick_search,
+    linear_search,
+    binary_search,
+    binary_search_many,
+    fixed_width_array,
+    jump_search,
+    hash_search,
+    hash_search_many,
+    prefix_search,
+    substring_search,
+)
 
 
 @pytest.fixture(scope="module")
-def get_file_path():
-    config_file = "configs.ini"
-    file_path = text_file_path(config_file)
-    yield file_path
+def get_file_path(tmp_path_factory):
+    """Data file.
+
+    It writes a small data file and yields its path
+    """
+    file_path = tmp_path_factory.mktemp("data") / "data.txt"
+    file_path.write_text(
+        "7;3;0;1;\n"
+        "2;3;12;29;13;3;19;22;\n"
+        "11;4;5;6;\n"
+        "2;8;3;0;\n"
+        "9;9;9;9;\n"
+        "5;3;1;11;\n"
+        "4;4;4;4;\n"
+    )
+    yield str(file_path)
 
 
 def test_linear_search(get_file_path):
@@ -78,3 +103,166 @@ def test_binary_search(get_file_path):
     bs_2 = binary_search(arr, query_2)
     assert bs_1 == False
     assert bs_2 == True
+
+
+def test_hash_search(get_file_path):
+    """Test hash search algorithm.
+
+    It takes a set of strings and a query string, and returns True if
+    the query string is in the set, and False if it is not
+
+    :param get_file_path: This is the path to the file that contains
+    the strings
+    """
+    index = frozenset(strings_list(get_file_path))
+
+    query_1 = "foo"
+    query_2 = "2;3;12;29;13;3;19;22;"
+
+    hs_1 = hash_search(index, query_1)
+    hs_2 = hash_search(index, query_2)
+    assert hs_1 == False
+    assert hs_2 == True
+
+
+def test_hash_search_many(get_file_path):
+    """Test hash search algorithm for many targets.
+
+    It takes a set of strings and a list of query strings, and returns
+    a list with True or False for every query string
+
+    :param get_file_path: This is the path to the file that contains
+    the strings
+    """
+    index = frozenset(strings_list(get_file_path))
+
+    queries = ["foo", "2;3;12;29;13;3;19;22;", "bar"]
+
+    assert hash_search_many(index, queries) == [False, True, False]
+
+
+def test_prefix_search(get_file_path):
+    """Test prefix search algorithm.
+
+    It takes a sorted list of strings and a prefix, and returns the
+    number of strings that start with the prefix and the strings
+    themselves, up to a limit
+
+    :param get_file_path: This is the path to the file that contains
+    the strings
+    """
+    arr = strings_list(get_file_path)
+    expected = ["2;3;12;29;13;3;19;22;", "2;8;3;0;"]
+
+    assert prefix_search(arr, "2;") == (len(expected), expected)
+    assert prefix_search(arr, "2;", limit=1) == (len(expected), expected[:1])
+    assert prefix_search(arr, "foo") == (0, [])
+    assert prefix_search(arr, "")[0] == 7
+
+
+def test_prefix_search_bytes():
+    """Test prefix search algorithm with bytes.
+
+    It checks the prefixes whose last byte can't be incremented
+    """
+    arr = [b"a", b"a\xff", b"a\xff\x01", b"b"]
+    assert prefix_search(arr, b"a\xff") == (2, [b"a\xff", b"a\xff\x01"])
+    assert prefix_search(arr, b"a") == (3, arr[:3])
+
+
+def test_substring_search(get_file_path):
+    """Test substring search algorithm.
+
+    It takes a list of strings and a fragment, and returns the number
+    of strings that contain the fragment and the strings themselves,
+    up to a limit
+
+    :param get_file_path: This is the path to the file that contains
+    the strings
+    """
+    arr = strings_list(get_file_path)
+    expected = ["2;3;12;29;13;3;19;22;", "2;8;3;0;", "5;3;1;11;", "7;3;0;1;"]
+
+    assert substring_search(arr, ";3;") == (len(expected), expected)
+    assert substring_search(arr, ";3;", limit=1) == (
+        len(expected),
+        expected[:1],
+    )
+    assert substring_search(arr, "foo") == (0, [])
+
+
+def test_aho_corasick_search():
+    """Test Aho-Corasick search algorithm.
+
+    It checks that a text matches when it contains any of the patterns,
+    also when a pattern is only found through a failure link
+    """
+    automaton = aho_corasick_automaton(["he", "she", "hers", "xyz"])
+    assert aho_corasick_search(automaton, "ushers") == True
+    assert aho_corasick_search(automaton, b"ahxe") == False
+    assert aho_corasick_search(automaton, "sxyz") == True
+    automaton = aho_corasick_automaton(["abcd", "bc"])
+    assert aho_corasick_search(automaton, "abce") == True
+    assert aho_corasick_search(aho_corasick_automaton([""]), "a") == True
+    assert aho_corasick_search(aho_corasick_automaton([]), "a") == False
+
+
+def test_aho_corasick_scan(get_file_path):
+    """Test Aho-Corasick scan algorithm.
+
+    It takes the lines of a file and some patterns, and returns the
+    number of lines that contain any pattern and their line numbers
+
+    :param get_file_path: This is the path to the file that contains
+    the strings
+    """
+    with open(get_file_path) as f:
+        lines = f.read().splitlines()
+    patterns = [";3;0;", "11;"]
+    expected = [1, 3, 4, 6]
+    automaton = aho_corasick_automaton(patterns)
+
+    assert aho_corasick_scan(automaton, lines) == (len(expected), expected)
+    assert aho_corasick_scan(automaton, lines, limit=1) == (
+        len(expected),
+        expected[:1],
+    )
+
+
+def test_binary_search_many(get_file_path):
+    """Test binary search algorithm for many targets.
+
+    It checks the results against a search for every target, with
+    NumPy when it is installed and without it otherwise
+
+    :param get_file_path: This is the path to the file that contains
+    the strings
+    """
+    arr = strings_list(get_file_path)
+    targets = [arr[0], "foo", arr[-1], arr[5] + "x", "", arr[5]]
+    expected = [True, False, True, False, False, True]
+
+    assert binary_search_many(arr, targets) == expected
+    assert binary_search_many(fixed_width_array(arr), targets) == expected
+    assert binary_search_many([], ["foo"]) == [False]
+    assert binary_search_many([b"a;", b"b;"], ["b;", b"a;", "c;"]) == [
+        True,
+        True,
+        False,
+    ]
+
+
+def test_binary_search_many_numpy():
+    """Test binary search algorithm for many targets with NumPy.
+
+    It checks that targets longer than the fixed width are not found
+    although their beginning is in the array
+    """
+    np = pytest.importorskip("numpy")
+    arr = fixed_width_array(["1;2;", "1;3;", "é;"])
+    assert isinstance(arr, np.ndarray)
+    assert binary_search_many(arr, ["1;2;3;", "1;3;", "é;"]) == [
+        False,
+        True,
+        True,
+    ]
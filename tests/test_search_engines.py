@@ -0,0 +1,132 @@
+"""Unit test for search_engines.py"""
+
+import pickle
+
+import pytest
+
+from corpus import BloomIndex, Corpus, MmapCorpus
+from mmap_index import MmapIndex, build_index
+from search_engines import ENGINES, SearchEngine, get_engine, register
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    """Data file.
+
+    It writes a small data file and yields its path
+    """
+    file_path = tmp_path / "data.txt"
+    file_path.write_text("7;8;9;\n1;2;3;\n4;5;6;\n")
+    yield str(file_path)
+
+
+def read_lines(file_path):
+    """Return the lines of a data file without their newlines."""
+    with open(file_path) as f:
+        return [line.rstrip("\n") for line in f]
+
+
+def test_get_engine():
+    """Test get engine.
+
+    It checks that engines are found by name, that an empty name gives
+    the default engine and that unknown names raise a ValueError
+    """
+    assert get_engine("binary").name == "binary"
+    assert get_engine("").name == "hash"
+    with pytest.raises(ValueError):
+        get_engine("quantum")
+
+
+@pytest.mark.parametrize(
+    "name", ["linear", "binary", "jump", "hash", "bloom", "mmap"]
+)
+def test_engine_lookup(name, data_file, tmp_path):
+    """Test engine lookup.
+
+    It checks that every engine builds its search data, finds the
+    lines of the data file and reports the memory it uses
+    """
+    engine = get_engine(name)
+    if name == "mmap":
+        index_file = str(tmp_path / "data.idx")
+        build_index(data_file, index_file)
+        data = MmapIndex(index_file)
+    else:
+        data = engine.build(read_lines(data_file))
+    assert engine.lookup(data, "4;5;6;") == True
+    assert engine.lookup(data, "7;8;9;") == True
+    assert engine.lookup(data, "4;5;") == False
+    assert engine.memory_size(data) > 0
+
+
+def test_register_incomplete_engine():
+    """Test registering an engine without a lookup.
+
+    It checks that the engine is refused when it is defined
+    """
+    with pytest.raises(TypeError, match="lookup"):
+        @register
+        class IncompleteEngine(SearchEngine):
+            name = "incomplete"
+
+            def build(self, lines):
+                return list(lines)
+    assert "incomplete" not in ENGINES
+
+
+def test_engines_registered():
+    """Test that all the engines are registered."""
+    assert sorted(ENGINES) == [
+        "binary", "bloom", "hash", "jump", "linear", "mmap"
+    ]
+
+
+def test_corpus_engine(data_file):
+    """Test a corpus with a list engine.
+
+    It checks that lookups use the engine and that appended lines are
+    picked up by building the list again
+    """
+    corpus = Corpus(data_file, engine=get_engine("jump"))
+    assert corpus.load() == ["1;2;3;", "4;5;6;", "7;8;9;"]
+    assert corpus.contains("1;2;3;") == True
+
+    with open(data_file, "a") as f:
+        f.write("0;0;0;\n")
+    assert corpus.refresh() == True
+    assert corpus.index == ["0;0;0;", "1;2;3;", "4;5;6;", "7;8;9;"]
+    assert corpus.contains("0;0;0;") == True
+
+
+def test_mmap_engine_bloom_filter(tmp_path, data_file):
+    """Test the mmap engine with a Bloom filter.
+
+    It checks that the memory size of a filtered index file counts the
+    mapping and the filter
+    """
+    index_file = str(tmp_path / "data.idx")
+    build_index(data_file, index_file)
+    engine = get_engine("mmap")
+    corpus = MmapCorpus(index_file, bloom_fp_rate=0.01, engine=engine)
+    index = corpus.get_index()
+    assert isinstance(index, BloomIndex)
+    assert engine.memory_size(index) == (
+        len(index.bloom.bits) + engine.memory_size(index.index)
+    )
+
+
+@pytest.mark.parametrize("name", ["linear", "binary", "jump", "hash", "bloom"])
+def test_engine_dump_restore(name, data_file):
+    """Test engine dump and restore.
+
+    It checks that the dumped search data can be pickled and gives
+    search data answering the same lookups once restored
+    """
+    engine = get_engine(name)
+    data = engine.build(read_lines(data_file))
+    dumped = pickle.loads(pickle.dumps(engine.dump(data)))
+    data = engine.restore(dumped)
+    assert engine.lookup(data, "4;5;6;") == True
+    assert engine.lookup(data, "4;5;") == False
+    assert engine.memory_size(data) > 0
@@ -1,22 +1,37 @@
 """Unit test for server.py"""
 
+import asyncio
+import os
 import pytest
 import socket
+import subprocess
+import sys
 import threading
 import time
 import server
+import corpus
 
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import AsyncMock, Mock, patch, MagicMock
 
 from server import (
     start_server,
     stop_server,
-    PAYLOAD_SIZE,
     execute_search_query,
-    DATA_FORMAT,
     handle_client,
+    handle_client_async,
+    handle_persistent_client,
 )
-from file_handling import text_file_path, strings_list
+from corpus import HashIndex
+from datasets import Dataset, open_corpus
+from mmap_index import build_index
+from search_engines import get_engine
+from protocol import COMMANDS, encode_frame
+from file_handling import text_file_path, strings_set
+
+# The settings are read from configs.ini like when the server starts.
+server.configure()
+PAYLOAD_SIZE = server.PAYLOAD_SIZE
+DATA_FORMAT = server.DATA_FORMAT
 
 SOCK_ADDRESS = ("localhost", 8871)
 addr, port = SOCK_ADDRESS
@@ -35,6 +50,7 @@ def server_socket():
     sock.listen()
 
     # Start the server in a separate thread.
+    server.open_socket()
     thread = threading.Thread(target=start_server)
     thread.daemon = True
     thread.start()
@@ -53,7 +69,7 @@ def mock_conn():
 @pytest.fixture(scope="module")
 def get_catched_data():
     file_path = text_file_path("configs.ini")
-    cached_data = strings_list(file_path)
+    cached_data = strings_set(file_path)
     yield cached_data
 
 
@@ -73,6 +89,21 @@ def test_server_socket_creation():
     assert server_sock.getsockname() == SOCK_ADDRESS
 
 
+def test_import_without_config(tmp_path):
+    """Test importing the server module without a configs.ini file.
+
+    It checks that the settings are only read and the socket only bound
+    when the server starts
+    """
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(server.__file__))
+    result = subprocess.run(
+        [sys.executable, "-c", "import server; print(server.server_sock)"],
+        cwd=tmp_path, env=env, capture_output=True, text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == "None\n"
+
+
 def test_accepts_connections(server_socket):
     """Test server connections.
 
@@ -166,11 +197,11 @@ def test_handle_client_with_cached_data(
     """Test handle client with cached data.
 
     It tests that the function handle_client calls
-    execute_search_query with cached data
+    execute_search_query with the index shared by all connections
 
     :param mock_conn: a mock object that represents the connection
     to the client
-    :param get_catched_data: a list of strings
+    :param get_catched_data: a set of strings
     :param monkeypatch: a fixture that allows you to replace a
     function with a mock
     """
@@ -186,11 +217,32 @@ def test_handle_client_with_cached_data(
     expected_cached_data = get_catched_data
     with monkeypatch.context() as m:
         m.setattr(server, "execute_search_query", execute_search_query_mock)
-        m.setattr(server, "text_file_path", lambda _: "")
-        m.setattr(server, "strings_list", lambda _: expected_cached_data)
+        m.setattr(server.corpus, "index", expected_cached_data)
         handle_client(mock_conn, ("localhost", 5051))
 
 
+def test_handle_client_shares_index_between_connections(
+        tmp_path, mock_conn):
+    """Test handle client shares the index.
+
+    It tests that the data file is only loaded once, no matter how
+    many connections are handled
+
+    :param tmp_path: a temporary directory
+    :param mock_conn: a mock object that represents the connection
+    to the client
+    """
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("1;2;3;\n")
+    mock_conn.recv.return_value.decode.return_value = "foo"
+    with patch.object(server, "corpus", corpus.Corpus(str(data_file))), patch(
+        "corpus.iter_lines", wraps=corpus.iter_lines
+    ) as mock_read, patch("server.execute_search_query"):
+        handle_client(mock_conn, ("localhost", 5051))
+        handle_client(mock_conn, ("localhost", 5052))
+    mock_read.assert_called_once()
+
+
 def test_handle_client_with_empty_data(mock_conn):
     """Test handle client with empty data.
 
@@ -220,3 +272,699 @@ def test_handle_client_with_invalid_data(mock_conn):
     assert mock_conn.send.called_once_with(
         "PAYLOAD SIZE EXCEEDED\n".encode(DATA_FORMAT)
     )
+
+
+def test_handle_client_async():
+    """Test handle client on the asyncio server.
+
+    It starts an asyncio server on a free port, sends a query and
+    checks the response
+    """
+    async def query(message):
+        srv = await asyncio.start_server(handle_client_async, "127.0.0.1", 0)
+        async with srv:
+            host, port = srv.sockets[0].getsockname()
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write(message.encode(DATA_FORMAT))
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            return response.decode(DATA_FORMAT)
+
+    with patch.object(server.corpus, "index", frozenset(["1;2;3;"])):
+        assert asyncio.run(query("1;2;3;")) == "STRING EXISTS\n"
+        assert asyncio.run(query("foo")) == "STRING NOT FOUND\n"
+
+
+def test_handle_client_async_reread_on_query():
+    """Test handle client on the asyncio server with reread on query.
+
+    It checks that queries which may reload the data file are run in
+    the thread pool and not on the event loop
+    """
+    async def query(message):
+        reader = asyncio.StreamReader()
+        reader.feed_data(message.encode(DATA_FORMAT))
+        reader.feed_eof()
+        writer = MagicMock()
+        writer.drain = AsyncMock()
+        loop = asyncio.get_running_loop()
+        with patch.object(
+            loop, "run_in_executor", wraps=loop.run_in_executor
+        ) as mock_run_in_executor:
+            await handle_client_async(reader, writer)
+        mock_run_in_executor.assert_called_once()
+        return writer.write.call_args[0][0]
+
+    with patch("server.REREAD_ON_QUERY", True), patch(
+        "server.search_query", return_value="STRING NOT FOUND\n"
+    ):
+        assert asyncio.run(query("foo")) == b"STRING NOT FOUND\n"
+
+
+def test_handle_persistent_client():
+    """Test handle persistent client.
+
+    It sends several pipelined queries on one connection, one of them
+    split over two sends, and checks that all of them are answered in
+    order
+    """
+    client_sock, server_conn = socket.socketpair()
+    with patch.object(server.corpus, "index", frozenset(["1;2;3;"])):
+        thread = threading.Thread(
+            target=handle_persistent_client,
+            args=(server_conn, ("localhost", 5051)),
+        )
+        thread.start()
+        client_sock.sendall(b"1;2;3;\nfoo\n1;2;")
+        client_sock.sendall(b"3;\n")
+        client_sock.shutdown(socket.SHUT_WR)
+        thread.join(timeout=5)
+
+    response = client_sock.makefile("rb").read().decode(DATA_FORMAT)
+    client_sock.close()
+    assert response == "STRING EXISTS\nSTRING NOT FOUND\nSTRING EXISTS\n"
+
+
+def test_handle_persistent_client_payload_exceeded():
+    """Test handle persistent client with a query that is too long.
+
+    It checks that the connection is closed when a query exceeds the
+    payload size
+    """
+    client_sock, server_conn = socket.socketpair()
+    thread = threading.Thread(
+        target=handle_persistent_client,
+        args=(server_conn, ("localhost", 5051)),
+    )
+    thread.start()
+    client_sock.sendall(b"a" * (PAYLOAD_SIZE * 2))
+    thread.join(timeout=5)
+
+    response = client_sock.makefile("rb").read().decode(DATA_FORMAT)
+    client_sock.close()
+    assert response == "PAYLOAD SIZE EXCEEDED\n"
+
+
+def test_handle_client_async_persistent():
+    """Test handle client on the asyncio server with persistent protocol.
+
+    It sends pipelined queries on one connection and checks that the
+    responses come back in order
+    """
+    async def query(message):
+        reader = asyncio.StreamReader()
+        reader.feed_data(message.encode(DATA_FORMAT))
+        reader.feed_eof()
+        writer = MagicMock()
+        writer.drain = AsyncMock()
+        await handle_client_async(reader, writer)
+        return b"".join(call[0][0] for call in writer.write.call_args_list)
+
+    with patch("server.PROTOCOL", "persistent"), patch.object(
+        server.corpus, "index", frozenset(["1;2;3;"])
+    ):
+        response = asyncio.run(query("foo\n1;2;3;\n"))
+    assert response == b"STRING NOT FOUND\nSTRING EXISTS\n"
+
+
+def test_handle_client_async_index_queries():
+    """Test handle client on the asyncio server with index queries.
+
+    It checks that exact lookups run on the event loop while prefix
+    queries, which sort the data on their first use, run in the thread
+    pool
+    """
+    async def query(message):
+        reader = asyncio.StreamReader()
+        reader.feed_data(message.encode(DATA_FORMAT))
+        reader.feed_eof()
+        writer = MagicMock()
+        writer.drain = AsyncMock()
+        loop = asyncio.get_running_loop()
+        with patch.object(
+            loop, "run_in_executor", wraps=loop.run_in_executor
+        ) as mock_run_in_executor:
+            await handle_client_async(reader, writer)
+        response = b"".join(call[0][0] for call in writer.write.call_args_list)
+        return response, mock_run_in_executor.call_count
+
+    index = HashIndex((frozenset(["1;2;3;", "1;4;"]),))
+    with patch("server.PROTOCOL", "persistent"), patch.object(
+        server.corpus, "index", index
+    ):
+        response, calls = asyncio.run(query("1;4;\nPREFIXCOUNT 1;\n"))
+    assert response == b"STRING EXISTS\nCOUNT 2\n"
+    assert calls == 1
+
+
+def test_handle_client_batch():
+    """Test handle client with a batch request.
+
+    It sends a batch request longer than the payload size on a
+    one-shot connection and checks the single response
+    """
+    queries = ["1;2;3;", "foo"] * PAYLOAD_SIZE
+    client_sock, server_conn = socket.socketpair()
+    with patch.object(server.corpus, "index", frozenset(["1;2;3;"])):
+        thread = threading.Thread(
+            target=handle_client, args=(server_conn, ("localhost", 5051))
+        )
+        thread.start()
+        message = f"BATCH {len(queries)}\n" + "\n".join(queries) + "\n"
+        client_sock.sendall(message.encode(DATA_FORMAT))
+        thread.join(timeout=5)
+
+    response = client_sock.makefile("rb").read().decode(DATA_FORMAT)
+    client_sock.close()
+    assert response == "RESULTS " + "10" * PAYLOAD_SIZE + "\n"
+
+
+def test_handle_persistent_client_batch_limit_exceeded():
+    """Test handle persistent client with a batch that is too big.
+
+    It checks that queries before the batch are answered and the
+    connection is closed when the batch limit is exceeded
+    """
+    client_sock, server_conn = socket.socketpair()
+    with patch("server.BATCH_LIMIT", 2), patch.object(
+        server.corpus, "index", frozenset(["1;2;3;"])
+    ):
+        thread = threading.Thread(
+            target=handle_persistent_client,
+            args=(server_conn, ("localhost", 5051)),
+        )
+        thread.start()
+        client_sock.sendall(b"1;2;3;\nBATCH 3\n")
+        thread.join(timeout=5)
+
+    response = client_sock.makefile("rb").read().decode(DATA_FORMAT)
+    client_sock.close()
+    assert response == "STRING EXISTS\nBATCH LIMIT EXCEEDED\n"
+
+
+def test_handle_client_async_batch():
+    """Test handle client on the asyncio server with a batch request.
+
+    It checks that the batch is answered with a single response
+    """
+    async def query(message):
+        reader = asyncio.StreamReader()
+        reader.feed_data(message.encode(DATA_FORMAT))
+        reader.feed_eof()
+        writer = MagicMock()
+        writer.drain = AsyncMock()
+        await handle_client_async(reader, writer)
+        return b"".join(call[0][0] for call in writer.write.call_args_list)
+
+    with patch.object(server.corpus, "index", frozenset(["1;2;3;"])):
+        response = asyncio.run(query("BATCH 3\nfoo\n1;2;3;\nbar\n"))
+    assert response == b"RESULTS 010\n"
+
+
+def test_handle_persistent_client_prefix():
+    """Test handle persistent client with prefix requests.
+
+    It checks that prefix requests return the matching lines, up to the
+    prefix limit, or only their number
+    """
+    index = frozenset(["2;3;1;", "2;3;0;", "2;4;", "12;3;"])
+    client_sock, server_conn = socket.socketpair()
+    with patch("server.PREFIX_LIMIT", 1), patch.object(
+        server.corpus, "index", index
+    ):
+        thread = threading.Thread(
+            target=handle_persistent_client,
+            args=(server_conn, ("localhost", 5051)),
+        )
+        thread.start()
+        client_sock.sendall(b"PREFIX 2;3;\nPREFIXCOUNT 2;\nPREFIX 9;\n")
+        client_sock.shutdown(socket.SHUT_WR)
+        thread.join(timeout=5)
+
+    response = client_sock.makefile("rb").read().decode(DATA_FORMAT)
+    client_sock.close()
+    assert response == "MATCHES 2 1\n2;3;0;\nCOUNT 3\nMATCHES 0 0\n"
+
+
+def test_handle_persistent_client_substring():
+    """Test handle persistent client with substring requests.
+
+    It checks that substring requests return the lines that contain
+    the fragment, up to the prefix limit
+    """
+    index = HashIndex((frozenset(["2;3;1;", "12;3;0;", "2;4;"]),))
+    client_sock, server_conn = socket.socketpair()
+    with patch("server.PREFIX_LIMIT", 1), patch.object(
+        server.corpus, "index", index
+    ):
+        thread = threading.Thread(
+            target=handle_persistent_client,
+            args=(server_conn, ("localhost", 5051)),
+        )
+        thread.start()
+        client_sock.sendall(b"SUBSTR ;3;\nSUBSTR 9;\n")
+        client_sock.shutdown(socket.SHUT_WR)
+        thread.join(timeout=5)
+
+    response = client_sock.makefile("rb").read().decode(DATA_FORMAT)
+    client_sock.close()
+    assert response == "MATCHES 2 1\n12;3;0;\nMATCHES 0 0\n"
+
+
+def test_handle_persistent_client_contains_any(tmp_path):
+    """Test handle persistent client with contains any requests.
+
+    It checks that the line numbers of the lines containing any of the
+    patterns are returned and that the compiled patterns are cached
+    """
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("1;2;3;\n4;5;6;\n7;8;9;\n")
+    server.compile_patterns.cache_clear()
+    client_sock, server_conn = socket.socketpair()
+    with patch.object(server.corpus, "file_name", str(data_file)):
+        thread = threading.Thread(
+            target=handle_persistent_client,
+            args=(server_conn, ("localhost", 5051)),
+        )
+        thread.start()
+        client_sock.sendall(
+            b"CONTAINSANY 2\n;9;\n2;\nCONTAINSANY 2\n2;\n;9;\n"
+            b"CONTAINSANY 1\nx\n"
+        )
+        client_sock.shutdown(socket.SHUT_WR)
+        thread.join(timeout=5)
+
+    response = client_sock.makefile("rb").read().decode(DATA_FORMAT)
+    client_sock.close()
+    assert response == "MATCHES 2 2\n1\n3\nMATCHES 2 2\n1\n3\nMATCHES 0 0\n"
+    assert server.compile_patterns.cache_info().hits == 1
+
+
+def test_handle_persistent_client_filter(tmp_path):
+    """Test handle persistent client with filter requests.
+
+    It checks that the records matching the conditions are returned
+    and that invalid filters are rejected
+    """
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("1;2;12;4;0;6;7;8;\n1;2;12;4;9;6;7;8;\n")
+    client_sock, server_conn = socket.socketpair()
+    filter_corpus = corpus.Corpus(str(data_file))
+    with patch("server.corpus", filter_corpus):
+        thread = threading.Thread(
+            target=handle_persistent_client,
+            args=(server_conn, ("localhost", 5051)),
+        )
+        thread.start()
+        client_sock.sendall(b"FILTER 3=12 5=0..4\nFILTER 9=1\n")
+        client_sock.shutdown(socket.SHUT_WR)
+        thread.join(timeout=5)
+
+    response = client_sock.makefile("rb").read().decode(DATA_FORMAT)
+    client_sock.close()
+    assert response == "MATCHES 1 1\n1;2;12;4;0;6;7;8;\nINVALID FILTER\n"
+
+
+def test_handle_persistent_client_vector_batch():
+    """Test handle persistent client with a vectorised batch request.
+
+    It checks that the batch is answered like a plain batch
+    """
+    index = HashIndex((frozenset(["1;2;3;", "4;5;6;"]),))
+    client_sock, server_conn = socket.socketpair()
+    with patch.object(server.corpus, "index", index):
+        thread = threading.Thread(
+            target=handle_persistent_client,
+            args=(server_conn, ("localhost", 5051)),
+        )
+        thread.start()
+        client_sock.sendall(b"VBATCH 3\n4;5;6;\n4;5;\n1;2;3;\n")
+        client_sock.shutdown(socket.SHUT_WR)
+        thread.join(timeout=5)
+
+    response = client_sock.makefile("rb").read().decode(DATA_FORMAT)
+    client_sock.close()
+    assert response == "RESULTS 101\n"
+
+
+def test_handle_persistent_client_stats():
+    """Test handle persistent client with a stats request.
+
+    It checks that the stages and the requests answered before the
+    stats request are in the metrics
+    """
+    index = HashIndex((frozenset(["1;2;3;"]),))
+    server.metrics.reset()
+    client_sock, server_conn = socket.socketpair()
+    with patch.object(server.corpus, "index", index):
+        thread = threading.Thread(
+            target=handle_persistent_client,
+            args=(server_conn, ("localhost", 5051)),
+        )
+        thread.start()
+        client_sock.sendall(b"1;2;3;\nPREFIX 1;\nSTATS\n")
+        client_sock.shutdown(socket.SHUT_WR)
+        thread.join(timeout=5)
+
+    response = client_sock.makefile("rb").read().decode(DATA_FORMAT)
+    client_sock.close()
+    header, stats = response.split("STATS ", 1)[1].split("\n", 1)
+    assert int(header) == len(stats.splitlines())
+    assert 'search_server_requests_total{command="QUERY"} 1\n' in stats
+    assert 'search_server_requests_total{command="PREFIX"} 1\n' in stats
+    assert "search_server_recv_seconds_count 3\n" in stats
+    assert "search_server_parse_seconds_count 3\n" in stats
+
+
+def test_search_query_result_cache():
+    """Test search query with the result cache.
+
+    It checks that repeated queries are answered from the cache, that
+    a new index isn't answered with the results of the old one, and
+    that lookups in a hash index skip the cache
+    """
+    old_index = ["1;2;3;"]
+    new_index = ["4;5;6;"]
+    server.result_cache.clear()
+    with patch("server.result_cache.maxsize", 10), patch.object(
+        server.corpus, "engine", get_engine("binary")
+    ):
+        assert server.search_query("1;2;3;", addr, old_index) == (
+            "STRING EXISTS\n"
+        )
+        with patch.object(server.corpus, "lookup") as lookup:
+            assert server.search_query("1;2;3;", addr, old_index) == (
+                "STRING EXISTS\n"
+            )
+            lookup.assert_not_called()
+        assert server.search_query("1;2;3;", addr, new_index) == (
+            "STRING NOT FOUND\n"
+        )
+    server.result_cache.clear()
+    hash_index = HashIndex((frozenset(["1;2;3;"]),))
+    with patch("server.result_cache.maxsize", 10), patch.object(
+        server.corpus, "engine", get_engine("hash")
+    ):
+        server.search_query("1;2;3;", addr, hash_index)
+        assert len(server.result_cache) == 0
+    server.result_cache.clear()
+
+
+def test_handle_persistent_client_datasets(tmp_path):
+    """Test handle persistent client with named datasets.
+
+    It checks that requests with a dataset prefix search that dataset,
+    that requests without one search the default dataset and that
+    unknown datasets are rejected without closing the connection
+    """
+    data_file = tmp_path / "logs.txt"
+    data_file.write_text("7;8;9;\n7;1;\n")
+    logs = Dataset("logs", corpus.Corpus(str(data_file)))
+    index = HashIndex((frozenset(["1;2;3;"]),))
+    client_sock, server_conn = socket.socketpair()
+    with patch.object(server.corpus, "index", index), patch(
+        "server.datasets", {"logs": logs}
+    ):
+        thread = threading.Thread(
+            target=handle_persistent_client,
+            args=(server_conn, ("localhost", 5051)),
+        )
+        thread.start()
+        client_sock.sendall(
+            b"@logs 7;8;9;\n@logs PREFIXCOUNT 7;\n@nope 1;2;3;\n"
+            b"1;2;3;\n@default 7;8;9;\n"
+        )
+        client_sock.shutdown(socket.SHUT_WR)
+        thread.join(timeout=5)
+
+    response = client_sock.makefile("rb").read().decode(DATA_FORMAT)
+    client_sock.close()
+    assert response == (
+        "STRING EXISTS\nCOUNT 2\nUNKNOWN DATASET\nSTRING EXISTS\n"
+        "STRING NOT FOUND\n"
+    )
+
+
+def test_handle_client_dataset(tmp_path, mock_conn):
+    """Test handle client with a query for a named dataset.
+
+    It checks that a single query is searched in the named dataset
+    """
+    data_file = tmp_path / "logs.txt"
+    data_file.write_text("7;8;9;\n")
+    logs = Dataset("logs", corpus.Corpus(str(data_file)))
+    mock_conn.recv.return_value.decode.return_value = "@logs 7;8;9;"
+    with patch("server.datasets", {"logs": logs}):
+        handle_client(mock_conn, ("localhost", 5051))
+    mock_conn.send.assert_called_once_with(b"STRING EXISTS\n")
+
+
+def test_handle_persistent_client_frames(tmp_path):
+    """Test handle persistent client with binary frames.
+
+    It checks that the first byte selects the binary protocol, that
+    exact queries are answered with a status byte and other requests
+    with their text response, and that an invalid frame closes the
+    connection
+    """
+    data_file = tmp_path / "logs.txt"
+    data_file.write_text("7;8;9;\n")
+    logs = Dataset("logs", corpus.Corpus(str(data_file)))
+    index = HashIndex((frozenset(["1;2;3;", "1;4;"]),))
+    prefix_count = COMMANDS.index("PREFIXCOUNT") + 1
+    batch = COMMANDS.index("BATCH") + 1
+    client_sock, server_conn = socket.socketpair()
+    with patch.object(server.corpus, "index", index), patch(
+        "server.datasets", {"logs": logs}
+    ):
+        thread = threading.Thread(
+            target=handle_persistent_client,
+            args=(server_conn, ("localhost", 5051)),
+        )
+        thread.start()
+        client_sock.sendall(
+            encode_frame(0, b"1;2;3;")
+            + encode_frame(0, b"7;8;9;", "logs")
+            + encode_frame(0, b"7;8;9;")
+            + encode_frame(prefix_count, b"1;")
+            + encode_frame(batch, b"1;4;\n2;")
+            + encode_frame(0, b"1;", "nope")
+            + b"1;2;3;\n"
+            + encode_frame(0, b"1;2;3;")
+        )
+        client_sock.shutdown(socket.SHUT_WR)
+        thread.join(timeout=5)
+
+    response = client_sock.makefile("rb").read()
+    client_sock.close()
+    assert response == (
+        b"\x01\x01\x00"
+        b"\x02\x00\x00\x00\x08COUNT 2\n"
+        b"\x02\x00\x00\x00\x0bRESULTS 10\n"
+        b"\x03\x07"
+    )
+
+
+def test_handle_client_async_frames():
+    """Test handle client on the asyncio server with binary frames."""
+    async def query(message):
+        srv = await asyncio.start_server(handle_client_async, "127.0.0.1", 0)
+        async with srv:
+            host, port = srv.sockets[0].getsockname()
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write(message)
+            writer.write_eof()
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            return response
+
+    with patch.object(server.corpus, "index", frozenset(["1;2;3;"])):
+        message = encode_frame(0, b"1;2;3;") + encode_frame(0, b"foo")
+        assert asyncio.run(query(message)) == b"\x01\x00"
+
+
+def test_select_frame_query_bytes(tmp_path):
+    """Test select frame query with an index file.
+
+    It checks that plain queries are searched as bytes in an index
+    file, and decoded for the other search engines
+    """
+    data_file = tmp_path / "data.txt"
+    index_file = tmp_path / "data.idx"
+    data_file.write_text("1;2;3;\n")
+    build_index(str(data_file), str(index_file))
+    indexed = Dataset("idx", open_corpus("", "mmap", str(index_file)))
+    frame = (0, "idx", memoryview(b"1;2;3;"))
+    query, args = server.select_frame_query(frame, addr, indexed)
+    assert args == (b"1;2;3;", addr)
+    assert query(*args, dataset=indexed) == "STRING EXISTS\n"
+    query, args = server.select_frame_query(
+        frame, addr, server.default_dataset()
+    )
+    assert args == ("1;2;3;", addr)
+
+
+def test_handle_client_idle_timeout():
+    """Test handle client with an idle client.
+
+    It checks that a persistent connection without requests is closed
+    once the idle timeout expires
+    """
+    client_sock, server_conn = socket.socketpair()
+    with patch("server.PROTOCOL", "persistent"), patch(
+        "server.IDLE_TIMEOUT", 0.05
+    ):
+        handle_client(server_conn, ("localhost", 5051))
+    assert client_sock.recv(16) == b""
+    client_sock.close()
+
+
+def test_accept_connections_busy():
+    """Test accept connections with every worker thread busy.
+
+    It checks that a connection that finds no free worker within the
+    busy timeout is refused instead of waiting
+    """
+    release = threading.Event()
+    conns = [MagicMock(), MagicMock()]
+    accepted = [(conns[0], addr), (conns[1], addr)]
+
+    def accept():
+        if accepted:
+            return accepted.pop(0)
+        release.set()
+        raise KeyboardInterrupt
+
+    with patch("server.MAX_WORKERS", 1), patch(
+        "server.BUSY_TIMEOUT", 0.01
+    ), patch("server.server_sock") as mock_sock, patch(
+        "server.handle_client", side_effect=lambda *args: release.wait(5)
+    ) as mock_handle_client:
+        mock_sock.accept.side_effect = accept
+        server.accept_connections()
+    mock_handle_client.assert_called_once()
+    conns[1].sendall.assert_called_once_with(b"SERVER BUSY\n")
+
+
+def test_handle_client_query_line_ending(mock_conn):
+    """Test handle client with a query that ends with a line ending.
+
+    It checks that the line ending of a single query is not searched,
+    so clients may send the same line as on a persistent connection
+    """
+    index = HashIndex((frozenset(["1;2;3;"]),))
+    mock_conn.recv.return_value.decode.return_value = "1;2;3;\r\n"
+    with patch.object(server.corpus, "index", index):
+        handle_client(mock_conn, ("localhost", 5051))
+    mock_conn.send.assert_called_once_with(b"STRING EXISTS\n")
+
+
+def test_handle_client_escaped_query(mock_conn):
+    """Test handle client with a query that starts with "@".
+
+    It checks that a doubled dataset prefix searches the default dataset
+    for the query with a single one
+    """
+    index = HashIndex((frozenset(["@1;2;3;"]),))
+    mock_conn.recv.return_value.decode.return_value = "@@1;2;3;"
+    with patch.object(server.corpus, "index", index):
+        handle_client(mock_conn, ("localhost", 5051))
+    mock_conn.send.assert_called_once_with(b"STRING EXISTS\n")
+
+
+def test_handle_client_command_without_newline():
+    """Test handle client with a command without a final newline.
+
+    It checks that a oneshot command is answered although the client
+    keeps the connection open without ending the line
+    """
+    client_sock, server_conn = socket.socketpair()
+    index = HashIndex((frozenset(["1;2;3;", "1;4;"]),))
+    with patch.object(server.corpus, "index", index):
+        thread = threading.Thread(
+            target=handle_client, args=(server_conn, ("localhost", 5051))
+        )
+        thread.start()
+        client_sock.sendall(b"PREFIXCOUNT 1;")
+        thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert client_sock.recv(64) == b"COUNT 2\n"
+    client_sock.close()
+
+
+def test_handle_client_async_command_without_newline():
+    """Test handle client on the asyncio server with a command without
+    a final newline."""
+    async def query(message):
+        srv = await asyncio.start_server(handle_client_async, "127.0.0.1", 0)
+        async with srv:
+            host, port = srv.sockets[0].getsockname()
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write(message)
+            await writer.drain()
+            response = await asyncio.wait_for(reader.read(), 5)
+            writer.close()
+            return response
+
+    index = HashIndex((frozenset(["1;2;3;", "1;4;"]),))
+    with patch.object(server.corpus, "index", index):
+        assert asyncio.run(query(b"PREFIXCOUNT 1;")) == b"COUNT 2\n"
+
+
+def test_refresh_datasets(tmp_path):
+    """Test refresh datasets.
+
+    It checks that the reloaded index is frozen before new pre-fork
+    workers are started
+    """
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("1;2;3;\n")
+    data_corpus = open_corpus(str(data_file))
+    data_corpus.load()
+    data_file.write_text("4;5;6;\n")
+    frozen = []
+    with patch("server.corpus", data_corpus), patch(
+        "server.datasets", {}
+    ), patch("gc.freeze", lambda: frozen.append(data_corpus.index)):
+        server.refresh_datasets()
+    assert frozen and "4;5;6;" in frozen[0]
+
+
+@pytest.mark.parametrize("engine", ["binary", "hash"])
+def test_load_dataset_substring_index(tmp_path, engine):
+    """Test load dataset with the substring index.
+
+    It checks that the trigram index is built for the hash index and
+    that the sorted list of a list engine, which has none, still loads
+    """
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("1;2;3;\n4;5;6;\n")
+    dataset = Dataset("data", open_corpus(str(data_file), engine))
+    with patch("server.SUBSTRING_INDEX", True):
+        server.load_dataset(dataset)
+    index = dataset.corpus.index
+    assert len(index) == 2
+    if engine == "hash":
+        assert index._substring is not None
+
+
+def test_contains_any_query_index_file(tmp_path):
+    """Test contains any query on an index file.
+
+    It checks that the line numbers of the data file are returned, and
+    the positions in the sorted index file without a data file
+    """
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("7;8;9;\n1;2;3;\n4;5;6;\n")
+    index_file = str(tmp_path / "data.idx")
+    build_index(str(data_file), index_file)
+    indexed = Dataset("idx", open_corpus(str(data_file), "mmap", index_file))
+    sorted_only = Dataset("idx", open_corpus("", "mmap", index_file))
+    assert server.contains_any_query(["8;"], addr, dataset=indexed) == (
+        "MATCHES 1 1\n1\n"
+    )
+    assert server.contains_any_query(["8;"], addr, dataset=sorted_only) == (
+        "MATCHES 1 1\n3\n"
+    )
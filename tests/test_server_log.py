@@ -0,0 +1,108 @@
+"""Unit test for server_log.py"""
+
+import io
+import logging
+import queue
+
+import pytest
+
+import server_log
+from server_log import (
+    BatchStreamHandler,
+    DroppingQueueHandler,
+    LogWriter,
+    SampleFilter,
+    logger,
+    query_logger,
+    setup_logging,
+    stop_logging,
+)
+
+
+@pytest.fixture
+def restore_loggers():
+    """Restore loggers.
+
+    It stops the writer and removes the handlers and filters added by
+    a test
+    """
+    yield
+    stop_logging()
+    logger.handlers = []
+    logger.setLevel(logging.NOTSET)
+    logger.propagate = True
+    query_logger.filters = []
+    query_logger.setLevel(logging.NOTSET)
+
+
+def make_record(message, level=logging.INFO, name="server"):
+    """Create a log record."""
+    return logging.LogRecord(name, level, __file__, 1, message, (), None)
+
+
+def test_dropping_queue_handler():
+    """Test dropping queue handler.
+
+    It checks that records are put on the queue unformatted and that
+    the ones that don't fit are counted
+    """
+    handler = DroppingQueueHandler(queue.Queue(2))
+    records = [make_record("%s a"), make_record("b"), make_record("c")]
+    for record in records:
+        handler.handle(record)
+    assert handler.queue.get_nowait() is records[0]
+    assert records[0].msg == "%s a"
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 1
+
+
+def test_sample_filter(monkeypatch):
+    """Test sample filter.
+
+    It checks that a record is kept when the random number is below
+    the sample rate
+    """
+    record = make_record("a")
+    assert SampleFilter(1).filter(record)
+    monkeypatch.setattr(server_log.random, "random", lambda: 0.3)
+    assert SampleFilter(0.5).filter(record)
+    assert not SampleFilter(0.2).filter(record)
+
+
+def test_log_writer():
+    """Test log writer.
+
+    It checks that every queued record is written in order once the
+    writer is stopped, and that records below the level of a handler
+    are skipped
+    """
+    stream = io.StringIO()
+    console = BatchStreamHandler(stream)
+    console.setLevel(logging.INFO)
+    queue_handler = DroppingQueueHandler(queue.Queue(100))
+    writer = LogWriter(queue_handler, [console], batch_size=3)
+    for i in range(10):
+        queue_handler.handle(make_record(f"record {i}"))
+    queue_handler.handle(make_record("hidden", logging.DEBUG))
+    writer.start()
+    writer.stop()
+    assert stream.getvalue() == "".join(f"record {i}\n" for i in range(10))
+
+
+def test_setup_logging_query_log(tmp_path, capsys, restore_loggers):
+    """Test setup logging with a query log file.
+
+    It checks that query records are written to the file and not to
+    the console, even when the console level hides them
+    """
+    query_log = tmp_path / "queries.log"
+    setup_logging(level="WARNING", query_log_path=str(query_log))
+    query_logger.info("Search query: %s", "1;2;3;")
+    logger.info("hidden")
+    logger.warning("shown")
+    stop_logging()
+    assert query_log.read_text().endswith("Search query: 1;2;3;\n")
+    output = capsys.readouterr().out
+    assert "WARNING shown" in output
+    assert "hidden" not in output
+    assert "Search query" not in output
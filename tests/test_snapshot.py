@@ -0,0 +1,51 @@
+"""Unit test for snapshot.py"""
+
+import json
+
+import pytest
+
+import snapshot
+from snapshot import (
+    HEADER_LENGTH,
+    MAGIC,
+    SnapshotError,
+    read_snapshot,
+    write_snapshot,
+)
+
+
+def test_snapshot_round_trip(tmp_path):
+    """Test snapshot round trip.
+
+    It checks that the header and the data are read back as written
+    """
+    path = str(tmp_path / "data.snap")
+    data = (frozenset(["1;2;3;", "4;5;6;"]), ["a", "b"], b"\x01")
+    write_snapshot(path, {"size": 14}, data)
+    header, loaded = read_snapshot(path)
+    assert loaded == data
+    assert header["size"] == 14
+    assert header["format"] == snapshot.FORMAT_VERSION
+    assert not list(tmp_path.glob("*.tmp*"))
+
+
+def test_snapshot_invalid(tmp_path):
+    """Test invalid snapshots.
+
+    It checks that files that are not snapshots, snapshots of another
+    format and truncated snapshots raise a SnapshotError
+    """
+    path = tmp_path / "data.snap"
+    path.write_bytes(b"1;2;3;\n")
+    with pytest.raises(SnapshotError):
+        read_snapshot(str(path))
+
+    write_snapshot(str(path), {}, ["a"])
+    path.write_bytes(path.read_bytes()[:-1])
+    with pytest.raises(SnapshotError):
+        read_snapshot(str(path))
+
+    header = json.dumps({"format": snapshot.FORMAT_VERSION + 1}).encode()
+    path.write_bytes(MAGIC + HEADER_LENGTH.pack(len(header)) + header)
+    with pytest.raises(SnapshotError):
+        read_snapshot(str(path))